@@ -0,0 +1,612 @@
+import statistics
+import sys
+import time
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean in milliseconds"""
+    ms = [s * 1000 for s in seconds]
+    return {
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(statistics.mean(ms), 3) if ms else 0.0
+    }
+
+# --- Hybrid vs vector retrieval ---
+def hybrid_queries(chunks):
+    """Realistic query mix: exact titles, FAQ questions and free-form paraphrases"""
+    queries = []
+    for chunk in chunks:
+        if chunk["type"] == "policy":
+            queries.append(chunk["title"].lower())
+            queries.append(f"{chunk['section']} {chunk['title']}".lower())
+        elif chunk["type"] == "faq":
+            queries.append(chunk["question"])
+    queries += [
+        "How many sick leaves do I get?",
+        "can i take a day off on my birthday",
+        "what should I wear to office on friday",
+        "I feel unsafe because of a colleague",
+        "when do we get paid",
+        "who pays for my home broadband",
+        "how long do I need to serve after resigning",
+        "my laptop screen broke"
+    ]
+    return queries
+
+def bench_hybrid(n_results=3, rounds=3):
+    """Compare latency and top-k agreement of vector-only vs hybrid retrieval"""
+    from hybrid_retriever import HybridRetriever
+    from lexical_index import BM25Index
+    from rag import collection, get_all_chunks, index_knowledge
+
+    chunks = get_all_chunks()
+    index_knowledge()
+
+    def vector_search(query, n):
+        results = collection.query(query_texts=[query], n_results=n)
+        return [list(pair) for pair in zip(results["documents"][0], results["metadatas"][0])]
+
+    lexical_index = BM25Index(chunks)
+    retriever = HybridRetriever(lexical_index, vector_search)
+    queries = hybrid_queries(chunks)
+    vector_search(queries[0], n_results)  # load the embedding model before timing
+
+    vector_times, hybrid_times, agreement, lexical_only = [], [], [], 0
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            vector = vector_search(query, n_results)
+            vector_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            hybrid, path = retriever.search(query, n_results)
+            hybrid_times.append(time.perf_counter() - start)
+
+            lexical_only += path == "lexical"
+            vector_ids = {meta["id"] for _, meta in vector}
+            agreement.append(len(vector_ids & {meta["id"] for _, meta in hybrid}) / n_results)
+
+    report = {
+        "queries": len(queries) * rounds,
+        "vector": latency_summary(vector_times),
+        "hybrid": latency_summary(hybrid_times),
+        "lexical_only_ratio": round(lexical_only / (len(queries) * rounds), 4),
+        f"top{n_results}_agreement": round(statistics.mean(agreement), 4)
+    }
+    print_report("Hybrid vs vector retrieval", report)
+    return report
+
+# --- NumPy index vs Chroma parity ---
+def bench_parity(n_results=3, index_path="bench_vector_index"):
+    """Check the numpy backend returns the same top-k as Chroma, and compare latency"""
+    import os
+    from embeddings import embed_texts
+    from rag import collection, get_all_chunks, index_knowledge
+    from vector_index import ChromaBackend, NumpyVectorIndex
+
+    chunks = get_all_chunks()
+    index_knowledge(backend="chroma")
+    numpy_index = NumpyVectorIndex(index_path)
+    numpy_index.sync(chunks, embed_texts)
+    chroma = ChromaBackend(collection)
+
+    queries = hybrid_queries(chunks)
+    query_embeddings = embed_texts(queries)
+    chroma_times, numpy_times, top1, overlap = [], [], 0, []
+    for query_embedding in query_embeddings:
+        start = time.perf_counter()
+        expected = chroma.query(query_embedding, n_results)[0]
+        chroma_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        actual = numpy_index.query(query_embedding, n_results)[0]
+        numpy_times.append(time.perf_counter() - start)
+        top1 += expected[0][1]["id"] == actual[0][1]["id"]
+        overlap.append(len({m["id"] for _, m in expected} & {m["id"] for _, m in actual}) / n_results)
+
+    start = time.perf_counter()
+    numpy_index.query(query_embeddings, n_results)
+    batched = time.perf_counter() - start
+
+    for path in (numpy_index.matrix_path, numpy_index.meta_path):
+        os.remove(path)
+    report = {
+        "queries": len(queries),
+        "chroma": latency_summary(chroma_times),
+        "numpy": latency_summary(numpy_times),
+        "numpy_batched_total_ms": round(batched * 1000, 3),
+        "top1_agreement": round(top1 / len(queries), 4),
+        f"top{n_results}_overlap": round(statistics.mean(overlap), 4)
+    }
+    print_report("NumPy index vs Chroma", report)
+    if report["top1_agreement"] < 1.0 or report[f"top{n_results}_overlap"] < 0.95:
+        print("PARITY FAILED")
+        sys.exit(1)
+    return report
+
+def print_report(title, report, indent=0):
+    if title:
+        print(title)
+        print("-" * len(title))
+    for key, value in report.items():
+        if isinstance(value, dict):
+            print(" " * indent + f"{key}:")
+            print_report(None, value, indent + 2)
+        else:
+            print(" " * indent + f"{key}: {value}")
+
+# --- MIME body extraction ---
+def mime_corpus():
+    """Synthetic Gmail payloads: small plain, nested mixed/alternative, HTML newsletters, large bodies"""
+    from fakes import make_part
+
+    paragraph = "Hello team, please find the quarterly update on leave policy and benefits below. "
+    html_body = "<html><head><style>p {color: red}</style></head><body>" + \
+        "".join(f"<div><p>{paragraph}<a href='https://example.com/{i}'>link</a></p></div>" for i in range(4000)) + \
+        "</body></html>"
+    attachment = "%PDF-1.4 " + "x" * 500_000
+    return {
+        "plain_small": make_part("text/plain", paragraph * 4),
+        "plain_1mb": make_part("text/plain", paragraph * 13_000),
+        "nested_alternative": make_part("multipart/mixed", parts=[
+            make_part("multipart/alternative", parts=[
+                make_part("text/plain", paragraph * 30),
+                make_part("text/html", f"<p>{paragraph * 30}</p>")
+            ]),
+            make_part("application/pdf", attachment, filename="report.pdf")
+        ]),
+        "html_newsletter": make_part("multipart/mixed", parts=[
+            make_part("text/html", html_body),
+            make_part("image/png", "\x89PNG" + "y" * 200_000, filename="banner.png")
+        ])
+    }
+
+def legacy_extract_email_body(payload):
+    """The previous extractor: one level of parts, text/plain only, whole body decoded"""
+    import base64
+    if payload.get('body') and payload['body'].get('data'):
+        return base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
+    for part in payload.get('parts', []):
+        if part.get('mimeType') == 'text/plain' and part.get('body', {}).get('data'):
+            return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
+    return "(No body content)"
+
+def bench_mime(rounds=50, max_chars=500):
+    """Compare the streaming MIME walker with full decode-then-truncate on synthetic payloads"""
+    from mime_body import extract_body
+
+    report = {}
+    for name, payload in mime_corpus().items():
+        legacy_times, new_times = [], []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            legacy = legacy_extract_email_body(payload)[:max_chars]
+            legacy_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            body = extract_body(payload, max_chars=max_chars)
+            new_times.append(time.perf_counter() - start)
+        report[name] = {
+            "original_size": body["original_size"],
+            "mime_type": body["mime_type"],
+            "attachments_skipped": body["attachments"],
+            "legacy_found_body": legacy != "(No body content)",
+            "legacy": latency_summary(legacy_times),
+            "streaming": latency_summary(new_times),
+            "speedup": round(statistics.mean(legacy_times) / max(statistics.mean(new_times), 1e-9), 1)
+        }
+    print_report("MIME body extraction (legacy vs streaming)", report)
+    return report
+
+# --- Prompt context packing ---
+def bench_context(budget=600, sizes=(3, 5, 10)):
+    """Prompt context tokens with raw chunks vs the token-budgeted packer, per n_results"""
+    from context_packer import ContextPacker
+    from knowledge_base import load_chunks
+    from lexical_index import BM25Index
+
+    chunks = load_chunks()
+    lexical_index = BM25Index(chunks)
+    queries = hybrid_queries(chunks)
+    report = {}
+    for n_results in sizes:
+        packer = ContextPacker(budget=budget)
+        raw, packed, duplicates = [], [], 0
+        for query in queries:
+            results = [[chunks[i]["content"], chunks[i]] for i, _ in lexical_index.search(query, n_results)]
+            _, stats = packer.pack(results)
+            raw.append(stats["raw_context_tokens"])
+            packed.append(stats["packed_context_tokens"])
+            duplicates += stats["duplicates_dropped"]
+        report[f"n_results={n_results}"] = {
+            "queries": len(queries),
+            "avg_raw_tokens": round(statistics.mean(raw), 1),
+            "avg_packed_tokens": round(statistics.mean(packed), 1),
+            "max_packed_tokens": max(packed),
+            "duplicates_dropped": duplicates,
+            "savings_rate": round(1 - sum(packed) / sum(raw), 3)
+        }
+    print_report(f"Prompt context tokens (budget {budget})", report)
+    return report
+
+# --- Cache payload size ---
+def bench_payloads(count=10000, n_results=3, seed=7, compress_threshold=256):
+    """Redis bytes per 10k cached queries: full JSON retrievals and raw answers vs chunk ids and compressed answers"""
+    import json
+    import random
+    from cache_codec import PayloadCodec
+    from cache_keys import llm_cache_key, semantic_cache_key
+    from context_packer import ContextPacker
+    from fakes import FIRST_NAMES, FakeRedis, synthetic_queries
+    from knowledge_base import flatten_knowledge, load_knowledge
+    from lexical_index import BM25Index
+
+    knowledge = load_knowledge()
+    chunks = flatten_knowledge(knowledge)
+    table = {chunk["id"]: chunk for chunk in chunks}
+    lexical_index = BM25Index(chunks)
+    packer = ContextPacker()
+    codec = PayloadCodec(lambda: table, compress_threshold)
+    rng = random.Random(seed)
+    before, after = FakeRedis(), FakeRedis()
+    encode_times, decode_times = [], []
+    for number, item in enumerate(synthetic_queries(knowledge, count, seed)):
+        query = item["user_query"]
+        hits = [index for index, _ in lexical_index.search(query, n_results)]
+        # Queries without keyword hits get what a vector search would return: some chunks
+        hits += [index for index in rng.sample(range(len(chunks)), n_results) if index not in hits]
+        results = [[chunks[index]["content"], dict(chunks[index])] for index in hits[:n_results]]
+        context, _ = packer.pack(results)
+        answer = (f"Hi {rng.choice(FIRST_NAMES)},\n\nThanks for reaching out. {context}\n\n"
+                  "Let us know if you have any other questions.\n\nRegards,\nHR Team")
+        # Every query gets its own key, as distinct employee questions would
+        normalized = f"{query.lower()} #{number}"
+        semantic_key = semantic_cache_key(normalized, n_results, "bench")
+        llm_key = llm_cache_key(normalized, results, "gpt-3.5-turbo", "v1", "bench")
+
+        before.set(semantic_key, json.dumps(results))
+        before.set(llm_key, answer)
+        start = time.perf_counter()
+        encoded_results, encoded_answer = codec.encode_retrieval(results), codec.encode_text(answer)
+        encode_times.append(time.perf_counter() - start)
+        after.set(semantic_key, encoded_results)
+        after.set(llm_key, encoded_answer)
+        start = time.perf_counter()
+        decoded = codec.decode_retrieval(encoded_results), codec.decode_text(encoded_answer)
+        decode_times.append(time.perf_counter() - start)
+        assert decoded == (results, answer)
+
+    def sizes(client):
+        semantic, llm = client.payload_bytes("semantic:*"), client.payload_bytes("llm:*")
+        return {
+            "semantic_bytes": semantic,
+            "llm_bytes": llm,
+            "total_bytes": semantic + llm,
+            "bytes_per_10k_queries": round((semantic + llm) * 10000 / count)
+        }
+
+    report = {"queries": count, "keys": before.dbsize(), "before": sizes(before), "after": sizes(after)}
+    report["reduction"] = {
+        name: round(1 - report["after"][name] / report["before"][name], 3)
+        for name in ("semantic_bytes", "llm_bytes", "total_bytes")
+    }
+    stats = codec.stats()
+    report["codec"] = {
+        "answers_compressed": stats["texts_compressed"],
+        "answer_compression_ratio": stats["text_compression_ratio"],
+        "encode_us_mean": round(statistics.mean(encode_times) * 1e6, 1),
+        "decode_us_mean": round(statistics.mean(decode_times) * 1e6, 1)
+    }
+    print_report("Cached payload bytes (key + value; Redis adds a fixed overhead per key)", report)
+    return report
+
+# --- Server import time ---
+# Imported lazily by the server; none of these may load while `import mcp_server` runs
+DEFERRED_IMPORTS = ("chromadb", "openai", "redis", "googleapiclient.discovery", "google_auth_oauthlib", "httplib2")
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us, depth)} from `python -X importtime` output"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+def bench_importtime(module="mcp_server", rounds=5, budget_ms=2000, top=8):
+    """Regression check on `python -X importtime -c "import mcp_server"`: total time and deferred backends"""
+    import os
+    import subprocess
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    totals, modules = [], {}
+    for _ in range(rounds):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=here, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(proc.stderr[-2000:])
+            sys.exit(1)
+        modules = parse_importtime(proc.stderr)
+        totals.append(modules[module][1] / 1000)
+    direct = sorted(
+        ((name, cumulative) for name, (_, cumulative, depth) in modules.items() if depth == 1),
+        key=lambda item: item[1], reverse=True
+    )
+    eager = [name for name in DEFERRED_IMPORTS if name in modules]
+    report = {
+        "rounds": rounds,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "budget_ms": budget_ms,
+        "heaviest_imports_ms": {name: round(cumulative / 1000, 1) for name, cumulative in direct[:top]},
+        "deferred_imports_loaded": eager
+    }
+    print_report(f"Import time of {module}", report)
+    if report["median_ms"] > budget_ms or eager:
+        print("IMPORT TIME REGRESSION")
+        sys.exit(1)
+    return report
+
+# --- Instrumentation overhead ---
+def bench_metrics(iterations=200_000, budget_us=5.0):
+    """Cost of one latency span (with and without the JSONL trace) against a per-span budget"""
+    import os
+    import tempfile
+    from metrics import Metrics
+
+    def per_call_us(fn):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - start) / iterations * 1e6
+
+    def empty():
+        pass
+
+    metrics = Metrics()
+
+    def spanned():
+        with metrics.span("bench"):
+            pass
+
+    trace_path = os.path.join(tempfile.mkdtemp(), "trace.jsonl")
+    traced_metrics = Metrics(trace_path=trace_path)
+
+    def traced():
+        with traced_metrics.span("bench"):
+            pass
+
+    baseline = per_call_us(empty)
+    report = {
+        "iterations": iterations,
+        "span_us": round(per_call_us(spanned) - baseline, 3),
+        "traced_span_us": round(per_call_us(traced) - baseline, 3),
+        "budget_us": budget_us
+    }
+    traced_metrics.close()
+    os.remove(trace_path)
+    print_report("Latency span overhead", report)
+    if report["span_us"] > budget_us:
+        print("OVERHEAD BUDGET EXCEEDED")
+        sys.exit(1)
+    return report
+
+# --- Offline end-to-end benchmark ---
+def offline_server(gmail_service, llm, redis_latency=0.0005, send_quota_units_per_second=25000):
+    """mcp_server wired to fakes: Gmail, OpenAI, Redis and the embedding model, with in-memory stores.
+
+    Caches, stores, the inbox sync, the auto-responder daemon, metrics and the
+    send scheduler are rebuilt on every call, so each benchmark run starts
+    cold. Embeddings come from a deterministic FakeEmbeddingFunction and the
+    vector index and fast path snapshots live in a temporary directory, so
+    nothing touches the network or the snapshots in the working directory.
+    """
+    import atexit
+    import os
+    import shutil
+    import tempfile
+    from types import SimpleNamespace
+    import mcp_server as server
+    from cache import CircuitBreaker, TieredCache
+    from config import get_l1_cache_config, get_semantic_cache_config, get_single_flight_config
+    from fakes import FakeRedis, install_fake_embeddings
+    from inbox_sync import InboxSync
+    from kb_reload import ChunkRefs
+    from lazy import Lazy
+    from mail_store import MailStore
+    from metrics import Metrics
+    from responder_daemon import ResponderDaemon
+    from semantic_cache import SemanticCache
+    from send_scheduler import SendRetryQueue, SendScheduler, TokenBucket
+    from singleflight import SingleFlight
+
+    install_fake_embeddings()
+    index_dir = tempfile.mkdtemp(prefix="bench-index-")
+    atexit.register(shutil.rmtree, index_dir, True)
+    os.environ["VECTOR_BACKEND"] = "numpy"
+    os.environ["VECTOR_INDEX_PATH"] = os.path.join(index_dir, "vector_index")
+    server._vector_backend = None
+    server._fast_path = None
+
+    fake_redis = FakeRedis(latency=redis_latency)
+    server.cache = TieredCache(fake_redis, breaker=CircuitBreaker(), async_redis=None, **get_l1_cache_config())
+    server.llm_flight = SingleFlight(server.cache, **get_single_flight_config())
+    server.semantic_cache = SemanticCache(**get_semantic_cache_config())
+    server.chunk_refs = ChunkRefs(server.cache)
+    server._kb_version.update(value=None, checked_at=0.0)
+    server.metrics = Metrics()
+    server.gmail_holder = SimpleNamespace(get_service=lambda: gmail_service, token_path="token.json")
+    server.get_openai_client = lambda: llm
+
+    store = MailStore(":memory:")
+    server.mail_store = Lazy(lambda: store, 'mail_store')
+    server.send_retry_queue = Lazy(lambda: SendRetryQueue(":memory:"), 'send_queue')
+    server.LAZY_BACKENDS = [
+        lazy for lazy in server.LAZY_BACKENDS if lazy.name not in ('mail_store', 'send_queue')
+    ] + [server.mail_store, server.send_retry_queue]
+    server.send_scheduler = SendScheduler(
+        server.send_with_shared_service,
+        TokenBucket(send_quota_units_per_second, send_quota_units_per_second),
+        server.send_retry_queue,
+        base_delay=0.05, max_delay=0.5,
+        on_sent=store.mark_responded,
+        on_failed=store.release_claim
+    )
+    server.inbox_sync = InboxSync(
+        server.mail_store, server.get_gmail_service, bootstrap_limit=server.mail_store_config['bootstrap_limit']
+    )
+    daemon = server.responder_daemon
+    server.responder_daemon = ResponderDaemon(
+        server.mail_store, server.inbox_sync.sync, server.batch_auto_respond, daemon.scorer,
+        sla_seconds=daemon.sla_seconds, poll_interval=daemon.poll_interval, workers=daemon.workers,
+        batch_size=daemon.batch_size, max_queue=daemon.queue.max_size, lookback_seconds=daemon.lookback_seconds,
+        metrics=server.metrics, own_addresses=daemon.own_addresses
+    )
+    server.get_fast_path()
+    return server, fake_redis
+
+def run_batch_benchmark(batch, gmail_latency, llm_tokens_per_second, llm_ttft, redis_latency, send_quota):
+    from fakes import FakeGmailService, FakeLLM
+
+    gmail = FakeGmailService(latency=gmail_latency, quota_units_per_second=send_quota)
+    llm = FakeLLM(tokens_per_second=llm_tokens_per_second, ttft=llm_ttft)
+    server, fake_redis = offline_server(gmail, llm, redis_latency, send_quota)
+    start = time.perf_counter()
+    outcome = server.batch_auto_respond(batch)
+    elapsed = time.perf_counter() - start
+    results = outcome["results"]
+    processed = [r for r in results if r["timings"]]
+    # Per-email wall-clock latency, from entering the pipeline until sent, including waits between stages
+    latencies = [r["seconds"] for r in processed]
+    stages = sorted({name for r in processed for name in r["timings"]})
+    namespaces = server.cache.namespace_stats()
+    return {
+        "emails": len(batch),
+        "seconds": round(elapsed, 3),
+        "emails_per_sec": round(len(batch) / elapsed, 2),
+        "latency": latency_summary(latencies),
+        "stage_latency": {
+            name: latency_summary([r["timings"][name] for r in processed if name in r["timings"]]) for name in stages
+        },
+        "cache_hit_rate": {name: counts["hit_rate"] for name, counts in namespaces.items()},
+        "semantic_cache_hit_rate": server.semantic_cache.stats().get("hit_rate", 0.0),
+        "llm_calls": llm.calls,
+        "llm_skip_ratio": outcome["stats"]["llm_skip_ratio"],
+        "clusters": outcome["stats"]["clusters"]["count"],
+        "send_status": outcome["stats"]["send_status"],
+        "gmail_round_trips": gmail.round_trips,
+        "gmail_quota_errors": gmail.quota_errors,
+        "redis_round_trips": fake_redis.round_trips
+    }
+
+def bench_get_mails(knowledge, inbox_size=200, limit=20, rounds=20, gmail_latency=0.02, seed=7):
+    """get_mails tool latency against a synthetic inbox: Gmail with and without bodies, and the local store"""
+    import asyncio
+    from fakes import FakeGmailService, FakeLLM, synthetic_inbox
+
+    gmail = FakeGmailService(synthetic_inbox(knowledge, inbox_size, seed), latency=gmail_latency)
+    server, _ = offline_server(gmail, FakeLLM())
+    report = {}
+    variants = {
+        "headers_only": {"headers_only": True},
+        "full": {"headers_only": False},
+        # The first call bootstraps the in-memory store through the fake Gmail history feed
+        "store": {"source": "store"}
+    }
+    for name, kwargs in variants.items():
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            emails = asyncio.run(server.get_mails(limit=limit, **kwargs))
+            times.append(time.perf_counter() - start)
+        assert len(emails) == limit and "error" not in emails[0], emails[:1]
+        report[name] = latency_summary(times)
+    return report
+
+def compare_baseline(report, baseline, tolerance):
+    """Regressions of throughput or p95 latency beyond `tolerance` (a fraction) against a baseline"""
+    regressions = []
+    for size, current in report["batches"].items():
+        previous = baseline.get("batches", {}).get(size)
+        if previous is None:
+            continue
+        if current["emails_per_sec"] < previous["emails_per_sec"] * (1 - tolerance):
+            regressions.append(f"batch {size}: {current['emails_per_sec']} emails/sec "
+                               f"(baseline {previous['emails_per_sec']})")
+        if current["latency"]["p95_ms"] > previous["latency"]["p95_ms"] * (1 + tolerance):
+            regressions.append(f"batch {size}: p95 {current['latency']['p95_ms']} ms "
+                               f"(baseline {previous['latency']['p95_ms']} ms)")
+    return regressions
+
+def bench_responder(sizes=(1, 10, 100, 1000), seed=7, gmail_latency=0.02, llm_tokens_per_second=200.0,
+                    llm_ttft=0.2, redis_latency=0.0005, send_quota=25000, baseline_path="bench_baseline.json",
+                    tolerance=0.2):
+    """Offline batch_respond_to_emails throughput/latency and get_mails latency with fake Gmail, LLM and Redis"""
+    import json
+    import os
+    from fakes import synthetic_batch
+    from knowledge_base import load_knowledge
+
+    knowledge = load_knowledge()
+    report = {
+        "config": {
+            "seed": seed, "gmail_latency": gmail_latency, "llm_tokens_per_second": llm_tokens_per_second,
+            "llm_ttft": llm_ttft, "redis_latency": redis_latency, "send_quota_units_per_second": send_quota,
+            "embeddings": "fake", "latency": "wall_clock"
+        },
+        "batches": {
+            str(size): run_batch_benchmark(synthetic_batch(knowledge, size, seed), gmail_latency,
+                                           llm_tokens_per_second, llm_ttft, redis_latency, send_quota)
+            for size in sizes
+        },
+        "get_mails": bench_get_mails(knowledge, gmail_latency=gmail_latency, seed=seed)
+    }
+    print_report("Offline responder benchmark", report)
+
+    if os.path.exists(baseline_path) and os.getenv("BENCH_SAVE_BASELINE") != "1":
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"Baseline {baseline_path} was recorded with a different config; not comparing")
+            return report
+        regressions = compare_baseline(report, baseline, tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {baseline_path} (tolerance {tolerance:.0%})")
+    else:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+    return report
+
+BENCHMARKS = {
+    "hybrid": bench_hybrid,
+    "parity": bench_parity,
+    "mime": bench_mime,
+    "context": bench_context,
+    "payloads": bench_payloads,
+    "importtime": bench_importtime,
+    "metrics": bench_metrics,
+    "responder": bench_responder
+}
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in BENCHMARKS:
+        BENCHMARKS[sys.argv[1]]()
+    else:
+        print("Usage:")
+        for name, fn in BENCHMARKS.items():
+            print(f"  python bench.py {name:<10} # {fn.__doc__}")
@@ -0,0 +1,498 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# L1 marker for keys a get_many just found missing in Redis
+_MISSING = object()
+
+
+def redis_error():
+    """redis.RedisError, imported on first use (redis takes ~200 ms to import)"""
+    import redis
+    return redis.RedisError
+
+
+def key_namespace(key: str) -> str:
+    """Namespace of a cache key: the part before the first ':' ('semantic', 'llm', ...)"""
+    return key.split(':', 1)[0]
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_size: int = 2048, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures.
+
+    While open, calls fail fast for `reset_timeout` seconds; then a single
+    probe is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {'opens': 0, 'fast_fails': 0, 'failures': 0}
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the protected backend right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats['fast_fails'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._stats['failures'] += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._stats['opens'] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {'state': self._state, 'consecutive_failures': self._failures, **self._stats}
+
+
+class TieredCache:
+    """Two-tier cache: an in-process LRU (L1) in front of Redis (L2).
+
+    Single-key reads hit L1 first and only go to Redis on a miss. get_many and
+    set_many cover a whole batch with one MGET / one pipelined round trip.
+    Keys a get_many finds missing are remembered for `negative_ttl` seconds
+    so the follow-up single-key reads of a batch do not go back to Redis.
+    Inside `deferred_writes()` Redis writes are buffered and flushed with
+    set_many, while L1 is updated immediately so later reads still hit. The
+    deferral follows the context that opened it (contextvars: its thread or
+    task, and the pipeline stages it runs); writes from other threads go
+    straight to Redis.
+
+    Redis calls go through a circuit breaker. Errors and timeouts never reach
+    the caller: they count as misses, and once the breaker opens the cache
+    serves from a local in-memory fallback store until a probe succeeds.
+
+    With an `async_redis` client (redis.asyncio), aget/aset/aget_direct give
+    async tools the same tiers, breaker and stats without blocking the loop.
+
+    Either client may be given as a zero-argument factory (e.g. a `lazy.Lazy`)
+    instead; it is called on the first Redis round trip. Lookups are also
+    counted per key namespace ('semantic', 'llm', ...).
+    """
+
+    def __init__(self, redis_client, l1_size: int = 2048, l1_ttl: float = 300,
+                 flush_size: int = 100, negative_ttl: float = 30, breaker: Optional[CircuitBreaker] = None,
+                 fallback_size: int = 10000, async_redis=None):
+        self._redis = redis_client
+        self._async_redis = async_redis
+        self.l1 = LRUCache(l1_size, l1_ttl)
+        self.fallback = LRUCache(fallback_size, ttl=24 * 3600)
+        self.breaker = breaker or CircuitBreaker()
+        self.flush_size = flush_size
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        # The calling context's deferred write buffer, None outside deferred_writes()
+        self._deferred = contextvars.ContextVar(f"deferred_writes_{id(self)}", default=None)
+        self._stats = {
+            'l1_hits': 0, 'l1_misses': 0, 'negative_hits': 0,
+            'l2_hits': 0, 'l2_misses': 0, 'l2_round_trips': 0, 'l2_errors': 0,
+            'fallback_hits': 0, 'fallback_misses': 0
+        }
+        self._namespaces = {}  # namespace -> {'l1_hits', 'l2_hits', 'misses'}
+
+    @property
+    def redis(self):
+        if callable(self._redis):
+            self._redis = self._redis()
+        return self._redis
+
+    @property
+    def async_redis(self):
+        if callable(self._async_redis):
+            self._async_redis = self._async_redis()
+        return self._async_redis
+
+    @property
+    def degraded(self) -> bool:
+        """True while the breaker keeps Redis out of the request path"""
+        return self.breaker.state != CircuitBreaker.CLOSED
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.l1.get(key)
+        if value is _MISSING:
+            self._count(negative_hits=1)
+            self._count_namespace(key, 'misses')
+            return None
+        if value is not None:
+            self._count(l1_hits=1)
+            self._count_namespace(key, 'l1_hits')
+            return value
+        self._count(l1_misses=1)
+        ok, value = self._call_l2(lambda: self.redis.get(key))
+        if not ok:
+            value = self._fallback_get(key)
+        else:
+            self._count(**{'l2_hits' if value is not None else 'l2_misses': 1})
+            if value is None:
+                # Entries written while Redis was down stay readable after it recovers
+                value = self.fallback.get(key)
+            if value is not None:
+                self.l1.set(key, value)
+        self._count_namespace(key, 'l2_hits' if value is not None else 'misses')
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Async get: L1, then Redis through the async client"""
+        value = self.l1.get(key)
+        if value is _MISSING:
+            self._count(negative_hits=1)
+            self._count_namespace(key, 'misses')
+            return None
+        if value is not None:
+            self._count(l1_hits=1)
+            self._count_namespace(key, 'l1_hits')
+            return value
+        self._count(l1_misses=1)
+        ok, value = await self._acall_l2(lambda: self.async_redis.get(key))
+        if not ok:
+            value = self._fallback_get(key)
+        else:
+            self._count(**{'l2_hits' if value is not None else 'l2_misses': 1})
+            if value is None:
+                value = self.fallback.get(key)
+            if value is not None:
+                self.l1.set(key, value)
+        self._count_namespace(key, 'l2_hits' if value is not None else 'misses')
+        return value
+
+    async def aset(self, key: str, value: str, ex: int = 3600):
+        self.l1.set(key, value, ex)
+        ok, _ = await self._acall_l2(lambda: self.async_redis.set(key, value, ex=ex))
+        if not ok:
+            self.fallback.set(key, value, ex)
+
+    async def aget_direct(self, key: str):
+        """Async get_direct. Returns (ok, value)"""
+        return await self._acall_l2(lambda: self.async_redis.get(key))
+
+    def get_direct(self, key: str):
+        """Read from Redis bypassing L1, for values that must not be stale. Returns (ok, value)"""
+        return self._call_l2(lambda: self.redis.get(key))
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Look up many keys: L1 first, then one MGET for the rest. Returns only found keys"""
+        found, missing = {}, []
+        keys = list(dict.fromkeys(keys))
+        for key in keys:
+            value = self.l1.get(key)
+            if value is _MISSING:
+                continue
+            if value is not None:
+                found[key] = value
+            else:
+                missing.append(key)
+        self._count(l1_hits=len(found), l1_misses=len(missing))
+        l1_found = set(found)
+        if missing:
+            ok, values = self._call_l2(lambda: self.redis.mget(missing))
+            if not ok:
+                for key in missing:
+                    value = self._fallback_get(key)
+                    if value is not None:
+                        found[key] = value
+            else:
+                l2_hits = 0
+                for key, value in zip(missing, values):
+                    if value is not None:
+                        found[key] = value
+                        self.l1.set(key, value)
+                        l2_hits += 1
+                    else:
+                        self.l1.set(key, _MISSING, self.negative_ttl)
+                self._count(l2_hits=l2_hits, l2_misses=len(missing) - l2_hits)
+        for key in keys:
+            self._count_namespace(key, 'l1_hits' if key in l1_found else 'l2_hits' if key in found else 'misses')
+        return found
+
+    def set(self, key: str, value: str, ex: int = 3600, defer: bool = True):
+        """Write to L1 and Redis; inside deferred_writes() the Redis write is buffered unless defer=False"""
+        self.l1.set(key, value, ex)
+        pending = self._deferred.get() if defer else None
+        if pending is not None:
+            with self._lock:
+                pending.append((key, value, ex))
+                if len(pending) < self.flush_size:
+                    return
+                items, pending[:] = list(pending), []
+            self._write_many(items)
+            return
+        ok, _ = self._call_l2(lambda: self.redis.set(key, value, ex=ex))
+        if not ok:
+            self.fallback.set(key, value, ex)
+
+    def set_many(self, mapping: Dict[str, str], ex: int = 3600):
+        """Write many keys to L1 and to Redis in one pipelined round trip"""
+        for key, value in mapping.items():
+            self.l1.set(key, value, ex)
+        self._write_many([(key, value, ex) for key, value in mapping.items()])
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self.l1.delete(key)
+            self.fallback.delete(key)
+        if keys:
+            self._call_l2(lambda: self.redis.delete(*keys))
+
+    def add_expiring_members(self, members: Dict[str, Iterable[str]], ex: int = 3600) -> bool:
+        """ZADD members scored by when they expire, drop the expired ones and refresh each key's expiry,
+        in one pipelined round trip; False if Redis is unavailable"""
+        if not members:
+            return True
+
+        def write():
+            pipe = self.redis.pipeline(transaction=False)
+            self._queue_expiring_members(pipe, members, ex)
+            return pipe.execute()
+
+        ok, _ = self._call_l2(write)
+        return ok
+
+    async def aadd_expiring_members(self, members: Dict[str, Iterable[str]], ex: int = 3600) -> bool:
+        if not members:
+            return True
+
+        async def write():
+            pipe = self.async_redis.pipeline(transaction=False)
+            self._queue_expiring_members(pipe, members, ex)
+            return await pipe.execute()
+
+        ok, _ = await self._acall_l2(write)
+        return ok
+
+    @staticmethod
+    def _queue_expiring_members(pipe, members, ex):
+        # Each key expires with its newest member; older members are trimmed on every add
+        now = time.time()
+        for key, values in members.items():
+            pipe.zadd(key, {value: now + ex for value in values})
+            pipe.zremrangebyscore(key, '-inf', now)
+            pipe.expire(key, ex)
+
+    def live_members(self, keys: List[str]) -> Tuple[bool, Set[str]]:
+        """Union of the unexpired members of the sorted sets at `keys`. Returns (ok, members)"""
+        if not keys:
+            return True, set()
+
+        def read():
+            now = time.time()
+            pipe = self.redis.pipeline(transaction=False)
+            for key in keys:
+                pipe.zrangebyscore(key, now, '+inf')
+            return pipe.execute()
+
+        ok, found = self._call_l2(read)
+        return ok, set().union(*(found or ()))
+
+    def try_lock(self, key: str, token: str, ttl: float) -> Optional[bool]:
+        """SET NX a lock key. Returns True/False, or None if Redis is unavailable"""
+        ok, acquired = self._call_l2(lambda: self.redis.set(key, token, nx=True, ex=max(1, int(ttl))))
+        return bool(acquired) if ok else None
+
+    def unlock(self, key: str, token: str):
+        """Release a lock key if it is still held with `token`"""
+        ok, holder = self._call_l2(lambda: self.redis.get(key))
+        if ok and holder == token:
+            self._call_l2(lambda: self.redis.delete(key))
+
+    async def atry_lock(self, key: str, token: str, ttl: float) -> Optional[bool]:
+        ok, acquired = await self._acall_l2(lambda: self.async_redis.set(key, token, nx=True, ex=max(1, int(ttl))))
+        return bool(acquired) if ok else None
+
+    async def aunlock(self, key: str, token: str):
+        ok, holder = await self._acall_l2(lambda: self.async_redis.get(key))
+        if ok and holder == token:
+            await self._acall_l2(lambda: self.async_redis.delete(key))
+
+    @contextmanager
+    def deferred_writes(self):
+        """Buffer this context's Redis writes until the block exits (or flush_size is reached)"""
+        if self._deferred.get() is not None:
+            # Nested: the outermost block flushes
+            yield self
+            return
+        pending = []
+        token = self._deferred.set(pending)
+        try:
+            yield self
+        finally:
+            self._deferred.reset(token)
+            with self._lock:
+                items, pending[:] = list(pending), []
+            self._write_many(items)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        l1_lookups = stats['l1_hits'] + stats['l1_misses']
+        l2_lookups = stats['l2_hits'] + stats['l2_misses']
+        fallback_lookups = stats['fallback_hits'] + stats['fallback_misses']
+        return {
+            'l1': {
+                'hits': stats['l1_hits'],
+                'misses': stats['l1_misses'],
+                'hit_rate': round(stats['l1_hits'] / l1_lookups, 4) if l1_lookups else 0.0,
+                'negative_hits': stats['negative_hits'],
+                'size': len(self.l1)
+            },
+            'l2': {
+                'hits': stats['l2_hits'],
+                'misses': stats['l2_misses'],
+                'hit_rate': round(stats['l2_hits'] / l2_lookups, 4) if l2_lookups else 0.0,
+                'round_trips': stats['l2_round_trips'],
+                'errors': stats['l2_errors']
+            },
+            'fallback': {
+                'hits': stats['fallback_hits'],
+                'misses': stats['fallback_misses'],
+                'hit_rate': round(stats['fallback_hits'] / fallback_lookups, 4) if fallback_lookups else 0.0,
+                'size': len(self.fallback)
+            },
+            'circuit_breaker': self.breaker.stats(),
+            'namespaces': self.namespace_stats()
+        }
+
+    def namespace_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Lookups per key namespace: L1 hits, L2 hits (Redis or its fallback) and misses"""
+        with self._lock:
+            namespaces = {name: dict(counts) for name, counts in self._namespaces.items()}
+        for counts in namespaces.values():
+            lookups = counts['l1_hits'] + counts['l2_hits'] + counts['misses']
+            counts['hit_rate'] = round((counts['l1_hits'] + counts['l2_hits']) / lookups, 4) if lookups else 0.0
+        return namespaces
+
+    def _call_l2(self, fn):
+        """Run a Redis call through the breaker. Returns (ok, result)"""
+        if not self.breaker.allow():
+            return False, None
+        try:
+            result = fn()
+        except redis_error():
+            self.breaker.record_failure()
+            self._count(l2_round_trips=1, l2_errors=1)
+            return False, None
+        self.breaker.record_success()
+        self._count(l2_round_trips=1)
+        return True, result
+
+    async def _acall_l2(self, fn):
+        if self.async_redis is None or not self.breaker.allow():
+            return False, None
+        try:
+            result = await fn()
+        except redis_error():
+            self.breaker.record_failure()
+            self._count(l2_round_trips=1, l2_errors=1)
+            return False, None
+        self.breaker.record_success()
+        self._count(l2_round_trips=1)
+        return True, result
+
+    def _fallback_get(self, key):
+        value = self.fallback.get(key)
+        self._count(**{'fallback_hits' if value is not None else 'fallback_misses': 1})
+        if value is not None:
+            self.l1.set(key, value)
+        return value
+
+    def _write_many(self, items):
+        if not items:
+            return
+
+        def write():
+            pipe = self.redis.pipeline(transaction=False)
+            for key, value, ex in items:
+                pipe.set(key, value, ex=ex)
+            return pipe.execute()
+
+        ok, _ = self._call_l2(write)
+        if not ok:
+            for key, value, ex in items:
+                self.fallback.set(key, value, ex)
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def _count_namespace(self, key, outcome):
+        namespace = key_namespace(key)
+        with self._lock:
+            counts = self._namespaces.get(namespace)
+            if counts is None:
+                counts = self._namespaces[namespace] = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0}
+            counts[outcome] += 1
@@ -0,0 +1,97 @@
+import base64
+import json
+import threading
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from cache_keys import chunk_identity
+
+# Prefix of compressed text values; generated answers never start with the unit separator
+COMPRESSED_PREFIX = "\x1fz"
+
+
+class PayloadCodec:
+    """Compact encodings for cached retrievals and answers.
+
+    A retrieval is stored as the ids of its chunks in rank order, resolved
+    on read against the chunk table of the loaded knowledge base
+    (`table_fn()`, id -> chunk), instead of repeating every chunk's text and
+    metadata under every query key. A chunk the table lacks or holds with
+    different text is stored inline as [doc, meta], which is how all entries
+    used to be stored, so older entries still decode.
+
+    Answers of `compress_threshold` bytes or more are deflate-compressed when
+    that makes them smaller. Cache values are text (the Redis clients decode
+    responses), so the compressed bytes are base85-encoded.
+    """
+
+    def __init__(self, table_fn: Callable[[], Dict[str, Dict[str, Any]]], compress_threshold: int = 256,
+                 level: int = 6):
+        self.table_fn = table_fn
+        self.compress_threshold = compress_threshold
+        self.level = level
+        self._lock = threading.Lock()
+        self._stats = {
+            'retrievals': 0, 'chunks_by_id': 0, 'chunks_inline': 0, 'unresolved': 0,
+            'texts': 0, 'texts_compressed': 0, 'text_bytes': 0, 'text_bytes_stored': 0
+        }
+
+    def encode_retrieval(self, results: Sequence) -> str:
+        table = self.table_fn()
+        items, by_id = [], 0
+        for doc, meta in results:
+            chunk = table.get(chunk_identity(doc, meta))
+            if chunk is not None and chunk['content'] == doc:
+                items.append(chunk['id'])
+                by_id += 1
+            else:
+                items.append([doc, meta])
+        self._count(retrievals=1, chunks_by_id=by_id, chunks_inline=len(items) - by_id)
+        return json.dumps(items, separators=(',', ':'))
+
+    def decode_retrieval(self, value: str) -> Optional[List]:
+        """[doc, meta] pairs, or None if a chunk id is no longer in the knowledge base"""
+        table = self.table_fn()
+        results = []
+        for item in json.loads(value):
+            if isinstance(item, str):
+                chunk = table.get(item)
+                if chunk is None:
+                    self._count(unresolved=1)
+                    return None
+                item = [chunk['content'], dict(chunk)]
+            results.append(item)
+        return results
+
+    def encode_text(self, text: str) -> str:
+        raw = text.encode('utf-8')
+        stored = text
+        if len(raw) >= self.compress_threshold or text.startswith(COMPRESSED_PREFIX):
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, -15)
+            packed = COMPRESSED_PREFIX + base64.b85encode(compressor.compress(raw) + compressor.flush()).decode('ascii')
+            if len(packed) < len(raw) or text.startswith(COMPRESSED_PREFIX):
+                stored = packed
+        self._count(texts=1, texts_compressed=int(stored is not text), text_bytes=len(raw),
+                    text_bytes_stored=len(raw) if stored is text else len(stored))
+        return stored
+
+    def decode_text(self, value: str) -> str:
+        if value.startswith(COMPRESSED_PREFIX):
+            return zlib.decompress(base64.b85decode(value[len(COMPRESSED_PREFIX):]), -15).decode('utf-8')
+        return value
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stored = stats['chunks_by_id'] + stats['chunks_inline']
+        stats['chunks_by_id_rate'] = round(stats['chunks_by_id'] / stored, 4) if stored else 0.0
+        stats['text_compression_ratio'] = (
+            round(stats['text_bytes'] / stats['text_bytes_stored'], 3) if stats['text_bytes_stored'] else 0.0
+        )
+        stats['compress_threshold'] = self.compress_threshold
+        return stats
@@ -0,0 +1,35 @@
+import hashlib
+import json
+
+# Redis key holding the knowledge-base version stamp written by `rag.py index`
+KB_VERSION_KEY = "kb:version"
+
+def _digest(parts):
+    payload = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def chunk_identity(doc, meta):
+    """Chunk id from its metadata, falling back to a digest of its text"""
+    if meta and meta.get("id"):
+        return meta["id"]
+    return hashlib.sha1(doc.encode("utf-8")).hexdigest()
+
+def kb_digest(chunks):
+    """Version stamp for a set of chunks: changes whenever any chunk is added, edited or removed"""
+    parts = sorted((chunk["id"], hashlib.sha1(chunk["content"].encode("utf-8")).hexdigest()) for chunk in chunks)
+    return _digest(parts)[:16]
+
+def semantic_cache_key(normalized_query, n_results, kb_version):
+    """Redis key for a retrieval result"""
+    return f"semantic:{kb_version}:{_digest([normalized_query, n_results])}"
+
+def llm_cache_key(normalized_query, context_chunks, model, prompt_version, kb_version):
+    """Content-addressed Redis key for a generated answer.
+
+    Stable across processes and replicas (unlike the salted built-in hash())
+    and changes whenever the query, retrieved chunks, model, prompt or
+    knowledge base version changes.
+    """
+    chunk_ids = [chunk_identity(doc, meta) for doc, meta in context_chunks]
+    chunk_digest = _digest([doc for doc, meta in context_chunks])
+    return f"llm:{kb_version}:{_digest([normalized_query, chunk_ids, chunk_digest, model, prompt_version])}"
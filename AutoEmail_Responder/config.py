@@ -0,0 +1,180 @@
+import os
+
+def get_redis_config():
+    """Get Redis connection settings from environment variables."""
+    return {
+        "host": os.getenv("REDIS_HOST", "localhost"),
+        "port": int(os.getenv("REDIS_PORT", "6379")),
+        "db": int(os.getenv("REDIS_DB", "0")),
+        "socket_timeout": float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.25")),
+        "socket_connect_timeout": float(os.getenv("REDIS_CONNECT_TIMEOUT", "0.25")),
+        "max_connections": int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+    }
+
+def get_circuit_breaker_config():
+    """Get failure threshold and cool-down for the Redis circuit breaker."""
+    return {
+        "failure_threshold": int(os.getenv("REDIS_BREAKER_FAILURES", "3")),
+        "reset_timeout": float(os.getenv("REDIS_BREAKER_COOLDOWN", "30"))
+    }
+
+def get_llm_model():
+    """Get the OpenAI chat model used for responses."""
+    return os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+
+def get_pipeline_workers():
+    """Get per-stage worker counts for batch auto-responding."""
+    return {
+        "retrieve": int(os.getenv("RETRIEVE_WORKERS", "4")),
+        "generate": int(os.getenv("GENERATE_WORKERS", "4")),
+        "send": int(os.getenv("SEND_WORKERS", "2"))
+    }
+
+def get_embedding_batch_size():
+    """Get how many chunks to embed per request when indexing."""
+    return int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+def get_semantic_cache_config():
+    """Get similarity threshold, size and TTL for the semantic query cache."""
+    return {
+        "threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+        "max_size": int(os.getenv("SEMANTIC_CACHE_SIZE", "1000")),
+        "ttl": float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+    }
+
+def get_l1_cache_config():
+    """Get size and TTL of the in-process cache tier in front of Redis."""
+    return {
+        "l1_size": int(os.getenv("L1_CACHE_SIZE", "2048")),
+        "l1_ttl": float(os.getenv("L1_CACHE_TTL", "300"))
+    }
+
+def get_blocking_io_workers():
+    """Get the thread pool size for blocking Gmail, Chroma and embedding calls."""
+    return int(os.getenv("BLOCKING_IO_WORKERS", "8"))
+
+def get_single_flight_config():
+    """Get lock TTL, poll interval and wait timeout for coalesced LLM generations."""
+    return {
+        "lock_ttl": float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "60")),
+        "poll_interval": float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.1")),
+        "wait_timeout": float(os.getenv("SINGLE_FLIGHT_WAIT_TIMEOUT", "60"))
+    }
+
+def get_hybrid_retrieval_config():
+    """Get the BM25 confidence thresholds for skipping the embedding call."""
+    return {
+        "min_score": float(os.getenv("LEXICAL_MIN_SCORE", "5.0")),
+        "min_margin": float(os.getenv("LEXICAL_MIN_MARGIN", "1.5"))
+    }
+
+def get_vector_backend_config():
+    """Get the vector retrieval backend ("chroma" or "numpy") and the numpy index path."""
+    return {
+        "backend": os.getenv("VECTOR_BACKEND", "chroma"),
+        "index_path": os.getenv("VECTOR_INDEX_PATH", "vector_index")
+    }
+
+def get_query_cluster_threshold():
+    """Get the cosine similarity threshold for grouping paraphrased queries in a batch."""
+    return float(os.getenv("QUERY_CLUSTER_THRESHOLD", "0.9"))
+
+def get_mail_store_config():
+    """Get the local SQLite mail store path, inbox sync settings and the reply retry and claim lease policy."""
+    return {
+        "path": os.getenv("MAIL_STORE_PATH", "mail_store.db"),
+        "sync_interval": float(os.getenv("INBOX_SYNC_INTERVAL", "30")),
+        "bootstrap_limit": int(os.getenv("INBOX_BOOTSTRAP_LIMIT", "500")),
+        "max_response_failures": int(os.getenv("RESPONSE_MAX_FAILURES", "5")),
+        "response_retry_delay": float(os.getenv("RESPONSE_RETRY_DELAY", "60")),
+        "response_claim_timeout": float(os.getenv("RESPONSE_CLAIM_TIMEOUT", "1800"))
+    }
+
+def get_send_scheduler_config():
+    """Get the Gmail send rate limit (in quota units), retry/backoff settings and the retry queue path."""
+    return {
+        "quota_units_per_second": float(os.getenv("SEND_QUOTA_UNITS_PER_SECOND", "250")),
+        "quota_burst": float(os.getenv("SEND_QUOTA_BURST", "500")),
+        "max_attempts": int(os.getenv("SEND_MAX_ATTEMPTS", "3")),
+        "base_delay": float(os.getenv("SEND_BACKOFF_BASE", "0.5")),
+        "max_delay": float(os.getenv("SEND_BACKOFF_MAX", "8")),
+        "queue_max_attempts": int(os.getenv("SEND_QUEUE_MAX_ATTEMPTS", "8")),
+        "queue_path": os.getenv("SEND_QUEUE_PATH", "send_queue.db"),
+        "retry_interval": float(os.getenv("SEND_RETRY_INTERVAL", "30"))
+    }
+
+def get_context_packer_config():
+    """Get the prompt context token budget and the near-duplicate chunk threshold."""
+    return {
+        "budget": int(os.getenv("CONTEXT_TOKEN_BUDGET", "600")),
+        "dedupe_threshold": float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.8"))
+    }
+
+def get_fast_path_config():
+    """Get whether FAQ/template answers may skip the LLM, the similarity they need and what may be auto-sent."""
+    templates = os.getenv(
+        "FAST_PATH_TEMPLATES", "Leave Approval,Policy Explanation,Reimbursement Status"
+    )
+    sensitive_terms = os.getenv(
+        "FAST_PATH_SENSITIVE_TERMS", "harassment,POSH,grievance,discrimination,misconduct,complaint"
+    )
+    return {
+        "enabled": os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes"),
+        "threshold": float(os.getenv("FAST_PATH_THRESHOLD", "0.88")),
+        "templates": [name.strip() for name in templates.split(",") if name.strip()],
+        "excluded_sections": [
+            name.strip() for name in os.getenv("FAST_PATH_EXCLUDED_SECTIONS", "Grievance & POSH Policy").split(",")
+            if name.strip()
+        ],
+        "sensitive_terms": [term.strip() for term in sensitive_terms.split(",") if term.strip()]
+    }
+
+def get_metrics_config():
+    """Get the optional JSONL trace file for latency spans (TRACE_FILE; unset = no trace)."""
+    return {
+        "trace_path": os.getenv("TRACE_FILE") or None
+    }
+
+def _parse_weights(value):
+    """Parse "key:weight,key:weight" into a dict of floats (a bare key weighs 1)."""
+    weights = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        key, _, weight = entry.rpartition(":") if ":" in entry else (entry, "", "1")
+        weights[key.strip().lower()] = float(weight)
+    return weights
+
+def get_daemon_config():
+    """Get the auto-responder daemon's SLA, worker pool, queue bound, priority weights and own addresses."""
+    return {
+        "enabled": os.getenv("AUTO_RESPOND_DAEMON", "false").lower() in ("1", "true", "yes"),
+        "sla_seconds": float(os.getenv("RESPONSE_SLA_SECONDS", "300")),
+        "poll_interval": float(os.getenv("DAEMON_POLL_INTERVAL", "15")),
+        "workers": int(os.getenv("DAEMON_WORKERS", "2")),
+        "batch_size": int(os.getenv("DAEMON_BATCH_SIZE", "10")),
+        "max_queue": int(os.getenv("DAEMON_MAX_QUEUE", "1000")),
+        "lookback_seconds": float(os.getenv("DAEMON_LOOKBACK_SECONDS", "0")),
+        "own_addresses": [
+            address.strip() for address in os.getenv("DAEMON_OWN_ADDRESSES", "").split(",") if address.strip()
+        ],
+        "age_weight": float(os.getenv("DAEMON_AGE_WEIGHT", "2")),
+        "domains": _parse_weights(os.getenv("DAEMON_PRIORITY_DOMAINS", "")),
+        "keywords": _parse_weights(os.getenv(
+            "DAEMON_PRIORITY_KEYWORDS", "urgent:2,asap:1,emergency leave:3,harassment:3,posh:3"
+        ))
+    }
+
+def get_kb_reload_config():
+    """Get whether the server watches knowledge_base.json for edits, how often, the re-invalidation delay,
+    and how many nearest chunks of an added item also have their cached entries dropped."""
+    return {
+        "enabled": os.getenv("KB_HOT_RELOAD", "true").lower() in ("1", "true", "yes"),
+        "interval": float(os.getenv("KB_RELOAD_INTERVAL", "2")),
+        "settle_seconds": float(os.getenv("KB_RELOAD_SETTLE_SECONDS", "30")),
+        "neighbours": int(os.getenv("KB_RELOAD_NEIGHBOURS", "5"))
+    }
+
+def get_cache_payload_config():
+    """Get the size (bytes) from which cached answers are compressed."""
+    return {
+        "compress_threshold": int(os.getenv("CACHE_COMPRESS_THRESHOLD", "256"))
+    }
@@ -0,0 +1,150 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lexical_index import tokenize
+
+# tiktoken is optional: without it (or without its cached encodings) tokens are estimated
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_encodings = {}
+_encodings_lock = threading.Lock()
+
+
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    with _encodings_lock:
+        if model not in _encodings:
+            try:
+                _encodings[model] = tiktoken.encoding_for_model(model)
+            except Exception:
+                try:
+                    _encodings[model] = tiktoken.get_encoding('cl100k_base')
+                except Exception:
+                    _encodings[model] = None
+        return _encodings[model]
+
+
+def count_tokens(text: str, model: str = 'gpt-3.5-turbo') -> int:
+    """Token count with the model's tiktoken encoding, or a word/punctuation estimate"""
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Roughly one token per word or symbol, plus one per 6 characters of long words
+    return sum(1 + len(piece) // 6 for piece in _PIECE_RE.findall(text))
+
+
+def compact_chunk(doc: str, meta: Optional[Dict[str, Any]]) -> str:
+    """Drop the boilerplate labels chunks are indexed with ("Section:", "Template Name:", ...)"""
+    meta = meta or {}
+    kind = meta.get('type')
+    if kind == 'policy' and meta.get('title'):
+        description = doc.split('Description:', 1)[-1].strip()
+        return f"{meta['title']}: {description}"
+    if kind == 'template' and meta.get('template_name'):
+        template = doc.split('Template:', 1)[-1].strip()
+        return f"{meta['template_name']} reply template:\n{template}"
+    return doc.strip()
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def truncate_to_tokens(text: str, budget: int, model: str) -> str:
+    """Cut text at a word boundary so it fits in `budget` tokens"""
+    words = text.split(' ')
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(' '.join(words[:middle]), model) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return ' '.join(words[:low])
+
+
+class ContextPacker:
+    """Packs retrieved chunks into a prompt context under a token budget.
+
+    Chunks are taken in relevance (retrieval) order with their boilerplate
+    labels stripped; a chunk whose terms overlap an already packed one by
+    `dedupe_threshold` (Jaccard) or more is dropped, and chunks that no longer
+    fit are skipped in favour of later, shorter ones. If even the most
+    relevant chunk is over budget it is truncated rather than dropped.
+    Token counts before/after packing are accumulated for stats().
+    """
+
+    def __init__(self, budget: int = 600, dedupe_threshold: float = 0.8, model: str = 'gpt-3.5-turbo'):
+        self.budget = budget
+        self.dedupe_threshold = dedupe_threshold
+        self.model = model
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0, 'raw_context_tokens': 0, 'packed_context_tokens': 0, 'prompt_tokens': 0,
+            'duplicates_dropped': 0, 'over_budget_dropped': 0, 'api_prompt_tokens': 0
+        }
+
+    def pack(self, context_chunks: Sequence) -> Tuple[str, Dict[str, Any]]:
+        """Returns (context text, per-request stats)"""
+        packed: List[str] = []
+        packed_terms: List[set] = []
+        used = raw = duplicates = dropped = 0
+        separator = count_tokens("\n\n", self.model)
+        for doc, meta in context_chunks:
+            raw += count_tokens(doc, self.model)
+            text = compact_chunk(doc, meta)
+            terms = set(tokenize(text))
+            if any(jaccard(terms, other) >= self.dedupe_threshold for other in packed_terms):
+                duplicates += 1
+                continue
+            tokens = count_tokens(text, self.model) + (separator if packed else 0)
+            if used + tokens > self.budget:
+                if packed:
+                    dropped += 1
+                    continue
+                text = truncate_to_tokens(text, self.budget, self.model)
+                tokens = count_tokens(text, self.model)
+            packed.append(text)
+            packed_terms.append(terms)
+            used += tokens
+        stats = {
+            'chunks': len(context_chunks),
+            'packed_chunks': len(packed),
+            'duplicates_dropped': duplicates,
+            'over_budget_dropped': dropped,
+            'raw_context_tokens': raw,
+            'packed_context_tokens': used
+        }
+        return "\n\n".join(packed), stats
+
+    def record(self, stats: Dict[str, Any], prompt_tokens: int):
+        """Account one request: its pack() stats and the total prompt tokens sent"""
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['prompt_tokens'] += prompt_tokens
+            for key in ('raw_context_tokens', 'packed_context_tokens', 'duplicates_dropped', 'over_budget_dropped'):
+                self._stats[key] += stats[key]
+
+    def record_usage(self, usage):
+        """Add the prompt tokens the API reports it actually billed"""
+        prompt_tokens = getattr(usage, 'prompt_tokens', None)
+        if prompt_tokens:
+            with self._lock:
+                self._stats['api_prompt_tokens'] += prompt_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        raw = stats['raw_context_tokens']
+        stats['context_tokens_saved'] = raw - stats['packed_context_tokens']
+        stats['context_savings_rate'] = round(stats['context_tokens_saved'] / raw, 4) if raw else 0.0
+        stats['avg_prompt_tokens'] = round(stats['prompt_tokens'] / stats['requests'], 1) if stats['requests'] else 0.0
+        stats['budget'] = self.budget
+        stats['tokenizer'] = 'tiktoken' if _encoding(self.model) is not None else 'estimate'
+        return stats
@@ -0,0 +1,33 @@
+import threading
+
+import numpy as np
+
+# Model behind chromadb's DefaultEmbeddingFunction; recorded in index snapshots
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+_embedding_function = None
+_lock = threading.Lock()
+
+def get_embedding_function():
+    """Shared embedding function, the same model ChromaDB uses for the collection"""
+    global _embedding_function
+    if _embedding_function is None:
+        with _lock:
+            if _embedding_function is None:
+                # Imported here: chromadb takes about a second to import
+                from chromadb.utils import embedding_functions
+                _embedding_function = embedding_functions.DefaultEmbeddingFunction()
+    return _embedding_function
+
+def embed_texts(texts):
+    """Embed texts in one call and return L2-normalized float32 rows"""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    vectors = np.asarray(get_embedding_function()(list(texts)), dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+def embed_query(text):
+    """Embed a single query as a normalized vector"""
+    return embed_texts([text])[0]
@@ -0,0 +1,630 @@
+# Local stand-ins for external services, for offline testing and benchmarks
+import asyncio
+import base64
+import fnmatch
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import httplib2
+import numpy as np
+import redis
+from googleapiclient.errors import HttpError
+
+# Gmail API quota units per call (users.messages.send costs 100, reads 5)
+GMAIL_QUOTA_UNITS = {'messages.list': 5, 'messages.get': 5, 'messages.send': 100, 'history.list': 2, 'getProfile': 1}
+
+
+def make_message(message_id, subject, sender, body, date="Mon, 1 Jan 2024 09:00:00 +0000", thread_id=None,
+                 headers=None):
+    """Build a Gmail API message resource with a single text/plain body (plus any extra `headers`)"""
+    return {
+        'id': message_id,
+        'threadId': thread_id or message_id,
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'From', 'value': sender},
+                {'name': 'Date', 'value': date},
+                *({'name': name, 'value': value} for name, value in (headers or {}).items())
+            ],
+            'body': {'data': base64.urlsafe_b64encode(body.encode('utf-8')).decode('utf-8')}
+        }
+    }
+
+
+def make_part(mime_type, text=None, parts=None, filename=None, charset='utf-8'):
+    """Build a Gmail API MIME part: a leaf with `text` (attachments get `filename`) or a multipart of `parts`"""
+    part = {'mimeType': mime_type, 'filename': filename or '', 'headers': [], 'body': {'size': 0}}
+    if parts is not None:
+        part['parts'] = parts
+        return part
+    data = (text or '').encode(charset)
+    part['headers'].append({'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'})
+    part['body'] = {'size': len(data), 'data': base64.urlsafe_b64encode(data).decode('ascii')}
+    if filename:
+        part['headers'].append({'name': 'Content-Disposition', 'value': f'attachment; filename="{filename}"'})
+        part['body']['attachmentId'] = f"att-{filename}"
+    return part
+
+
+class FakeRequest:
+    """Mimics googleapiclient's HttpRequest: a deferred call run by execute()"""
+
+    def __init__(self, service, method, fn, **kwargs):
+        self._service = service
+        self.method = method
+        self._fn = fn
+        self._kwargs = kwargs
+
+    def execute(self, http=None, num_retries=0):
+        self._service._round_trip()
+        self._service._charge(GMAIL_QUOTA_UNITS.get(self.method, 1))
+        return self._run()
+
+    def _run(self):
+        return self._fn(**self._kwargs)
+
+
+class FakeBatchRequest:
+    """Mimics BatchHttpRequest: all added requests cost one round trip"""
+
+    def __init__(self, service, callback=None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        request_id = request_id or str(len(self._requests) + 1)
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, http=None):
+        self._service._round_trip()
+        self._service.batch_calls += 1
+        for request_id, request, callback in self._requests:
+            try:
+                # Quota is charged per call inside the batch, so some calls may get a 429
+                self._service._charge(GMAIL_QUOTA_UNITS.get(request.method, 1))
+                response, exception = request._run(), None
+            except Exception as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class _Resource:
+    def __init__(self, **methods):
+        for name, fn in methods.items():
+            setattr(self, name, fn)
+
+
+class FakeGmailService:
+    """In-memory Gmail API with the users().messages() calls the server uses.
+
+    Every execute() (single or batch) counts as one HTTP round trip in
+    `round_trips` and sleeps `latency` seconds to model network wait.
+
+    It also keeps a history feed for users().history().list: add_message()
+    and delete_message() append records under an increasing historyId, and
+    expire_history() makes older start ids fail with 404 like Gmail does.
+
+    Statuses appended to `send_errors` (e.g. 429, 503) make the next sends
+    fail with that HttpError, one status per send; `get_errors` does the same
+    for message fetches. Fetching an unknown message is a 404.
+
+    With `quota_units_per_second`, calls are charged Gmail's quota units
+    (GMAIL_QUOTA_UNITS) over a sliding one-second window and fail with a
+    rate-limit 429 once it is used up, like Gmail's per-user limit.
+    """
+
+    def __init__(self, messages: Optional[List[Dict[str, Any]]] = None, latency: float = 0.0,
+                 quota_units_per_second: Optional[float] = None):
+        self.messages = {m['id']: m for m in (messages or [])}
+        self.latency = latency
+        self.quota_units_per_second = quota_units_per_second
+        self.round_trips = 0
+        self.batch_calls = 0
+        self.quota_units = 0
+        self.quota_errors = 0
+        self._quota_window = deque()  # (monotonic time, units) charged in the last second
+        self._quota_used = 0
+        self.sent: List[Dict[str, Any]] = []
+        self.send_errors: List[int] = []
+        self.get_errors: List[int] = []
+        self.history_id = 1000
+        self._history: List[Dict[str, Any]] = []
+        self._history_floor = 0
+        self._lock = threading.Lock()
+
+    def add_message(self, message: Dict[str, Any]):
+        """Deliver a message to the inbox and record it in the history feed"""
+        with self._lock:
+            self.messages[message['id']] = message
+            self._record('messagesAdded', message)
+
+    def delete_message(self, message_id: str):
+        with self._lock:
+            message = self.messages.pop(message_id)
+            self._record('messagesDeleted', message)
+
+    def expire_history(self):
+        """Forget all history so far; older startHistoryIds now get a 404"""
+        with self._lock:
+            self._history_floor = self.history_id + 1
+
+    def _record(self, kind, message):
+        self.history_id += 1
+        entry = {'message': {'id': message['id'], 'threadId': message['threadId'], 'labelIds': ['INBOX']}}
+        self._history.append({'id': str(self.history_id), kind: [entry]})
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _charge(self, units):
+        with self._lock:
+            self.quota_units += units
+            if self.quota_units_per_second is None:
+                return
+            now = time.monotonic()
+            while self._quota_window and self._quota_window[0][0] <= now - 1:
+                self._quota_used -= self._quota_window.popleft()[1]
+            if self._quota_used + units > self.quota_units_per_second:
+                self.quota_errors += 1
+                raise HttpError(
+                    httplib2.Response({'status': 429}),
+                    b'{"error": {"errors": [{"reason": "rateLimitExceeded"}]}}'
+                )
+            self._quota_window.append((now, units))
+            self._quota_used += units
+
+    def users(self):
+        return _Resource(
+            messages=lambda: _Resource(
+                list=lambda **kw: FakeRequest(self, 'messages.list', self._list, **kw),
+                get=lambda **kw: FakeRequest(self, 'messages.get', self._get, **kw),
+                send=lambda **kw: FakeRequest(self, 'messages.send', self._send, **kw)
+            ),
+            history=lambda: _Resource(list=lambda **kw: FakeRequest(self, 'history.list', self._history_list, **kw)),
+            getProfile=lambda **kw: FakeRequest(self, 'getProfile', self._profile, **kw)
+        )
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+    def _list(self, userId='me', maxResults=100, q="", pageToken=None):
+        ids = list(self.messages)[:maxResults]
+        return {'messages': [{'id': i, 'threadId': self.messages[i]['threadId']} for i in ids]}
+
+    def _get(self, userId='me', id=None, format='full', metadataHeaders=None):
+        with self._lock:
+            status = self.get_errors.pop(0) if self.get_errors else None
+        if status is not None:
+            raise HttpError(httplib2.Response({'status': status}), f'{{"error": {status}}}'.encode())
+        if id not in self.messages:
+            raise HttpError(httplib2.Response({'status': 404}), f'{{"error": "Message {id} not found"}}'.encode())
+        message = self.messages[id]
+        if format != 'metadata':
+            return message
+        wanted = set(metadataHeaders or [])
+        headers = [h for h in message['payload']['headers'] if not wanted or h['name'] in wanted]
+        return {'id': id, 'threadId': message['threadId'], 'payload': {'headers': headers}}
+
+    def _profile(self, userId='me'):
+        return {'emailAddress': 'me@example.com', 'historyId': str(self.history_id)}
+
+    def _history_list(self, userId='me', startHistoryId=None, labelId=None, historyTypes=None,
+                      pageToken=None, maxResults=100):
+        if int(startHistoryId) < self._history_floor:
+            raise HttpError(httplib2.Response({'status': 404}), b'{"error": "historyId too old"}')
+        records = [r for r in self._history if int(r['id']) > int(startHistoryId)]
+        if historyTypes:
+            kinds = {'messageAdded': 'messagesAdded', 'messageDeleted': 'messagesDeleted'}
+            records = [r for r in records if any(kinds.get(kind) in r for kind in historyTypes)]
+        offset = int(pageToken or 0)
+        response = {'history': records[offset:offset + maxResults], 'historyId': str(self.history_id)}
+        if offset + maxResults < len(records):
+            response['nextPageToken'] = str(offset + maxResults)
+        return response
+
+    def _send(self, userId='me', body=None):
+        with self._lock:
+            if self.send_errors:
+                status = self.send_errors.pop(0)
+                raise HttpError(httplib2.Response({'status': status}), f'{{"error": {status}}}'.encode())
+            message_id = f"sent-{len(self.sent) + 1}"
+            self.sent.append({'id': message_id, 'raw': body['raw'], 'threadId': body.get('threadId')})
+        return {'id': message_id}
+
+
+class FakeRedis:
+    """In-memory Redis with the commands the caches use, plus fault injection.
+
+    `latency` seconds are added to every round trip. If it exceeds
+    `socket_timeout`, the call waits `socket_timeout` and raises
+    redis.TimeoutError like a real client would; `down=True` makes every call
+    raise redis.ConnectionError.
+    """
+
+    def __init__(self, latency: float = 0.0, socket_timeout: Optional[float] = None, down: bool = False):
+        self.latency = latency
+        self.socket_timeout = socket_timeout
+        self.down = down
+        self.round_trips = 0
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.down:
+            raise redis.ConnectionError("Fake Redis is down")
+        if self.socket_timeout is not None and self.latency > self.socket_timeout:
+            time.sleep(self.socket_timeout)
+            raise redis.TimeoutError("Timeout reading from fake Redis")
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _read(self, key):
+        expires = self._expires.get(key)
+        if expires is not None and expires <= time.time():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return self._data.get(key)
+
+    def _write(self, key, value, ex=None):
+        self._data[key] = value
+        if ex:
+            self._expires[key] = time.time() + ex
+        else:
+            self._expires.pop(key, None)
+        return True
+
+    def get(self, key):
+        self._round_trip()
+        with self._lock:
+            return self._read(key)
+
+    def mget(self, keys):
+        self._round_trip()
+        with self._lock:
+            return [self._read(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        self._round_trip()
+        with self._lock:
+            if nx and self._read(key) is not None:
+                return None
+            return self._write(key, value, ex)
+
+    def delete(self, *keys):
+        self._round_trip()
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._read(key) is not None:
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def incr(self, key, amount=1):
+        self._round_trip()
+        with self._lock:
+            value = int(self._read(key) or 0) + amount
+            self._data[key] = str(value)
+            return value
+
+    def zadd(self, key, mapping):
+        self._round_trip()
+        with self._lock:
+            return self._zadd(key, mapping)
+
+    def zremrangebyscore(self, key, low, high):
+        self._round_trip()
+        with self._lock:
+            return self._zremrangebyscore(key, low, high)
+
+    def zrangebyscore(self, key, low, high):
+        self._round_trip()
+        with self._lock:
+            return self._zrangebyscore(key, low, high)
+
+    def expire(self, key, seconds):
+        self._round_trip()
+        with self._lock:
+            return self._expire(key, seconds)
+
+    def _zadd(self, key, mapping):
+        current = self._read(key)
+        if current is None:
+            current = self._data[key] = {}
+        added = len(mapping.keys() - current.keys())
+        current.update((member, float(score)) for member, score in mapping.items())
+        return added
+
+    def _zremrangebyscore(self, key, low, high):
+        current = self._read(key) or {}
+        removed = [member for member, score in current.items() if float(low) <= score <= float(high)]
+        for member in removed:
+            del current[member]
+        return len(removed)
+
+    def _zrangebyscore(self, key, low, high):
+        current = self._read(key) or {}
+        return [member for member, score in sorted(current.items(), key=lambda item: item[1])
+                if float(low) <= score <= float(high)]
+
+    def _expire(self, key, seconds):
+        if self._read(key) is None:
+            return False
+        self._expires[key] = time.time() + seconds
+        return True
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
+
+    def keys(self, pattern='*'):
+        self._round_trip()
+        with self._lock:
+            return [key for key in list(self._data) if self._read(key) is not None and fnmatch.fnmatch(key, pattern)]
+
+    def dbsize(self):
+        with self._lock:
+            return len(self._data)
+
+    def payload_bytes(self, pattern='*') -> int:
+        """UTF-8 size of the live keys matching `pattern` plus their values (Redis adds a fixed overhead per key)"""
+        with self._lock:
+            total = 0
+            for key in list(self._data):
+                value = self._read(key)
+                if value is None or not fnmatch.fnmatch(key, pattern):
+                    continue
+                values = value if isinstance(value, dict) else [value]
+                total += len(key.encode('utf-8')) + sum(len(str(item).encode('utf-8')) for item in values)
+            return total
+
+
+class FakeRedisPipeline:
+    """Queues commands and runs them in one fake round trip"""
+
+    def __init__(self, client: FakeRedis):
+        self._client = client
+        self._commands = []
+
+    def set(self, key, value, ex=None, nx=False):
+        self._commands.append(('set', key, value, ex, nx))
+        return self
+
+    def get(self, key):
+        self._commands.append(('get', key))
+        return self
+
+    def delete(self, *keys):
+        self._commands.append(('delete', keys))
+        return self
+
+    def zadd(self, key, mapping):
+        self._commands.append(('zadd', key, mapping))
+        return self
+
+    def zremrangebyscore(self, key, low, high):
+        self._commands.append(('zremrangebyscore', key, low, high))
+        return self
+
+    def zrangebyscore(self, key, low, high):
+        self._commands.append(('zrangebyscore', key, low, high))
+        return self
+
+    def expire(self, key, seconds):
+        self._commands.append(('expire', key, seconds))
+        return self
+
+    def execute(self):
+        client = self._client
+        client._round_trip()
+        results = []
+        with client._lock:
+            for command in self._commands:
+                if command[0] == 'set':
+                    _, key, value, ex, nx = command
+                    if nx and client._read(key) is not None:
+                        results.append(None)
+                    else:
+                        results.append(client._write(key, value, ex))
+                elif command[0] == 'get':
+                    results.append(client._read(command[1]))
+                elif command[0] == 'zadd':
+                    results.append(client._zadd(command[1], command[2]))
+                elif command[0] == 'zremrangebyscore':
+                    results.append(client._zremrangebyscore(*command[1:]))
+                elif command[0] == 'zrangebyscore':
+                    results.append(client._zrangebyscore(*command[1:]))
+                elif command[0] == 'expire':
+                    results.append(client._expire(command[1], command[2]))
+                else:
+                    for key in command[1]:
+                        client._data.pop(key, None)
+                        client._expires.pop(key, None)
+                    results.append(len(command[1]))
+        self._commands = []
+        return results
+
+
+class FakeLLM:
+    """Deterministic stand-in for the OpenAI chat client.
+
+    chat.completions.create() answers every prompt with the same text for the
+    same prompt (words picked by a digest of it), after `ttft` seconds plus
+    `completion_tokens / tokens_per_second`, and reports usage like the API.
+    With `is_async` create() is a coroutine, like AsyncOpenAI's.
+    """
+
+    VOCABULARY = (
+        "policy leave request manager approval days team portal HRMS please apply salary office "
+        "benefits submit employee form working hours notice period reimbursement details"
+    ).split()
+
+    def __init__(self, tokens_per_second: float = 200.0, ttft: float = 0.2, completion_tokens: int = 60,
+                 is_async: bool = False):
+        self.tokens_per_second = tokens_per_second
+        self.ttft = ttft
+        self.completion_tokens = completion_tokens
+        self.calls = 0
+        self.prompt_tokens = 0
+        self._lock = threading.Lock()
+        create = self._acreate if is_async else self._create
+        self.chat = _Resource(completions=_Resource(create=create))
+
+    def latency(self) -> float:
+        return self.ttft + self.completion_tokens / self.tokens_per_second
+
+    def _response(self, messages):
+        prompt = "\n".join(message['content'] for message in messages)
+        digest = hashlib.sha256(prompt.encode('utf-8')).digest()
+        words = [self.VOCABULARY[digest[i % len(digest)] % len(self.VOCABULARY)] for i in range(self.completion_tokens)]
+        prompt_tokens = len(prompt.split())
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=self.completion_tokens,
+                                total_tokens=prompt_tokens + self.completion_tokens)
+        content = "Hi there,\n\n" + " ".join(words).capitalize() + ".\n\nRegards,\nHR Team"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=usage)
+
+    def _create(self, model=None, messages=(), **kwargs):
+        time.sleep(self.latency())
+        return self._response(messages)
+
+    async def _acreate(self, model=None, messages=(), **kwargs):
+        await asyncio.sleep(self.latency())
+        return self._response(messages)
+
+
+class FakeEmbeddingFunction:
+    """Deterministic, model-free stand-in for chromadb's DefaultEmbeddingFunction.
+
+    Words and word pairs are hashed (blake2b, so not PYTHONHASHSEED dependent)
+    into `dimension` buckets: texts sharing words score high cosine
+    similarity, so retrieval, clustering and the fast path behave plausibly
+    without downloading the ONNX model. Install with install_fake_embeddings().
+    """
+
+    WORD_RE = re.compile(r"[a-z0-9]+")
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.calls = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _bucket(self, feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=4).digest(), 'big') % self.dimension
+
+    def __call__(self, input):
+        with self._lock:
+            self.calls += 1
+            self.texts += len(input)
+        vectors = np.zeros((len(input), self.dimension), dtype=np.float32)
+        for row, text in enumerate(input):
+            words = self.WORD_RE.findall(text.lower())
+            for word in words:
+                vectors[row, self._bucket(word)] += 1.0
+            for pair in zip(words, words[1:]):
+                vectors[row, self._bucket(" ".join(pair))] += 0.5
+        return [vector for vector in vectors]
+
+
+def install_fake_embeddings(dimension: int = 256) -> FakeEmbeddingFunction:
+    """Make embeddings.embed_texts (and everything built on it) use a FakeEmbeddingFunction"""
+    import embeddings
+
+    function = FakeEmbeddingFunction(dimension)
+    embeddings._embedding_function = function
+    return function
+
+
+# --- Synthetic inboxes ---
+FIRST_NAMES = ["Ann", "Bob", "Chen", "Divya", "Emma", "Farid", "Grace", "Hiro", "Ines", "Jon", "Kemi", "Luca"]
+OFF_TOPIC_QUERIES = [
+    "Can you send me the slides from yesterday's all hands?",
+    "Is the cafeteria open on Saturday?",
+    "Who won the office chess tournament?",
+    "The printer on floor 3 is jammed again",
+    "Can I bring my dog to the office?",
+    "What's the wifi password for guests?",
+    "Are we doing a team lunch this Friday?",
+    "My badge stopped working at the main door"
+]
+
+
+def synthetic_queries(knowledge: Dict[str, Any], count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """`count` incoming questions drawn from the knowledge base, deterministic for a seed.
+
+    The mix is roughly 40% FAQ questions (verbatim or lightly reworded), 30%
+    policy questions in a few phrasings, 10% template requests with their
+    placeholder 'fields' and 20% questions the knowledge base can't answer.
+    Each item has 'user_query' and optionally 'fields'.
+    """
+    rng = random.Random(seed)
+    faqs = knowledge.get('faqs', [])
+    policies = [item for section in knowledge.get('company_policies', []) for item in section['items']]
+    templates = [t['template_name'] for t in knowledge.get('response_templates', [])]
+    queries = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4 and faqs:
+            question = rng.choice(faqs)['question']
+            query = rng.choice([question, question.lower(), f"Hi, quick question: {question}", question.rstrip('?')])
+            queries.append({'user_query': query})
+        elif roll < 0.7 and policies:
+            title = rng.choice(policies)['title']
+            phrasing = rng.choice(["What is the {} policy?", "Can you explain the {} rules?", "{} policy details please"])
+            queries.append({'user_query': phrasing.format(title)})
+        elif roll < 0.8 and templates:
+            queries.append({
+                'user_query': rng.choice(templates),
+                'fields': {'leave_type': 'annual leave', 'date_range': f"{rng.randint(1, 20)}-{rng.randint(21, 28)} May"}
+            })
+        else:
+            queries.append({'user_query': rng.choice(OFF_TOPIC_QUERIES)})
+    return queries
+
+
+def synthetic_batch(knowledge: Dict[str, Any], count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """A batch_respond_to_emails email_batch of `count` synthetic emails with unique message ids"""
+    rng = random.Random(seed + 1)
+    batch = []
+    for position, query in enumerate(synthetic_queries(knowledge, count, seed)):
+        name = rng.choice(FIRST_NAMES)
+        batch.append(dict(
+            query,
+            to=f"{name} <{name.lower()}.{position}@example.com>",
+            subject=f"Re: {query['user_query'][:40]}",
+            message_id=f"msg-{seed}-{position}"
+        ))
+    return batch
+
+
+def synthetic_inbox(knowledge: Dict[str, Any], count: int, seed: int = 0,
+                    body_paragraphs: int = 3) -> List[Dict[str, Any]]:
+    """`count` Gmail message resources (newest first) asking the synthetic questions"""
+    messages = []
+    for item in synthetic_batch(knowledge, count, seed):
+        filler = "Thanks in advance for your help with this. " * body_paragraphs
+        minute = len(messages)
+        messages.append(make_message(
+            item['message_id'], item['subject'], item['to'], f"Hello HR,\n\n{item['user_query']}\n\n{filler}",
+            date=f"Mon, 1 Jan 2024 {9 + minute // 60 % 12:02d}:{minute % 60:02d}:00 +0000"
+        ))
+    return messages[::-1]
@@ -0,0 +1,176 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from knowledge_base import chunk_id
+from snapshot import IndexSnapshot
+
+PLACEHOLDER_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# Template used to answer a question that matches a policy title
+POLICY_TEMPLATE = 'Policy Explanation'
+
+
+def fast_path_entries(data) -> List[Dict[str, Any]]:
+    """What a query can be matched against without the LLM.
+
+    FAQ questions (answered with the stored answer), policy titles (answered
+    by filling the policy explanation template) and template names
+    (answered by filling that template). `content` is the text that gets
+    embedded.
+    """
+    entries = []
+    for faq in data.get('faqs', []):
+        entries.append({
+            'id': chunk_id('faq', faq['question']),
+            'kind': 'faq',
+            'content': faq['question'],
+            'answer': faq['answer']
+        })
+    template_names = {template['template_name'] for template in data.get('response_templates', [])}
+    if POLICY_TEMPLATE in template_names:
+        for section in data.get('company_policies', []):
+            for item in section['items']:
+                entries.append({
+                    'id': chunk_id('policy', section['section'], item['title']),
+                    'kind': 'policy',
+                    'content': f"{item['title']} policy",
+                    'section': section['section'],
+                    'title': item['title'],
+                    'description': item['description']
+                })
+    for template in data.get('response_templates', []):
+        entries.append({
+            'id': chunk_id('template', template['template_name']),
+            'kind': 'template',
+            'content': template['template_name'],
+            'template': template['template']
+        })
+    return entries
+
+
+def fill_template(template: str, values: Dict[str, Any]) -> Optional[str]:
+    """Replace {{placeholders}}; None if any placeholder has no value"""
+    missing = [name for name in PLACEHOLDER_RE.findall(template) if not values.get(name)]
+    if missing:
+        return None
+    return PLACEHOLDER_RE.sub(lambda match: str(values[match.group(1)]), template)
+
+
+class FastPath:
+    """Answers queries that closely match an FAQ, policy or template without the LLM.
+
+    Query embeddings are compared with precomputed embeddings of FAQ
+    questions, policy titles and template names (built by `rag.py index`).
+    Above `threshold` cosine similarity an FAQ is answered with its stored
+    answer and a policy or template by filling the response template; a
+    template whose placeholders can't all be filled falls back to the LLM.
+    Answers come from the current knowledge base entries, the snapshot only
+    provides the vectors.
+
+    A similarity match alone must never send a canned reply to a sensitive
+    message (e.g. a harassment complaint matching the POSH acknowledgement),
+    so only templates named in `templates` (None allows all) are filled, and
+    policies only through an allowed "Policy Explanation" and outside
+    `excluded_sections`. No FAQ, policy or template mentioning one of
+    `sensitive_terms` (whole words, any case) is answered either. Other
+    matches still count as matched, so they are not answered by a weaker
+    allowed entry, and go to the LLM path.
+    """
+
+    def __init__(self, index, entries: Sequence[Dict[str, Any]], threshold: float = 0.88,
+                 templates: Optional[Iterable[str]] = None, excluded_sections: Iterable[str] = (),
+                 sensitive_terms: Iterable[str] = ()):
+        self.index = index
+        self.entries = {entry['id']: entry for entry in entries}
+        self.templates = {entry['content']: entry['template'] for entry in entries if entry['kind'] == 'template'}
+        self.threshold = threshold
+        self.allowed_templates = set(templates) if templates is not None else None
+        self.excluded_sections = set(excluded_sections)
+        terms = [re.escape(term) for term in sensitive_terms]
+        self.sensitive_re = re.compile(rf"\b(?:{'|'.join(terms)})\b", re.IGNORECASE) if terms else None
+        self._lock = threading.Lock()
+        self._stats = {'faq': 0, 'template': 0, 'llm': 0}
+
+    def match_many(self, query_embeddings) -> List[Optional[Dict[str, Any]]]:
+        """Best entry above the threshold (with its 'score') for each query embedding, or None"""
+        matches = []
+        for hits in self.index.query_with_scores(query_embeddings, 1):
+            match = None
+            if hits and hits[0][0] >= self.threshold:
+                entry = self.entries.get(hits[0][2].get('id'))
+                if entry is not None:
+                    match = dict(entry, score=round(hits[0][0], 4))
+            matches.append(match)
+        return matches
+
+    def render(self, match: Optional[Dict[str, Any]], values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Reply for a match as {'path', 'text', 'source', 'score'}, or None to use the LLM"""
+        if match is None:
+            return None
+        if not self.allowed(match):
+            return None
+        if match['kind'] == 'faq':
+            return {'path': 'faq', 'text': match['answer'], 'source': match['content'], 'score': match['score']}
+        if match['kind'] == 'policy':
+            template = self.templates[POLICY_TEMPLATE]
+            values = dict(values, policy_name=f"{match['title']} policy",
+                          policy_summary=match['description'].rstrip('.'))
+        else:
+            template = match['template']
+        text = fill_template(template, values)
+        if text is None:
+            return None
+        return {'path': 'template', 'text': text, 'source': match['id'], 'score': match['score']}
+
+    def allowed(self, match: Dict[str, Any]) -> bool:
+        """True if a match may be answered without the LLM"""
+        if self.is_sensitive(match):
+            return False
+        if match['kind'] == 'faq':
+            return True
+        if match['kind'] == 'policy':
+            if match.get('section') in self.excluded_sections:
+                return False
+            name = POLICY_TEMPLATE
+        else:
+            name = match['content']
+        return self.allowed_templates is None or name in self.allowed_templates
+
+    def is_sensitive(self, entry: Dict[str, Any]) -> bool:
+        """True if the entry's question, answer, policy or template text mentions a sensitive term"""
+        if self.sensitive_re is None:
+            return False
+        text = ' '.join(str(entry.get(field, '')) for field in
+                        ('content', 'answer', 'section', 'title', 'description', 'template'))
+        return self.sensitive_re.search(text) is not None
+
+    def record(self, path: str):
+        """Count which path ('faq', 'template' or 'llm') served a reply"""
+        with self._lock:
+            self._stats[path] += 1
+
+    def inherit_stats(self, other: 'FastPath'):
+        """Continue counting from another instance's totals (when it replaces that one)"""
+        with other._lock:
+            stats = dict(other._stats)
+        with self._lock:
+            self._stats = stats
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        total = sum(stats.values())
+        stats['llm_skip_ratio'] = round((stats['faq'] + stats['template']) / total, 4) if total else 0.0
+        stats['threshold'] = self.threshold
+        return stats
+
+
+def load_fast_path(data, index_path: str = 'vector_index', threshold: float = 0.88, batch_size: int = 64,
+                   templates: Optional[Iterable[str]] = None, excluded_sections: Iterable[str] = (),
+                   sensitive_terms: Iterable[str] = ()):
+    """Open the fast path from its snapshot (`<index_path>_fastpath`), rebuilding it if stale"""
+    entries = fast_path_entries(data)
+    snapshot = IndexSnapshot(f"{index_path}_fastpath")
+    counts = snapshot.ensure(entries, batch_size=batch_size)
+    return FastPath(snapshot.index, entries, threshold, templates, excluded_sections, sensitive_terms), counts
@@ -0,0 +1,296 @@
+import datetime
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+from mime_body import extract_body
+
+# Gmail API setup
+SCOPES = [
+    'https://www.googleapis.com/auth/gmail.modify',
+    'https://www.googleapis.com/auth/gmail.send'
+]
+
+# Headers pulled in "headers only" (format=metadata) mode
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+
+# Gmail accepts up to 100 calls per batch but recommends at most 50
+GMAIL_BATCH_SIZE = 50
+
+# Logged rather than printed: stdout carries the MCP stdio protocol
+logger = logging.getLogger(__name__)
+
+# --- Gmail API Auth ---
+def load_credentials(token_path='token.json', credential_path='credential.json', scopes=SCOPES, request=None):
+    """Load OAuth credentials from token.json, refreshing or running the OAuth flow as needed"""
+    # The Google auth libraries are imported on first use to keep server startup fast
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+    from google.auth.transport.requests import Request
+
+    creds = None
+    
+    # Load credentials from token.json
+    if os.path.exists(token_path):
+        try:
+            with open(token_path, 'r') as token:
+                token_data = json.load(token)
+            
+            creds = Credentials(
+                token=None,  # We'll refresh this
+                refresh_token=token_data.get('refresh_token'),
+                token_uri=token_data.get('token_uri', 'https://oauth2.googleapis.com/token'),
+                client_id=token_data.get('client_id'),
+                client_secret=token_data.get('client_secret'),
+                scopes=token_data.get('scopes', scopes)
+            )
+        except Exception as e:
+            logger.warning("Error loading token.json: %s", e)
+            creds = None
+    
+    # If there are no (valid) credentials available, let the user log in
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(request or Request())
+            except Exception as e:
+                logger.warning("Error refreshing token: %s", e)
+                creds = None
+        
+        if not creds:
+            # Use credential.json for OAuth client configuration
+            if not os.path.exists(credential_path):
+                raise FileNotFoundError(
+                    "credential.json not found. Please provide your OAuth client credentials as credential.json."
+                )
+            try:
+                flow = InstalledAppFlow.from_client_secrets_file(credential_path, scopes)
+                creds = flow.run_local_server(port=0)
+                
+                # Save the credentials for the next run
+                token_data = {
+                    'refresh_token': creds.refresh_token,
+                    'client_id': creds.client_id,
+                    'client_secret': creds.client_secret,
+                    'token_uri': creds.token_uri,
+                    'scopes': creds.scopes
+                }
+                
+                with open(token_path, 'w') as token:
+                    json.dump(token_data, token, indent=2)
+                    
+            except Exception as e:
+                logger.exception("Error during OAuth flow: %r", e)
+                raise Exception("Failed to authenticate with Google. Please check your credential.json.")
+    
+    return creds
+
+class GmailServiceHolder:
+    """Process-wide, thread-safe holder for the Gmail API client.
+
+    Credentials are loaded once and refreshed by a background timer shortly
+    before the access token expires, so tool calls never wait on the OAuth
+    endpoint. googleapiclient services are not thread-safe, so each thread
+    gets its own service whose HTTP connection pool is reused across calls.
+    """
+
+    def __init__(self, token_path='token.json', credential_path='credential.json',
+                 scopes=SCOPES, refresh_margin=300, loader=None):
+        self.token_path = token_path
+        self.credential_path = credential_path
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self._loader = loader or load_credentials
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._request = None
+        self._creds = None
+        self._generation = 0
+        self._timer = None
+        self._stats = {
+            'credential_loads': 0,
+            'refreshes': 0,
+            'background_refreshes': 0,
+            'refresh_failures': 0,
+            'service_builds': 0,
+            'service_requests': 0
+        }
+
+    def get_service(self):
+        """Return this thread's Gmail service, building it on first use"""
+        creds = self.get_credentials()
+        local = self._local
+        with self._lock:
+            self._stats['service_requests'] += 1
+            generation = self._generation
+        if getattr(local, 'service', None) is None or local.generation != generation:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.discovery import build
+            http = AuthorizedHttp(creds, http=httplib2.Http())
+            local.service = build('gmail', 'v1', http=http, cache_discovery=False)
+            local.generation = generation
+            with self._lock:
+                self._stats['service_builds'] += 1
+        return local.service
+
+    def get_credentials(self):
+        """Return valid credentials, loading or refreshing them if needed"""
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._loader(self.token_path, self.credential_path, self.scopes, self._auth_request())
+                self._stats['credential_loads'] += 1
+                self._generation += 1
+                self._schedule_refresh()
+            elif not self._creds.valid or self._expires_soon():
+                self._refresh()
+            return self._creds
+
+    def stats(self):
+        """Counters for credential loads, token refreshes and service builds"""
+        with self._lock:
+            stats = dict(self._stats)
+            expiry = self._creds.expiry if self._creds is not None else None
+        stats['token_expiry'] = expiry.isoformat() if expiry else None
+        return stats
+
+    def close(self):
+        """Stop the background refresh timer"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _auth_request(self):
+        # One requests session for all refreshes keeps the OAuth connection alive
+        if self._request is None:
+            from google.auth.transport.requests import Request
+            self._request = Request()
+        return self._request
+
+    def _seconds_to_expiry(self):
+        if self._creds is None or self._creds.expiry is None:
+            return None
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (self._creds.expiry - now).total_seconds()
+
+    def _expires_soon(self):
+        remaining = self._seconds_to_expiry()
+        return remaining is not None and remaining <= self.refresh_margin
+
+    def _refresh(self):
+        self._creds.refresh(self._auth_request())
+        self._stats['refreshes'] += 1
+        self._schedule_refresh()
+
+    def _schedule_refresh(self, delay=None):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if delay is None:
+            remaining = self._seconds_to_expiry()
+            if remaining is None:
+                return
+            delay = max(remaining - self.refresh_margin, 1)
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            try:
+                self._refresh()
+                self._stats['background_refreshes'] += 1
+            except Exception as e:
+                self._stats['refresh_failures'] += 1
+                logger.warning("Error refreshing token in background: %s", e)
+                self._schedule_refresh(delay=30)
+
+def extract_email_body(payload, max_chars: Optional[int] = None, max_bytes: Optional[int] = None):
+    """Extract the readable email body from a Gmail API payload (see mime_body.extract_body)"""
+    return extract_body(payload, max_chars, max_bytes)['text'] or "(No body content)"
+
+def get_header(headers, name):
+    """Return the value of the first header called `name`, or ''"""
+    return next((h['value'] for h in headers if h['name'] == name), '')
+
+def list_message_ids(service, limit=10, query=""):
+    """List message ids matching a Gmail search query"""
+    response = service.users().messages().list(
+        userId='me',
+        maxResults=limit,
+        q=query
+    ).execute()
+    return [msg['id'] for msg in response.get('messages', [])]
+
+def _get_request(service, message_id, headers_only):
+    if headers_only:
+        return service.users().messages().get(
+            userId='me',
+            id=message_id,
+            format='metadata',
+            metadataHeaders=METADATA_HEADERS
+        )
+    return service.users().messages().get(userId='me', id=message_id)
+
+def fetch_message_details(
+    service,
+    message_ids: List[str],
+    headers_only: bool = False,
+    batch_size: int = GMAIL_BATCH_SIZE
+) -> Dict[str, Any]:
+    """Fetch message details with Gmail batch requests.
+
+    One HTTP round trip covers up to `batch_size` messages instead of one per
+    message. With `headers_only` the messages are fetched with format=metadata
+    and only Subject/From/Date, so no bodies are transferred.
+
+    Returns:
+        Dict mapping each message id to its detail dict, or to the exception
+        raised for that message so one bad message does not fail the rest
+    """
+    details: Dict[str, Any] = {}
+
+    def callback(request_id, response, exception):
+        details[request_id] = exception if exception is not None else response
+
+    for start in range(0, len(message_ids), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for message_id in message_ids[start:start + batch_size]:
+            batch.add(_get_request(service, message_id, headers_only), request_id=message_id)
+        batch.execute()
+    return details
+
+def summarize_message(message_id, detail, include_body=True, max_body_chars: Optional[int] = 500):
+    """Turn a Gmail message resource into the flat dict returned by get_mails"""
+    payload = detail.get('payload', {})
+    headers = payload.get('headers', [])
+    email = {
+        'id': message_id,
+        'subject': get_header(headers, 'Subject'),
+        'from': get_header(headers, 'From'),
+        'date': get_header(headers, 'Date')
+    }
+    if include_body:
+        # Only the part of the body that is returned gets decoded
+        body = extract_body(payload, max_chars=max_body_chars)
+        email['body'] = body['text'] or "(No body content)"
+        if body['truncated']:
+            email['body'] += '...'  # Truncate long bodies
+        email['body_size'] = body['original_size']
+    return email
+
+def fetch_emails(service, limit=10, query="", headers_only=False) -> List[Dict[str, Any]]:
+    """List and fetch emails in input order with batched detail requests"""
+    message_ids = list_message_ids(service, limit, query)
+    details = fetch_message_details(service, message_ids, headers_only=headers_only)
+    emails = []
+    for message_id in message_ids:
+        detail = details.get(message_id)
+        if detail is None or isinstance(detail, Exception):
+            emails.append({'id': message_id, 'error': f"Failed to fetch message: {detail}"})
+            continue
+        emails.append(summarize_message(message_id, detail, include_body=not headers_only))
+    return emails
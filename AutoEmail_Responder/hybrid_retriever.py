@@ -0,0 +1,111 @@
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from cache_keys import chunk_identity
+from lexical_index import BM25Index
+
+
+class HybridRetriever:
+    """Lexical-first retrieval with a vector fallback.
+
+    When the BM25 top hit is high-confidence the lexical results are returned
+    and no embedding call is made. Confident means it contains every query
+    term, scores at least `min_score`, and either beats the runner-up by
+    `min_margin`x or one of the top two hits is named by the query (policy
+    title, FAQ question or template name covers every query term). Otherwise
+    the vector results are fused with the lexical ones by reciprocal rank
+    fusion.
+
+    `lexical_index` may be replaced while searches run (knowledge base hot
+    reload); each search uses the index it started with throughout.
+    """
+
+    def __init__(self, lexical_index: BM25Index, vector_search: Callable[[str, int], List],
+                 vector_search_many: Optional[Callable[[List[str], int], List[List]]] = None,
+                 min_score: float = 5.0, min_margin: float = 1.5, min_coverage: float = 1.0,
+                 rrf_k: int = 60, candidates: int = 10):
+        self.lexical_index = lexical_index
+        self.vector_search = vector_search
+        self.vector_search_many = vector_search_many
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.min_coverage = min_coverage
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self._lock = threading.Lock()
+        self._stats = {'lexical_only': 0, 'hybrid': 0}
+
+    def search(self, query: str, n_results: int = 3) -> Tuple[List, str]:
+        """Return ([doc, meta] pairs, path) where path is 'lexical' or 'hybrid'"""
+        index = self.lexical_index
+        hits = index.search(query, k=max(self.candidates, n_results))
+        if self.is_confident(query, hits, index):
+            self._count('lexical_only')
+            return [self._pair(doc_idx, index) for doc_idx, _ in hits[:n_results]], 'lexical'
+        self._count('hybrid')
+        vector_results = self.vector_search(query, max(self.candidates, n_results))
+        return self.fuse(hits, vector_results, index)[:n_results], 'hybrid'
+
+    def search_many(self, queries: List[str], n_results: int = 3) -> List[List]:
+        """Batch search: lexical hits per query, then one batched vector call for the rest"""
+        index = self.lexical_index
+        results, pending = [None] * len(queries), []
+        for position, query in enumerate(queries):
+            hits = index.search(query, k=max(self.candidates, n_results))
+            if self.is_confident(query, hits, index):
+                self._count('lexical_only')
+                results[position] = [self._pair(doc_idx, index) for doc_idx, _ in hits[:n_results]]
+            else:
+                pending.append((position, hits))
+        if pending:
+            pending_queries = [queries[position] for position, _ in pending]
+            k = max(self.candidates, n_results)
+            if self.vector_search_many is not None:
+                vector_results = self.vector_search_many(pending_queries, k)
+            else:
+                vector_results = [self.vector_search(query, k) for query in pending_queries]
+            for (position, hits), vector in zip(pending, vector_results):
+                self._count('hybrid')
+                results[position] = self.fuse(hits, vector, index)[:n_results]
+        return results
+
+    def is_confident(self, query: str, hits, index: Optional[BM25Index] = None) -> bool:
+        index = self.lexical_index if index is None else index
+        if not hits:
+            return False
+        top_idx, top_score = hits[0]
+        if top_score < self.min_score or index.coverage(query, top_idx) < self.min_coverage:
+            return False
+        if len(hits) == 1 or top_score >= self.min_margin * hits[1][1]:
+            return True
+        return any(index.coverage(query, doc_idx, key_only=True) >= 1.0 for doc_idx, _ in hits[:2])
+
+    def fuse(self, lexical_hits, vector_results, index: Optional[BM25Index] = None) -> List:
+        """Reciprocal rank fusion of BM25 hits and vector [doc, meta] results"""
+        index = self.lexical_index if index is None else index
+        scores, pairs = {}, {}
+        for rank, (doc_idx, _) in enumerate(lexical_hits):
+            pair = self._pair(doc_idx, index)
+            key = chunk_identity(*pair)
+            pairs[key] = pair
+            scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, (doc, meta) in enumerate(vector_results):
+            key = chunk_identity(doc, meta)
+            pairs.setdefault(key, [doc, meta])
+            scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        return [pairs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats['lexical_only'] + stats['hybrid']
+        stats['embedding_skip_rate'] = round(stats['lexical_only'] / total, 4) if total else 0.0
+        return stats
+
+    def _pair(self, doc_idx, index):
+        chunk = index.chunks[doc_idx]
+        return [chunk['content'], dict(chunk)]
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from gmail_client import fetch_message_details, get_header, list_message_ids
+from mail_store import MailStore
+from mime_body import extract_body
+
+HISTORY_ID_KEY = 'history_id'
+# The mailbox's own address, from users.getProfile
+EMAIL_ADDRESS_KEY = 'email_address'
+# {message id: failed attempts} for detail fetches to retry on the next sync
+PENDING_FETCH_KEY = 'pending_fetch'
+
+# Headers kept per message: reply threading, and telling automated mail from people
+STORED_HEADERS = (
+    'Message-ID', 'References', 'Auto-Submitted', 'X-Autoreply', 'X-Autorespond', 'Precedence', 'List-Id',
+    'List-Unsubscribe'
+)
+
+
+def message_record(detail: Dict[str, Any], body_max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Flatten a full Gmail message resource into a MailStore row (body decoded up to `body_max_bytes`)"""
+    payload = detail.get('payload', {})
+    headers = payload.get('headers', [])
+    date = get_header(headers, 'Date')
+    internal_date = detail.get('internalDate')
+    if internal_date is None and date:
+        try:
+            internal_date = int(parsedate_to_datetime(date).timestamp() * 1000)
+        except (TypeError, ValueError):
+            internal_date = None
+    body = extract_body(payload, max_bytes=body_max_bytes)
+    wanted = {name.lower(): name for name in STORED_HEADERS}
+    kept = {wanted[h['name'].lower()]: h['value'] for h in reversed(headers) if h['name'].lower() in wanted}
+    return {
+        'id': detail['id'],
+        'thread_id': detail.get('threadId'),
+        'sender': get_header(headers, 'From'),
+        'subject': get_header(headers, 'Subject'),
+        'date': date,
+        'internal_date': int(internal_date) if internal_date is not None else 0,
+        'body': body['text'],
+        'body_size': body['original_size'],
+        'headers': json.dumps(kept, sort_keys=True)
+    }
+
+
+class InboxSync:
+    """Keeps a MailStore in step with the Gmail inbox using historyId deltas.
+
+    The first sync lists up to `bootstrap_limit` inbox messages and records the
+    mailbox historyId. Later syncs page through users.history.list from that
+    id and only fetch the messages added since (in Gmail batch requests) and
+    drop deleted ones. If Gmail no longer has history that old (HTTP 404) the
+    store is bootstrapped again. Bodies are stored decoded up to
+    `body_max_bytes` each, with the headers that reply threading and the
+    auto-responder's sender filter need. The mailbox's own address is kept in
+    the sync state under EMAIL_ADDRESS_KEY.
+
+    A message whose detail fetch fails (e.g. a 429 inside a batch) is kept in
+    the store's sync state and fetched again on every later sync, up to
+    `max_fetch_attempts` times, so advancing the historyId never loses it.
+
+    `store` may be given as a zero-argument factory (e.g. a `lazy.Lazy`)
+    instead; it is called on the first sync.
+    """
+
+    def __init__(self, store: MailStore, service_fn: Callable[[], Any], bootstrap_limit: int = 500,
+                 label_id: str = 'INBOX', body_max_bytes: Optional[int] = 65536, max_fetch_attempts: int = 5):
+        self._store = store
+        self.service_fn = service_fn
+        self.bootstrap_limit = bootstrap_limit
+        self.label_id = label_id
+        self.body_max_bytes = body_max_bytes
+        self.max_fetch_attempts = max_fetch_attempts
+        self.last_sync = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def store(self) -> MailStore:
+        if callable(self._store):
+            self._store = self._store()
+        return self._store
+
+    def sync(self) -> Dict[str, Any]:
+        """Pull changes into the store; returns mode, added/deleted/failed counts and the new historyId"""
+        with self._lock:
+            start = time.perf_counter()
+            service = self.service_fn()
+            history_id = self.store.get_state(HISTORY_ID_KEY)
+            if history_id is None:
+                stats = self._bootstrap(service)
+            else:
+                if self.store.get_state(EMAIL_ADDRESS_KEY) is None:
+                    # Stores bootstrapped before the address was recorded
+                    profile = service.users().getProfile(userId='me').execute()
+                    self.store.set_state(EMAIL_ADDRESS_KEY, profile.get('emailAddress', ''))
+                try:
+                    stats = self._sync_history(service, history_id)
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    stats = self._bootstrap(service)
+            self.last_sync = time.time()
+            return dict(stats, elapsed_seconds=round(time.perf_counter() - start, 4), stored=self.store.count())
+
+    def sync_if_stale(self, max_age: float):
+        """Sync unless the last sync is younger than `max_age` seconds; returns stats or None"""
+        if time.time() - self.last_sync < max_age:
+            return None
+        return self.sync()
+
+    def _bootstrap(self, service) -> Dict[str, Any]:
+        # Read the cursor first so changes made while listing are picked up next time
+        profile = service.users().getProfile(userId='me').execute()
+        history_id = profile['historyId']
+        self.store.set_state(EMAIL_ADDRESS_KEY, profile.get('emailAddress', ''))
+        message_ids = list_message_ids(service, self.bootstrap_limit, f"label:{self.label_id.lower()}")
+        fetched = self._store_messages(service, message_ids)
+        self.store.set_state(HISTORY_ID_KEY, str(history_id))
+        return dict(fetched, mode='bootstrap', deleted=0, history_id=str(history_id))
+
+    def _sync_history(self, service, history_id: str) -> Dict[str, Any]:
+        added_ids: Dict[str, None] = {}
+        deleted_ids = set()
+        page_token, latest = None, history_id
+        while True:
+            response = service.users().history().list(
+                userId='me',
+                startHistoryId=history_id,
+                labelId=self.label_id,
+                historyTypes=['messageAdded', 'messageDeleted'],
+                pageToken=page_token
+            ).execute()
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    added_ids[added['message']['id']] = None
+                    deleted_ids.discard(added['message']['id'])
+                for deleted in record.get('messagesDeleted', []):
+                    deleted_ids.add(deleted['message']['id'])
+                    added_ids.pop(deleted['message']['id'], None)
+            latest = response.get('historyId', latest)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        fetched = self._store_messages(service, list(added_ids), deleted_ids)
+        deleted = self.store.delete_messages(deleted_ids) if deleted_ids else 0
+        # Messages whose fetch failed are in the pending set by now, so moving the cursor loses nothing
+        self.store.set_state(HISTORY_ID_KEY, str(latest))
+        return dict(fetched, mode='history', deleted=deleted, history_id=str(latest))
+
+    def _store_messages(self, service, message_ids: List[str], deleted_ids=()) -> Dict[str, int]:
+        """Fetch and store new messages plus earlier failures; returns added/failed/pending/abandoned counts"""
+        pending = json.loads(self.store.get_state(PENDING_FETCH_KEY) or '{}')
+        for message_id in deleted_ids:
+            pending.pop(message_id, None)
+        message_ids = list(dict.fromkeys(list(message_ids) + list(pending)))
+        details = fetch_message_details(service, message_ids) if message_ids else {}
+        records, failed, abandoned = [], 0, 0
+        for message_id in message_ids:
+            detail = details.get(message_id)
+            if isinstance(detail, HttpError) and detail.resp.status == 404:
+                # Deleted before we got to it
+                pending.pop(message_id, None)
+            elif detail is None or isinstance(detail, Exception):
+                failed += 1
+                pending[message_id] = pending.get(message_id, 0) + 1
+                if pending[message_id] >= self.max_fetch_attempts:
+                    del pending[message_id]
+                    abandoned += 1
+            else:
+                pending.pop(message_id, None)
+                records.append(message_record(detail, self.body_max_bytes))
+        added = self.store.upsert_messages(records) if records else 0
+        self.store.set_state(PENDING_FETCH_KEY, json.dumps(pending))
+        return {'added': added, 'failed': failed, 'pending': len(pending), 'abandoned': abandoned}
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set
+
+from cache_keys import chunk_identity
+from knowledge_base import KNOWLEDGE_BASE_PATH, content_hash, flatten_knowledge
+
+# Redis sets listing, per chunk id, the cache keys whose values were built from that chunk
+CHUNK_REFS_PREFIX = "chunkrefs:"
+
+logger = logging.getLogger(__name__)
+
+
+def chunk_scope(chunk: Dict[str, Any]) -> str:
+    """The section a chunk belongs to: its policy section, or all FAQs / all templates"""
+    if chunk.get('type') == 'policy':
+        return f"policy:{chunk.get('section')}"
+    return chunk.get('type') or ''
+
+
+def diff_chunks(old_chunks: Sequence[Dict], new_chunks: Sequence[Dict]) -> Dict[str, List[str]]:
+    """Chunk ids added, updated (same id, new content) and deleted between two knowledge base versions"""
+    old = {chunk['id']: content_hash(chunk['content']) for chunk in old_chunks}
+    new = {chunk['id']: content_hash(chunk['content']) for chunk in new_chunks}
+    return {
+        'added': sorted(new.keys() - old.keys()),
+        'updated': sorted(doc_id for doc_id in new.keys() & old.keys() if new[doc_id] != old[doc_id]),
+        'deleted': sorted(old.keys() - new.keys())
+    }
+
+
+def affected_chunk_ids(old_chunks: Sequence[Dict], new_chunks: Sequence[Dict], diff: Dict[str, List[str]]) -> Set[str]:
+    """Chunks whose cached retrievals and answers are stale after `diff`.
+
+    Updated and deleted chunks themselves, plus every chunk in the section of
+    an added item: a query that retrieved its neighbours may now retrieve it.
+    """
+    affected = set(diff['updated']) | set(diff['deleted'])
+    new_by_id = {chunk['id']: chunk for chunk in new_chunks}
+    scopes = {chunk_scope(new_by_id[doc_id]) for doc_id in diff['added']}
+    affected.update(chunk['id'] for chunk in old_chunks if chunk_scope(chunk) in scopes)
+    return affected
+
+
+def chunk_ids(context_chunks: Iterable) -> Set[str]:
+    return {chunk_identity(doc, meta) for doc, meta in context_chunks}
+
+
+class ChunkRefs:
+    """Reverse index from chunk id to the cache keys built from that chunk.
+
+    Every cached retrieval ('semantic:') and answer ('llm:') is recorded
+    against the chunks it contains, in process and in Redis sorted sets
+    (`chunkrefs:<chunk id>`, scored by expiry) so a reload on any replica
+    also finds keys other replicas wrote. References expire with the keys
+    they point to (`ttl`) and are trimmed from the set on the next add; sets
+    are never emptied on invalidation, so each replica's reload can still use
+    them to clear its own L1.
+    """
+
+    def __init__(self, cache, ttl: float = 3600, prune_every: int = 1000):
+        self.cache = cache
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Dict[str, float]] = {}  # chunk id -> {cache key: expires at}
+        self._adds = 0
+
+    def add(self, key: str, context_chunks: Iterable):
+        self.add_many({key: context_chunks})
+
+    def add_many(self, entries: Dict[str, Iterable]):
+        """Record {cache key: [doc, meta] pairs} with one pipelined Redis round trip"""
+        members = self._record(entries)
+        self.cache.add_expiring_members(members, ex=int(self.ttl))
+
+    async def aadd(self, key: str, context_chunks: Iterable):
+        members = self._record({key: context_chunks})
+        await self.cache.aadd_expiring_members(members, ex=int(self.ttl))
+
+    def keys_for(self, ids: Iterable[str]) -> Set[str]:
+        """Cache keys built from any of the chunk ids"""
+        ids = list(ids)
+        now = time.time()
+        with self._lock:
+            keys = {key for doc_id in ids for key, expires in self._keys.get(doc_id, {}).items() if expires > now}
+        _, shared = self.cache.live_members([CHUNK_REFS_PREFIX + doc_id for doc_id in ids])
+        return keys | shared
+
+    def _record(self, entries):
+        expires = time.time() + self.ttl
+        members: Dict[str, List[str]] = {}
+        with self._lock:
+            for key, context_chunks in entries.items():
+                for doc_id in chunk_ids(context_chunks):
+                    self._keys.setdefault(doc_id, {})[key] = expires
+                    members.setdefault(CHUNK_REFS_PREFIX + doc_id, []).append(key)
+            self._adds += len(entries)
+            if self._adds >= self.prune_every:
+                self._adds = 0
+                self._prune(time.time())
+        return members
+
+    def _prune(self, now):
+        for doc_id in list(self._keys):
+            live = {key: expires for key, expires in self._keys[doc_id].items() if expires > now}
+            if live:
+                self._keys[doc_id] = live
+            else:
+                del self._keys[doc_id]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(keys) for keys in self._keys.values())
+
+
+class KnowledgeBaseReloader:
+    """Watches knowledge_base.json and applies edits without a restart or reindex.
+
+    Every `interval` seconds the file's mtime and size are checked. When the
+    content changed, it is diffed against the loaded version item by item
+    (policy items, FAQs, templates), `apply_fn(data, chunks)` builds and swaps
+    in the new indexes (re-embedding only changed chunks) while requests keep
+    being served from the old ones, and `invalidate_fn(chunk ids)` drops the
+    cached entries built from changed items. Unrelated cached entries and the
+    knowledge base version stamp are left alone. For added items,
+    `neighbours_fn(added chunks)` (if given) names further loaded chunks near
+    them, e.g. their nearest embeddings in other sections, whose cached
+    entries are dropped too: a query that retrieved those may now retrieve
+    the new item.
+
+    A request that retrieved before the swap could still write a stale entry
+    afterwards: cache writers check is_current() first, and the invalidation
+    runs again `settle_seconds` after the reload to catch the rest (on a timer
+    when nothing is watching). A file that fails to parse or apply is reported,
+    the loaded version keeps serving and the next check retries it.
+    `table` maps chunk id to chunk for the loaded version.
+    """
+
+    def __init__(self, chunks: Sequence[Dict], apply_fn: Callable[[Dict, List[Dict]], Dict],
+                 invalidate_fn: Callable[[Set[str]], int], path: str = KNOWLEDGE_BASE_PATH,
+                 interval: float = 2.0, settle_seconds: float = 30.0,
+                 neighbours_fn: Optional[Callable[[List[Dict]], Set[str]]] = None):
+        self.path = path
+        self.apply_fn = apply_fn
+        self.invalidate_fn = invalidate_fn
+        self.neighbours_fn = neighbours_fn
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+        self.chunks = list(chunks)
+        self.table = {chunk['id']: chunk for chunk in self.chunks}
+        self._signature = self._stat()
+        self._digest = None
+        self._pending = []  # (due, chunk ids) for the settle pass
+        self._reload_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_reload: Optional[Dict[str, Any]] = None
+        self._stats = {
+            'reloads': 0, 'reload_errors': 0, 'chunks_added': 0, 'chunks_updated': 0, 'chunks_deleted': 0,
+            'keys_invalidated': 0
+        }
+
+    @property
+    def watching(self) -> bool:
+        return self._thread is not None and not self._stop.is_set()
+
+    def is_current(self, context_chunks: Iterable) -> bool:
+        """True if every [doc, meta] pair still matches the loaded knowledge base"""
+        table = self.table
+        return all(table.get(chunk_identity(doc, meta), {}).get('content') == doc for doc, meta in context_chunks)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name='kb-reload', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def check(self) -> Optional[Dict[str, Any]]:
+        """Reload if the file changed since the last check; returns the reload summary or None"""
+        self._settle()
+        if self._stat() == self._signature:
+            return None
+        return self.reload()
+
+    def reload(self) -> Optional[Dict[str, Any]]:
+        """Diff the file against the loaded version and apply it; None if its content is unchanged"""
+        self._settle()
+        with self._reload_lock:
+            # Recorded only once the new version is applied, so a failed reload is retried
+            signature = self._stat()
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if digest == self._digest:
+                self._signature = signature
+                return None
+            start = time.perf_counter()
+            data = json.loads(raw)
+            chunks = flatten_knowledge(data)
+            diff = diff_chunks(self.chunks, chunks)
+            if not any(diff.values()):
+                self._signature, self._digest = signature, digest
+                return None
+            affected = affected_chunk_ids(self.chunks, chunks, diff)
+            details = self.apply_fn(data, chunks) or {}
+            if diff['added'] and self.neighbours_fn is not None:
+                # Runs against the indexes just swapped in, which contain the added items
+                added = set(diff['added'])
+                neighbours = self.neighbours_fn([chunk for chunk in chunks if chunk['id'] in added])
+                affected.update(neighbours & self.table.keys())
+            self.chunks = chunks
+            self.table = {chunk['id']: chunk for chunk in chunks}
+            self._signature, self._digest = signature, digest
+            invalidated = self.invalidate_fn(affected) if affected else 0
+            summary = {
+                'at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                **{name: len(ids) for name, ids in diff.items()},
+                'affected_chunks': len(affected),
+                'keys_invalidated': invalidated,
+                'seconds': round(time.perf_counter() - start, 4),
+                **details
+            }
+            with self._lock:
+                if affected:
+                    self._pending.append((time.monotonic() + self.settle_seconds, affected))
+                    if not self.watching:
+                        # No watcher to run the settle pass, e.g. a manual reload
+                        timer = threading.Timer(self.settle_seconds, self._settle)
+                        timer.daemon = True
+                        timer.start()
+                self._count(reloads=1, chunks_added=summary['added'], chunks_updated=summary['updated'],
+                            chunks_deleted=summary['deleted'], keys_invalidated=invalidated)
+                self.last_reload = summary
+            return summary
+
+    def _settle(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [ids for when, ids in self._pending if when <= now]
+            self._pending = [(when, ids) for when, ids in self._pending if when > now]
+        for ids in due:
+            invalidated = self.invalidate_fn(ids)
+            with self._lock:
+                self._count(keys_invalidated=invalidated)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                summary = self.check()
+                if summary:
+                    logger.info(
+                        "Knowledge base reloaded: %d added, %d updated, %d deleted, %d cached entries dropped",
+                        summary['added'], summary['updated'], summary['deleted'], summary['keys_invalidated']
+                    )
+            except Exception as e:
+                with self._lock:
+                    self._count(reload_errors=1)
+                logger.warning("Knowledge base reload failed: %s", e)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _count(self, **deltas):
+        for name, delta in deltas.items():
+            self._stats[name] += delta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['last_reload'] = self.last_reload
+        stats.update(watching=self.watching, path=self.path,
+                     chunks=len(self.chunks), interval=self.interval)
+        return stats
@@ -0,0 +1,61 @@
+import hashlib
+import json
+
+KNOWLEDGE_BASE_PATH = 'knowledge_base.json'
+
+def chunk_id(kind, *key_parts):
+    """Stable chunk id derived from the item's identity (section/title, question, template name)"""
+    digest = hashlib.sha1("\x1f".join(key_parts).encode("utf-8")).hexdigest()[:16]
+    return f"{kind}-{digest}"
+
+def content_hash(text):
+    """Digest of a chunk's text, used to detect changed items on reindex"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+def flatten_knowledge(data):
+    """Flatten policies, FAQs and templates into indexable chunks"""
+    # Flatten policies
+    policy_chunks = []
+    for section in data['company_policies']:
+        section_name = section['section']
+        for item in section['items']:
+            text = f"Section: {section_name}\nTitle: {item['title']}\nDescription: {item['description']}"
+            policy_chunks.append({
+                "id": chunk_id("policy", section_name, item["title"]),
+                "type": "policy",
+                "section": section_name,
+                "title": item["title"],
+                "content": text
+            })
+
+    # Flatten FAQs
+    faq_chunks = []
+    for faq in data['faqs']:
+        text = f"Q: {faq['question']}\nA: {faq['answer']}"
+        faq_chunks.append({
+            "id": chunk_id("faq", faq["question"]),
+            "type": "faq",
+            "question": faq["question"],
+            "content": text
+        })
+
+    # Flatten Templates
+    template_chunks = []
+    for template in data['response_templates']:
+        text = f"Template Name: {template['template_name']}\nTemplate: {template['template']}"
+        template_chunks.append({
+            "id": chunk_id("template", template["template_name"]),
+            "type": "template",
+            "template_name": template["template_name"],
+            "content": text
+        })
+
+    return policy_chunks + faq_chunks + template_chunks
+
+def load_knowledge(path=KNOWLEDGE_BASE_PATH):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_chunks(path=KNOWLEDGE_BASE_PATH):
+    """Load knowledge_base.json and return its flattened chunks"""
+    return flatten_knowledge(load_knowledge(path))
@@ -0,0 +1,37 @@
+import threading
+import time
+from typing import Any, Callable, Optional
+
+
+class Lazy:
+    """Thread-safe singleton built by `factory` on the first get().
+
+    Concurrent first callers wait for the one construction; if the factory
+    raises, nothing is cached and the next get() tries again. `loaded` and
+    `seconds` (construction time) let stats and warm-up report what exists.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: Optional[str] = None):
+        self.factory = factory
+        self.name = name or getattr(factory, '__name__', 'lazy')
+        self.seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self) -> Any:
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    start = time.perf_counter()
+                    self._value = self.factory()
+                    self.seconds = time.perf_counter() - start
+                    self._loaded = True
+        return self._value
+
+    def __call__(self) -> Any:
+        return self.get()
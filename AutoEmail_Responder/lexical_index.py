@@ -0,0 +1,75 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+# Common English words plus the boilerplate labels every chunk carries
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'get',
+    'how', 'i', 'if', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'our', 'the', 'to', 'we',
+    'what', 'when', 'where', 'which', 'who', 'will', 'with', 'you', 'your',
+    'section', 'title', 'description', 'q', 'template', 'name'
+}
+
+def _stem(token):
+    # Plural folding only, so "leaves"/"leave" and "fridays"/"friday" match
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+def tokenize(text):
+    return [_stem(token) for token in re.findall(r"[a-z0-9]+", text.lower()) if token not in STOPWORDS]
+
+def chunk_key_text(chunk):
+    """The field that names a chunk: policy title, FAQ question or template name"""
+    return chunk.get('title') or chunk.get('question') or chunk.get('template_name') or ''
+
+
+class BM25Index:
+    """In-memory Okapi BM25 index over knowledge base chunks.
+
+    Built once from the flattened chunks at startup; a query touches only the
+    postings of its own terms, so lookups take microseconds and need no
+    embedding call.
+    """
+
+    def __init__(self, chunks: Sequence[Dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+        self._doc_terms = [Counter(tokenize(chunk['content'])) for chunk in self.chunks]
+        self._key_terms = [set(tokenize(chunk_key_text(chunk))) for chunk in self.chunks]
+        self._doc_lengths = [sum(terms.values()) for terms in self._doc_terms]
+        self._avg_length = (sum(self._doc_lengths) / len(self._doc_lengths)) if self.chunks else 0.0
+        self._postings = defaultdict(list)
+        for doc_idx, terms in enumerate(self._doc_terms):
+            for term, freq in terms.items():
+                self._postings[term].append((doc_idx, freq))
+        total = len(self.chunks)
+        self._idf = {
+            term: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to k (chunk index, score) pairs, best first"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_idx, freq in self._postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[doc_idx] / self._avg_length)
+                scores[doc_idx] += idf * freq * (self.k1 + 1) / (freq + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def coverage(self, query: str, doc_idx: int, key_only: bool = False) -> float:
+        """Fraction of the query's distinct terms that occur in the chunk (or only its title/question)"""
+        terms = set(tokenize(query))
+        if not terms:
+            return 0.0
+        doc_terms = self._key_terms[doc_idx] if key_only else self._doc_terms[doc_idx]
+        return sum(1 for term in terms if term in doc_terms) / len(terms)
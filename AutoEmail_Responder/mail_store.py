@@ -0,0 +1,239 @@
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    sender TEXT,
+    subject TEXT,
+    date TEXT,
+    internal_date INTEGER,
+    body TEXT,
+    body_size INTEGER,
+    headers TEXT,
+    synced_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages (internal_date);
+CREATE INDEX IF NOT EXISTS idx_messages_sender ON messages (sender);
+CREATE INDEX IF NOT EXISTS idx_messages_thread ON messages (thread_id);
+CREATE TABLE IF NOT EXISTS responses (
+    message_id TEXT PRIMARY KEY,
+    claimed_at REAL,
+    responded_at REAL,
+    response_id TEXT,
+    failures INTEGER NOT NULL DEFAULT 0,
+    retry_at REAL,
+    skipped_at REAL,
+    skip_reason TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# skip_reason prefix of messages given up on after repeated failed sends
+DEAD_LETTER_REASON = 'send failed'
+
+# Columns added since the first schema: (table, column, declaration), added to older databases on open
+ADDED_COLUMNS: List[Tuple[str, str, str]] = [
+    ('messages', 'headers', 'TEXT'),
+    ('responses', 'failures', 'INTEGER NOT NULL DEFAULT 0'),
+    ('responses', 'retry_at', 'REAL'),
+    ('responses', 'skipped_at', 'REAL'),
+    ('responses', 'skip_reason', 'TEXT')
+]
+
+
+class MailStore:
+    """Local SQLite copy of the inbox, kept current by InboxSync.
+
+    Holds message metadata and decoded bodies (indexed by date, sender and
+    thread), the sync cursor (last Gmail historyId), and which messages were
+    already auto-responded to. One connection is shared across threads behind
+    a lock; WAL mode lets readers in other processes proceed during writes.
+
+    A response whose send fails is released for another try after a backoff
+    (`retry_delay` seconds, doubling per failure); after `max_failures` it is
+    dead-lettered: marked skipped and never claimed again. A claim held longer
+    than `claim_timeout` seconds (its worker crashed or hung) lapses and the
+    message can be claimed again.
+    """
+
+    def __init__(self, path: str = 'mail_store.db', max_failures: int = 5, retry_delay: float = 60.0,
+                 claim_timeout: float = 1800.0):
+        self.path = path
+        self.max_failures = max_failures
+        self.retry_delay = retry_delay
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        if path != ':memory:':
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._add_missing_columns()
+        self._conn.commit()
+
+    def _add_missing_columns(self):
+        for table, column, declaration in ADDED_COLUMNS:
+            existing = {row['name'] for row in self._conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+    # --- Sync state ---
+    def get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def set_state(self, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+
+    # --- Messages ---
+    def upsert_messages(self, messages: Iterable[Dict[str, Any]]) -> int:
+        """Insert or replace messages (dicts with id, thread_id, sender, subject, date, internal_date, body,
+        body_size and headers, a JSON object of the headers the auto-responder needs)"""
+        now = time.time()
+        rows = [
+            (m['id'], m.get('thread_id'), m.get('sender'), m.get('subject'), m.get('date'),
+             m.get('internal_date'), m.get('body'), m.get('body_size'), m.get('headers'), now)
+            for m in messages
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages "
+                "(id, thread_id, sender, subject, date, internal_date, body, body_size, headers, synced_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def delete_messages(self, message_ids: Iterable[str]) -> int:
+        ids = [(message_id,) for message_id in message_ids]
+        with self._lock, self._conn:
+            cursor = self._conn.executemany("DELETE FROM messages WHERE id = ?", ids)
+        return cursor.rowcount
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+    def query(self, limit: int = 10, sender: Optional[str] = None, thread_id: Optional[str] = None,
+              unresponded_only: bool = False, received_after: Optional[int] = None,
+              oldest_first: bool = False, respondable_only: bool = False) -> List[Dict[str, Any]]:
+        """Newest (or oldest) messages first, optionally filtered by sender substring, thread,
+        response status or Gmail internal date (epoch ms).
+
+        `unresponded_only` keeps messages with no reply sent or in progress (claims past their lease don't count);
+        `respondable_only` also drops skipped ones and ones backing off after a failed send.
+        """
+        clauses, params = [], []
+        if received_after is not None:
+            clauses.append("m.internal_date >= ?")
+            params.append(received_after)
+        if sender:
+            clauses.append("m.sender LIKE ?")
+            params.append(f"%{sender}%")
+        if thread_id:
+            clauses.append("m.thread_id = ?")
+            params.append(thread_id)
+        if unresponded_only or respondable_only:
+            clauses.append("r.responded_at IS NULL AND (r.claimed_at IS NULL OR r.claimed_at <= ?)")
+            params.append(time.time() - self.claim_timeout)
+        if respondable_only:
+            clauses.append("r.skipped_at IS NULL AND (r.retry_at IS NULL OR r.retry_at <= ?)")
+            params.append(time.time())
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        sql = (
+            "SELECT m.*, r.responded_at, r.response_id, r.failures, r.skipped_at, r.skip_reason FROM messages m "
+            "LEFT JOIN responses r ON r.message_id = m.id "
+            f"{where} ORDER BY m.internal_date {'ASC' if oldest_first else 'DESC'} LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    # --- Auto-response tracking ---
+    def claim_response(self, message_id: str) -> bool:
+        """Atomically claim a message for auto-response; False if it was already claimed (and the claim
+        has not lapsed), answered or skipped, or its last failed send is still backing off"""
+        now = time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO responses (message_id, claimed_at) VALUES (?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET claimed_at = excluded.claimed_at "
+                "WHERE (claimed_at IS NULL OR claimed_at <= ?) AND responded_at IS NULL AND skipped_at IS NULL "
+                "AND (retry_at IS NULL OR retry_at <= ?)",
+                (message_id, now, now - self.claim_timeout, now)
+            )
+        return cursor.rowcount == 1
+
+    def mark_responded(self, message_id: str, response_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO responses (message_id, claimed_at, responded_at, response_id) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET responded_at = excluded.responded_at, "
+                "response_id = excluded.response_id",
+                (message_id, time.time(), time.time(), response_id)
+            )
+
+    def release_claim(self, message_id: str) -> bool:
+        """Record a failed send and drop its claim so the message is retried after a backoff.
+        Returns True if this was the `max_failures`th failure and the message is now dead-lettered"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT failures FROM responses WHERE message_id = ? AND responded_at IS NULL", (message_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            failures = row['failures'] + 1
+            dead = failures >= self.max_failures
+            self._conn.execute(
+                "UPDATE responses SET claimed_at = NULL, failures = ?, retry_at = ?, skipped_at = ?, "
+                "skip_reason = ? WHERE message_id = ?",
+                (failures, now + self.retry_delay * 2 ** (failures - 1), now if dead else None,
+                 f"{DEAD_LETTER_REASON} {failures} times" if dead else None, message_id)
+            )
+        return dead
+
+    def skip_response(self, message_id: str, reason: str):
+        """Never auto-respond to a message (e.g. it is an auto-reply or from a mailing list)"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO responses (message_id, skipped_at, skip_reason) VALUES (?, ?, ?) "
+                "ON CONFLICT(message_id) DO UPDATE SET skipped_at = excluded.skipped_at, "
+                "skip_reason = excluded.skip_reason WHERE responded_at IS NULL",
+                (message_id, time.time(), reason)
+            )
+
+    def response_counts(self) -> Dict[str, int]:
+        """Messages answered, retrying after a failed send, and skipped (including dead letters)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(responded_at), "
+                "SUM(responded_at IS NULL AND skipped_at IS NULL AND failures > 0), "
+                "SUM(skip_reason LIKE ?), COUNT(skipped_at) FROM responses",
+                (DEAD_LETTER_REASON + '%',)
+            ).fetchone()
+        return {'responded': row[0], 'retrying': row[1] or 0, 'dead_letters': row[2] or 0, 'skipped': row[3]}
+
+    def is_responded(self, message_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM responses WHERE message_id = ? AND responded_at IS NOT NULL", (message_id,)
+            ).fetchone()
+        return row is not None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,66 +1,423 @@
 # server.py
 import os
+import asyncio
 import base64
-import json
-from typing import List, Dict, Any
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+import functools
+import logging
+import re
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 from fastmcp import FastMCP
-import chromadb
-from chromadb.config import Settings
-import openai
-import redis
+from cache import CircuitBreaker, TieredCache
+from cache_codec import PayloadCodec
+from cache_keys import KB_VERSION_KEY, chunk_identity, llm_cache_key, semantic_cache_key
+from config import (
+    get_blocking_io_workers, get_cache_payload_config, get_circuit_breaker_config, get_context_packer_config,
+    get_daemon_config, get_embedding_batch_size, get_fast_path_config, get_hybrid_retrieval_config,
+    get_kb_reload_config, get_l1_cache_config, get_llm_model, get_mail_store_config, get_metrics_config,
+    get_pipeline_workers, get_query_cluster_threshold, get_redis_config, get_semantic_cache_config,
+    get_send_scheduler_config, get_single_flight_config, get_vector_backend_config
+)
+from context_packer import ContextPacker, count_tokens
+from embeddings import embed_query, embed_texts, get_embedding_function
+from fast_path import load_fast_path
+from gmail_client import GmailServiceHolder, fetch_emails
+from hybrid_retriever import HybridRetriever
+from inbox_sync import InboxSync
+from kb_reload import ChunkRefs, KnowledgeBaseReloader
+from knowledge_base import load_chunks, load_knowledge
+from lazy import Lazy
+from lexical_index import BM25Index
+from mail_store import MailStore
+from metrics import Metrics
+from pipeline import Pipeline, Stage
+from query_clusters import assign_representatives, personalize_greeting, recipient_name
+from responder_daemon import PriorityScorer, ResponderDaemon
+from semantic_cache import SemanticCache
+from send_scheduler import SendRetryQueue, SendScheduler, TokenBucket
+from singleflight import SingleFlight
+from snapshot import load_vector_backend
 
 mcp = FastMCP("Demo 🚀")
+# stdout carries the MCP stdio protocol, so diagnostics go through logging (stderr)
+logger = logging.getLogger(__name__)
 
-# Gmail API setup
-SCOPES = [
-    'https://www.googleapis.com/auth/gmail.modify',
-    'https://www.googleapis.com/auth/gmail.send'
-]
+# --- Instrumentation ---
+# Latency spans (retrieval, LLM, Gmail auth/send) and counters for server_stats;
+# TRACE_FILE additionally appends every span to a JSONL file
+metrics = Metrics(**get_metrics_config())
+
+# --- Gmail API Setup ---
+gmail_holder = GmailServiceHolder()
 
 # --- RAG/ChromaDB Setup ---
-chroma_client = chromadb.Client(Settings(persist_directory="./chroma_db"))
-collection = chroma_client.get_or_create_collection("company_knowledge")
+# Backends are lazy singletons: nothing heavy (chromadb, openai, redis, the Google
+# client) is imported or connected until first use, or until the warm_up tool runs
+def open_chroma_client():
+    import chromadb
+    from chromadb.config import Settings
+    return chromadb.Client(Settings(persist_directory="./chroma_db"))
+
+def open_chroma_collection(name="company_knowledge"):
+    return chroma_client.get().get_or_create_collection(
+        name,
+        embedding_function=get_embedding_function()
+    )
+
+chroma_client = Lazy(open_chroma_client, 'chroma_client')
+chroma_collection = Lazy(open_chroma_collection, 'chroma')
+
+# The vector backend is warm-started from the on-disk snapshot written by `rag.py index`
+# (VECTOR_BACKEND=numpy serves it memory-mapped). It is opened on first use, and the
+# knowledge base is only re-embedded when the snapshot manifest no longer matches it.
+_vector_backend = None
+_vector_backend_status = {}
+_vector_backend_lock = threading.Lock()
+
+def get_vector_backend():
+    global _vector_backend
+    if _vector_backend is None:
+        with _vector_backend_lock:
+            if _vector_backend is None:
+                config = get_vector_backend_config()
+                # The numpy backend serves from the snapshot and never needs Chroma
+                collection = chroma_collection.get() if config['backend'] == 'chroma' else None
+                backend, status = load_vector_backend(
+                    load_chunks(), collection=collection, batch_size=get_embedding_batch_size(), **config
+                )
+                _vector_backend_status.update(status)
+                _vector_backend = backend
+    return _vector_backend
 
 # --- OpenAI LLM Setup ---
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# Clients are created on first use so the server starts without OPENAI_API_KEY
+def open_openai_client():
+    from openai import OpenAI
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def open_async_openai_client():
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+get_openai_client = Lazy(open_openai_client, 'openai')
+get_async_openai_client = Lazy(open_async_openai_client, 'openai_async')
+
+# --- Blocking I/O Pool ---
+# The Google client, Chroma and the embedding model are synchronous; async tools run
+# them here so one slow call never blocks the event loop serving other tool calls
+blocking_executor = ThreadPoolExecutor(max_workers=get_blocking_io_workers(), thread_name_prefix="blocking-io")
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(fn, *args, **kwargs))
 
 # --- Redis Caching Setup ---
-redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+# Pooled connections with tight socket timeouts, so a slow Redis cannot stall tool calls
+def open_redis_client():
+    import redis
+    return redis.Redis(connection_pool=redis.ConnectionPool(**get_redis_config(), decode_responses=True))
+
+def open_async_redis_client():
+    import redis.asyncio
+    return redis.asyncio.Redis(
+        connection_pool=redis.asyncio.ConnectionPool(**get_redis_config(), decode_responses=True)
+    )
+
+redis_client = Lazy(open_redis_client, 'redis')
+async_redis_client = Lazy(open_async_redis_client, 'redis_async')
+
+# In-process LRU (L1) in front of Redis (L2); a circuit breaker fails over to a
+# local in-memory store when Redis is down or slow. The clients connect on first use.
+cache = TieredCache(
+    redis_client,
+    breaker=CircuitBreaker(**get_circuit_breaker_config()),
+    async_redis=async_redis_client,
+    **get_l1_cache_config()
+)
 
 # --- Caching Helpers ---
 def cache_get(key):
-    return redis_client.get(key)
+    return cache.get(key)
 
 def cache_set(key, value, ex=3600):
-    redis_client.set(key, value, ex=ex)
+    cache.set(key, value, ex=ex)
+
+async def acache_get(key):
+    return await cache.aget(key)
+
+async def acache_set(key, value, ex=3600):
+    await cache.aset(key, value, ex=ex)
+
+# --- Knowledge Base Version ---
+# `rag.py index` writes a new stamp whenever the indexed chunks change; it is part of
+# every cache key, so a reindex invalidates all cached retrievals and answers at once
+KB_VERSION_REFRESH_SECONDS = 5
+_kb_version = {'value': None, 'checked_at': 0.0}
+
+def _kb_version_due():
+    return _kb_version['value'] is None or time.monotonic() - _kb_version['checked_at'] >= KB_VERSION_REFRESH_SECONDS
+
+def _update_kb_version(ok, version):
+    if not ok:
+        # Keep the last known stamp while Redis is unavailable
+        version = _kb_version['value']
+    version = version or "0"
+    if _kb_version['value'] is not None and version != _kb_version['value']:
+        semantic_cache.clear()
+    _kb_version.update(value=version, checked_at=time.monotonic())
+    return version
+
+def get_kb_version():
+    """Current knowledge base version stamp, re-read from Redis every few seconds"""
+    if _kb_version_due():
+        # Read straight from Redis: an L1 copy could hide a reindex for minutes
+        return _update_kb_version(*cache.get_direct(KB_VERSION_KEY))
+    return _kb_version['value']
+
+async def aget_kb_version():
+    if _kb_version_due():
+        return _update_kb_version(*(await cache.aget_direct(KB_VERSION_KEY)))
+    return _kb_version['value']
+
+# --- Semantic Query Cache ---
+# Near-duplicate queries (paraphrases, case/punctuation variants) reuse one retrieval
+semantic_cache = SemanticCache(**get_semantic_cache_config())
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation for cache keys"""
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?!. ")
 
 # --- RAG Search Function ---
-def semantic_search(query, n_results=3):
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
-    docs = results['documents'][0]
-    metas = results['metadatas'][0]
-    return list(zip(docs, metas))
+def semantic_search(query, n_results=3, query_embedding=None):
+    if query_embedding is None:
+        query_embedding = embed_query(query)
+    return get_vector_backend().query(query_embedding, n_results)[0]
+
+# --- Hybrid Retrieval ---
+def vector_search(query, n_results=3):
+    """Embedding retrieval: semantic cache first, then Chroma"""
+    normalized = normalize_query(query)
+    # The query is embedded once and reused for both the cache lookup and Chroma
+    query_embedding = embed_query(query)
+    results = semantic_cache.get(query_embedding, n_results, normalized)
+    if results is None:
+        results = semantic_search(query, n_results, query_embedding)
+        if kb_reloader.is_current(results):
+            semantic_cache.put(query_embedding, n_results, results, normalized)
+    return results
+
+def vector_search_many(queries, n_results=3):
+    """Batched vector_search: one embedding call and one backend query for all cache misses"""
+    query_embeddings = embed_texts(queries)
+    normalized = [normalize_query(query) for query in queries]
+    results, misses = [None] * len(queries), []
+    for position, query_embedding in enumerate(query_embeddings):
+        results[position] = semantic_cache.get(query_embedding, n_results, normalized[position])
+        if results[position] is None:
+            misses.append(position)
+    if misses:
+        for position, found in zip(misses, get_vector_backend().query(query_embeddings[misses], n_results)):
+            results[position] = found
+            if kb_reloader.is_current(found):
+                semantic_cache.put(query_embeddings[position], n_results, found, normalized[position])
+    return results
+
+# BM25 over the flattened knowledge base, built at startup and rebuilt on hot reload;
+# confident keyword matches (e.g. "birthday leave") skip the embedding call and Chroma entirely
+kb_chunks = load_chunks()
+lexical_index = BM25Index(kb_chunks)
+hybrid_retriever = HybridRetriever(
+    lexical_index, vector_search, vector_search_many, **get_hybrid_retrieval_config()
+)
 
 # --- Cached Semantic Search ---
-def cached_semantic_search(query, n_results=3):
-    cache_key = f"semantic:{query}:{n_results}"
-    cached = cache_get(cache_key)
-    if cached:
-        return json.loads(cached)
-    results = semantic_search(query, n_results)
-    cache_set(cache_key, json.dumps(results))
+# Cached retrievals and answers are recorded against the chunks they were built
+# from, so a knowledge base edit drops only the entries that used edited items
+chunk_refs = ChunkRefs(cache)
+# Retrievals are cached as chunk ids resolved against the loaded knowledge base,
+# and long answers compressed, instead of repeating chunk text under every key
+payload_codec = PayloadCodec(lambda: kb_reloader.table, **get_cache_payload_config())
+
+def retrieve_uncached(query, n_results=3):
+    """Retrieval behind the Redis cache"""
+    results, _ = hybrid_retriever.search(query, n_results)
     return results
 
+def cached_semantic_search(query, n_results=3):
+    with metrics.span('retrieval'):
+        normalized = normalize_query(query)
+        cache_key = semantic_cache_key(normalized, n_results, get_kb_version())
+        cached = cache_get(cache_key)
+        results = payload_codec.decode_retrieval(cached) if cached else None
+        if results is not None:
+            return results
+        results = retrieve_uncached(query, n_results)
+        # Never cache a retrieval of chunks a concurrent hot reload just replaced
+        if kb_reloader.is_current(results):
+            cache_set(cache_key, payload_codec.encode_retrieval(results))
+            chunk_refs.add(cache_key, results)
+        return results
+
+async def acached_semantic_search(query, n_results=3):
+    with metrics.span('retrieval'):
+        normalized = normalize_query(query)
+        cache_key = semantic_cache_key(normalized, n_results, await aget_kb_version())
+        cached = await acache_get(cache_key)
+        results = payload_codec.decode_retrieval(cached) if cached else None
+        if results is not None:
+            return results
+        results = await run_blocking(retrieve_uncached, query, n_results)
+        if kb_reloader.is_current(results):
+            await acache_set(cache_key, payload_codec.encode_retrieval(results))
+            await chunk_refs.aadd(cache_key, results)
+        return results
+
+# --- LLM-free Fast Path ---
+# Queries that closely match an FAQ, policy or response template are answered
+# from the knowledge base directly; embeddings come from the snapshot `rag.py index` builds
+fast_path_config = get_fast_path_config()
+_fast_path = None
+_fast_path_lock = threading.Lock()
+
+def get_fast_path():
+    global _fast_path
+    if _fast_path is None:
+        with _fast_path_lock:
+            if _fast_path is None:
+                _fast_path, _ = load_fast_path(
+                    load_knowledge(), get_vector_backend_config()['index_path'],
+                    fast_path_config['threshold'], get_embedding_batch_size(),
+                    fast_path_config['templates'], fast_path_config['excluded_sections'],
+                    fast_path_config['sensitive_terms']
+                )
+    return _fast_path
+
+def fast_path_matches(queries, known_embeddings=None):
+    """Fast path match (or None) per query, embedding all unknown queries in one call"""
+    matches = [None] * len(queries)
+    if not fast_path_config['enabled']:
+        return matches
+    known_embeddings = dict(known_embeddings or {})
+    positions = [position for position, query in enumerate(queries) if query]
+    unknown = sorted({queries[p] for p in positions if queries[p] not in known_embeddings})
+    try:
+        if unknown:
+            known_embeddings.update(zip(unknown, embed_texts(unknown)))
+        if positions:
+            embeddings = [known_embeddings[queries[p]] for p in positions]
+            for position, match in zip(positions, get_fast_path().match_many(embeddings)):
+                matches[position] = match
+    except Exception as e:
+        # The LLM path still answers everything
+        logger.warning("Fast path unavailable: %s", e)
+    return matches
+
+def reply_values(email):
+    """Template values for a reply: the recipient's name plus any 'fields' the email carries.
+
+    There is no fallback name: a template is only auto-filled when every
+    field, the greeting included, is actually known.
+    """
+    values = dict(email.get('fields') or {})
+    name = recipient_name(email)
+    if name:
+        values['name'] = name
+    return values
+
+def fast_path_reply(query, email):
+    """Fast path reply for one query ({'path', 'text', ...}), or None to use the LLM"""
+    match = fast_path_matches([query])[0]
+    return get_fast_path().render(match, reply_values(email)) if match else None
+
+def record_reply_path(path):
+    metrics.count(f"replies.{path}")
+    if _fast_path is not None:
+        _fast_path.record(path)
+
+# --- Knowledge Base Hot Reload ---
+# Edits to knowledge_base.json are picked up without `rag.py index` or a restart:
+# changed chunks are re-embedded, the indexes swapped in, and only cached entries
+# built from changed items (or an added item's nearest chunks) are dropped. The
+# version stamp stays; the next `rag.py index` publishes the new one
+kb_reload_config = get_kb_reload_config()
+# Each reload fills a fresh Chroma collection; the one it replaced is dropped at the
+# next reload, once no request can still be querying it
+_chroma_reloads = {'generation': 0, 'retired': None}
+
+def apply_knowledge_base(data, chunks):
+    """Build indexes for the edited knowledge base, then swap them in; requests use the old ones until then"""
+    global lexical_index, _vector_backend, _fast_path
+    details = {}
+    new_lexical_index = BM25Index(chunks)
+    new_vector_backend = new_fast_path = collection = None
+    previous_backend = _vector_backend
+    # Backends not loaded yet will read the edited file when they are
+    if previous_backend is not None:
+        config = get_vector_backend_config()
+        if config['backend'] == 'chroma':
+            _chroma_reloads['generation'] += 1
+            collection = open_chroma_collection(f"company_knowledge_r{_chroma_reloads['generation']}")
+        new_vector_backend, status = load_vector_backend(
+            chunks, collection=collection, batch_size=get_embedding_batch_size(), **config
+        )
+        details['vector_index'] = {name: status[name] for name in ('added', 'updated', 'deleted', 'load_seconds')}
+    if _fast_path is not None:
+        new_fast_path, counts = load_fast_path(
+            data, get_vector_backend_config()['index_path'], fast_path_config['threshold'], get_embedding_batch_size(),
+            fast_path_config['templates'], fast_path_config['excluded_sections'], fast_path_config['sensitive_terms']
+        )
+        details['fast_path'] = {name: counts[name] for name in ('added', 'updated', 'deleted')}
+    with _vector_backend_lock, _fast_path_lock:
+        lexical_index = hybrid_retriever.lexical_index = new_lexical_index
+        if new_vector_backend is not None:
+            _vector_backend_status.update(status)
+            _vector_backend = new_vector_backend
+        if new_fast_path is not None:
+            new_fast_path.inherit_stats(_fast_path)
+            _fast_path = new_fast_path
+    if collection is not None:
+        retired, _chroma_reloads['retired'] = _chroma_reloads['retired'], previous_backend.collection.name
+        if retired is not None:
+            chroma_client.get().delete_collection(retired)
+    return details
+
+def nearest_chunks(chunks):
+    """Ids of the loaded chunks nearest to each of `chunks` by embedding, in any section"""
+    if _vector_backend is None or not kb_reload_config['neighbours']:
+        return set()
+    vectors = embed_texts([chunk['content'] for chunk in chunks])
+    results = get_vector_backend().query(vectors, kb_reload_config['neighbours'] + 1)
+    return {chunk_identity(doc, meta) for hits in results for doc, meta in hits}
+
+def invalidate_chunks(chunk_ids):
+    """Drop cached retrievals and answers built from any of `chunk_ids`; returns how many keys were dropped"""
+    keys = sorted(chunk_refs.keys_for(chunk_ids))
+    for start in range(0, len(keys), 500):
+        cache.delete(*keys[start:start + 500])
+    semantic_cache.discard(lambda results: any(chunk_identity(doc, meta) in chunk_ids for doc, meta in results))
+    return len(keys)
+
+kb_reloader = KnowledgeBaseReloader(
+    kb_chunks, apply_knowledge_base, invalidate_chunks,
+    interval=kb_reload_config['interval'], settle_seconds=kb_reload_config['settle_seconds'],
+    neighbours_fn=nearest_chunks
+)
+
 # --- LLM Response Generation ---
-def generate_llm_response(query, context_chunks):
-    context_text = "\n\n".join([doc for doc, meta in context_chunks])
+# Retrieved chunks are packed into a token budget: boilerplate labels stripped,
+# near-duplicates dropped, most relevant first
+context_packer = ContextPacker(model=get_llm_model(), **get_context_packer_config())
+
+# Bump when the prompt below changes so cached answers from the old prompt are not reused
+# (the context budget is part of it, since it changes what the prompt contains)
+PROMPT_VERSION = f"2-{context_packer.budget}"
+
+def build_prompt(query, context_chunks):
+    context_text, pack_stats = context_packer.pack(context_chunks)
     prompt = f"""
 You are an intelligent HR assistant. Use the following company knowledge to answer the user's question. Be concise, accurate, and polite.
 
@@ -72,100 +429,195 @@ User Question:
 
 Response:
 """
-    response = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "system", "content": prompt}]
+    prompt_tokens = count_tokens(prompt, context_packer.model)
+    context_packer.record(pack_stats, prompt_tokens)
+    logger.info(
+        "Prompt tokens: %d (context %d of %d tokens, %d of %d chunks, %d duplicates dropped)",
+        prompt_tokens, pack_stats['packed_context_tokens'], pack_stats['raw_context_tokens'],
+        pack_stats['packed_chunks'], pack_stats['chunks'], pack_stats['duplicates_dropped']
     )
+    return prompt
+
+def generate_llm_response(query, context_chunks):
+    prompt = build_prompt(query, context_chunks)
+    with metrics.span('llm'):
+        response = get_openai_client().chat.completions.create(
+            model=get_llm_model(),
+            messages=[{"role": "system", "content": prompt}]
+        )
+    context_packer.record_usage(response.usage)
+    return response.choices[0].message.content.strip()
+
+async def agenerate_llm_response(query, context_chunks):
+    prompt = build_prompt(query, context_chunks)
+    with metrics.span('llm'):
+        response = await get_async_openai_client().chat.completions.create(
+            model=get_llm_model(),
+            messages=[{"role": "system", "content": prompt}]
+        )
+    context_packer.record_usage(response.usage)
     return response.choices[0].message.content.strip()
 
 # --- Cached LLM Response ---
+# Concurrent misses for the same answer (e.g. many employees asking about a new
+# policy at once) share one generation, in-process and across servers via Redis
+llm_flight = SingleFlight(cache, **get_single_flight_config())
+
 def cached_llm_response(query, context_chunks):
-    context_text = "\n\n".join([doc for doc, meta in context_chunks])
-    cache_key = f"llm:{query}:{hash(context_text)}"
+    cache_key = llm_cache_key(
+        normalize_query(query), context_chunks, get_llm_model(), PROMPT_VERSION, get_kb_version()
+    )
     cached = cache_get(cache_key)
     if cached:
-        return cached
-    response = generate_llm_response(query, context_chunks)
-    cache_set(cache_key, response)
-    return response
+        return payload_codec.decode_text(cached)
+
+    def generate():
+        response = generate_llm_response(query, context_chunks)
+        if kb_reloader.is_current(context_chunks):
+            # Written through immediately so waiters in other processes can see it
+            cache.set(cache_key, payload_codec.encode_text(response), defer=False)
+            chunk_refs.add(cache_key, context_chunks)
+        return response
+
+    # Waiters on another process's generation get the cached (encoded) value
+    return payload_codec.decode_text(llm_flight.do(cache_key, generate))
+
+async def acached_llm_response(query, context_chunks):
+    cache_key = llm_cache_key(
+        normalize_query(query), context_chunks, get_llm_model(), PROMPT_VERSION, await aget_kb_version()
+    )
+    cached = await acache_get(cache_key)
+    if cached:
+        return payload_codec.decode_text(cached)
+
+    async def generate():
+        response = await agenerate_llm_response(query, context_chunks)
+        if kb_reloader.is_current(context_chunks):
+            await acache_set(cache_key, payload_codec.encode_text(response))
+            await chunk_refs.aadd(cache_key, context_chunks)
+        return response
+
+    return payload_codec.decode_text(await llm_flight.ado(cache_key, generate))
+
+async def agenerate_reply(query, email):
+    """Reply text and the path that served it ('faq', 'template' or 'llm')"""
+    reply = await run_blocking(fast_path_reply, query, email)
+    if reply is not None:
+        path, text = reply['path'], reply['text']
+    else:
+        context_chunks = await acached_semantic_search(query, n_results=3)
+        path, text = 'llm', await acached_llm_response(query, context_chunks)
+    record_reply_path(path)
+    return text, path
 
-# --- Gmail API Auth ---
 def get_gmail_service():
-    """Get authenticated Gmail service"""
-    creds = None
-    
-    # Load credentials from token.json
-    if os.path.exists('token.json'):
-        try:
-            with open('token.json', 'r') as token:
-                token_data = json.load(token)
-            
-            creds = Credentials(
-                token=None,  # We'll refresh this
-                refresh_token=token_data.get('refresh_token'),
-                token_uri=token_data.get('token_uri', 'https://oauth2.googleapis.com/token'),
-                client_id=token_data.get('client_id'),
-                client_secret=token_data.get('client_secret'),
-                scopes=token_data.get('scopes', SCOPES)
-            )
-        except Exception as e:
-            print(f"Error loading token.json: {e}")
-            creds = None
-    
-    # If there are no (valid) credentials available, let the user log in
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                creds = None
-        
-        if not creds:
-            # Use credential.json for OAuth client configuration
-            if not os.path.exists('credential.json'):
-                raise FileNotFoundError("credential.json not found. Please provide your OAuth client credentials as credential.json.")
-            try:
-                flow = InstalledAppFlow.from_client_secrets_file('credential.json', SCOPES)
-                creds = flow.run_local_server(port=0)
-                
-                # Save the credentials for the next run
-                token_data = {
-                    'refresh_token': creds.refresh_token,
-                    'client_id': creds.client_id,
-                    'client_secret': creds.client_secret,
-                    'token_uri': creds.token_uri,
-                    'scopes': creds.scopes
-                }
-                
-                with open('token.json', 'w') as token:
-                    json.dump(token_data, token, indent=2)
-                    
-            except Exception as e:
-                import traceback
-                print("Error during OAuth flow:", repr(e))
-                traceback.print_exc()
-                raise Exception("Failed to authenticate with Google. Please check your credential.json.")
-    
-    return build('gmail', 'v1', credentials=creds)
+    """Get the authenticated Gmail service for the calling thread"""
+    # Near zero once the thread has a service; the slow cases are loading,
+    # refreshing or running the OAuth flow and building the service
+    with metrics.span('gmail_auth'):
+        return gmail_holder.get_service()
 
-def extract_email_body(payload):
-    """Extract email body from Gmail API payload"""
-    if not payload:
-        return ""
-    
-    # If payload has body data
-    if payload.get('body') and payload['body'].get('data'):
-        return base64.urlsafe_b64decode(payload['body']['data']).decode('utf-8')
-    
-    # If payload has parts (multipart email)
-    if payload.get('parts'):
-        for part in payload['parts']:
-            if part.get('mimeType') == 'text/plain':
-                if part.get('body') and part['body'].get('data'):
-                    return base64.urlsafe_b64decode(part['body']['data']).decode('utf-8')
-    
-    return "(No body content)"
+# --- Local Mail Store ---
+# SQLite copy of the inbox kept current with Gmail historyId deltas; it also
+# records which messages were auto-responded so none is answered twice
+mail_store_config = get_mail_store_config()
+# Opened on first use, so importing the server creates no SQLite files
+mail_store = Lazy(lambda: MailStore(
+    mail_store_config['path'],
+    max_failures=mail_store_config['max_response_failures'],
+    retry_delay=mail_store_config['response_retry_delay'],
+    claim_timeout=mail_store_config['response_claim_timeout']
+), 'mail_store')
+inbox_sync = InboxSync(mail_store, get_gmail_service, bootstrap_limit=mail_store_config['bootstrap_limit'])
+
+def stored_email(row, include_body=True, max_body_chars=500):
+    """Shape a mail store row like the get_mails results from Gmail"""
+    email = {
+        'id': row['id'],
+        'thread_id': row['thread_id'],
+        'subject': row['subject'],
+        'from': row['sender'],
+        'date': row['date'],
+        'body_size': row['body_size'],
+        'responded': row['responded_at'] is not None,
+        'skip_reason': row['skip_reason']
+    }
+    if include_body:
+        body = row['body'] or ''
+        email['body'] = body[:max_body_chars] + '...' if len(body) > max_body_chars else body
+    return email
+
+def send_message(service, to, subject, body, thread=None):
+    """Send a plain-text email with an already authenticated Gmail service.
+
+    `thread` ('thread_id', 'in_reply_to', 'references') sends it as a reply in
+    the conversation it answers rather than as a new thread.
+    """
+    thread = thread or {}
+    reply_headers = ''
+    if thread.get('in_reply_to'):
+        reply_headers += f"In-Reply-To: {thread['in_reply_to']}\r\n"
+    if thread.get('references'):
+        reply_headers += f"References: {thread['references']}\r\n"
+    message = {
+        'raw': base64.urlsafe_b64encode(
+            f'To: {to}\r\n'
+            f'Subject: {subject}\r\n'
+            f'{reply_headers}'
+            f'Content-Type: text/plain; charset=utf-8\r\n'
+            f'MIME-Version: 1.0\r\n'
+            f'\r\n'
+            f'{body}'.encode('utf-8')
+        ).decode('utf-8').rstrip('=')
+    }
+    if thread.get('thread_id'):
+        message['threadId'] = thread['thread_id']
+    return service.users().messages().send(
+        userId='me',
+        body=message
+    ).execute()
+
+def send_with_shared_service(to, subject, body, thread=None):
+    """Send using the calling thread's Gmail service (for the blocking I/O pool)"""
+    service = get_gmail_service()
+    with metrics.span('gmail_send'):
+        return send_message(service, to, subject, body, thread)
+
+# --- Send Scheduling ---
+# All sends go through a token bucket sized in Gmail quota units, retry 429/5xx
+# with jittered backoff, and park still-failing messages in a durable queue.
+# Answered incoming messages are marked in the mail store once actually sent.
+send_config = get_send_scheduler_config()
+send_retry_queue = Lazy(lambda: SendRetryQueue(send_config['queue_path']), 'send_queue')
+send_scheduler = SendScheduler(
+    lambda to, subject, body, thread: send_with_shared_service(to, subject, body, thread),
+    TokenBucket(send_config['quota_units_per_second'], send_config['quota_burst']),
+    send_retry_queue,
+    max_attempts=send_config['max_attempts'],
+    base_delay=send_config['base_delay'],
+    max_delay=send_config['max_delay'],
+    queue_max_attempts=send_config['queue_max_attempts'],
+    on_sent=lambda message_id, sent_id: mail_store().mark_responded(message_id, sent_id),
+    on_failed=lambda message_id: mail_store().release_claim(message_id)
+)
+
+class SendFailed(RuntimeError):
+    """A send that failed for good; the scheduler's on_failed hook has already released its claim"""
+
+def scheduled_send(to, subject, body, message_id=None):
+    """Send through the scheduler; returns the outcome if sent or queued,
+    raises SendFailed if the send failed for good"""
+    outcome = send_scheduler.send(to, subject, body, message_id)
+    if outcome['status'] == 'failed':
+        raise SendFailed(outcome['error'])
+    return outcome
+
+def send_result_text(outcome, body, path=None):
+    answered_by = f"\nAnswered by: {path}" if path else ""
+    if outcome['status'] == 'queued':
+        return (f"Email queued for retry after {outcome['attempts']} attempts ({outcome['error']}). "
+                f"Queue ID: {outcome['queue_id']}{answered_by}\n\nResponse:\n{body}")
+    return f"Email sent successfully! Message ID: {outcome['id']}{answered_by}\n\nResponse:\n{body}"
 
 @mcp.tool
 def add(a: int, b: int) -> int:
@@ -178,60 +630,63 @@ def subtract(a: int, b: int) -> int:
     return a - b
 
 @mcp.tool
-def get_mails(limit: int = 10, query: str = "") -> List[Dict[str, Any]]:
+async def get_mails(
+    limit: int = 10,
+    query: str = "",
+    headers_only: bool = False,
+    source: str = "gmail",
+    sender: str = "",
+    unresponded_only: bool = False
+) -> List[Dict[str, Any]]:
     """Fetch emails from Gmail inbox
     
     Args:
         limit: Maximum number of emails to return (default: 10)
-        query: Gmail search query (e.g., "from:example@gmail.com", "subject:meeting")
+        query: Gmail search query (e.g., "from:example@gmail.com", "subject:meeting"); "gmail" source only
+        headers_only: Only fetch Subject/From/Date, without bodies (faster for listing views)
+        source: "gmail" to query the Gmail API, or "store" to answer from the local synced mail store
+        sender: "store" source only: only messages whose From contains this text
+        unresponded_only: "store" source only: skip messages that were already auto-responded
     
     Returns:
-        List of email objects with id, subject, from, date, and body
+        List of email objects with id, subject, from, date, and body (omitted when headers_only);
+        "store" results also carry thread_id, responded and skip_reason (why the auto-responder
+        will not answer it, e.g. a mailing list or repeated failed sends)
     """
     try:
-        service = get_gmail_service()
-        
-        # Get list of messages
-        response = service.users().messages().list(
-            userId='me',
-            maxResults=limit,
-            q=query
-        ).execute()
-        
-        messages = response.get('messages', [])
-        email_details = []
-        
-        for msg in messages:
-            # Get full message details
-            detail = service.users().messages().get(
-                userId='me',
-                id=msg['id']
-            ).execute()
-            
-            # Extract headers
-            headers = detail['payload'].get('headers', [])
-            subject = next((h['value'] for h in headers if h['name'] == 'Subject'), '')
-            from_email = next((h['value'] for h in headers if h['name'] == 'From'), '')
-            date = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-            
-            # Extract body
-            body = extract_email_body(detail['payload'])
-            
-            email_details.append({
-                'id': msg['id'],
-                'subject': subject,
-                'from': from_email,
-                'date': date,
-                'body': body[:500] + '...' if len(body) > 500 else body  # Truncate long bodies
-            })
-        
-        return email_details
+        if source == "store":
+            try:
+                # Usually a single history.list call; skipped when the last sync is recent
+                await run_blocking(inbox_sync.sync_if_stale, mail_store_config['sync_interval'])
+            except Exception as e:
+                logger.warning("Inbox sync failed, answering from the local store: %s", e)
+            rows = await run_blocking(
+                mail_store().query, limit, sender=sender or None, unresponded_only=unresponded_only
+            )
+            return [stored_email(row, include_body=not headers_only) for row in rows]
+
+        # Message details are fetched with Gmail batch requests, not one call per message
+        return await run_blocking(
+            lambda: fetch_emails(get_gmail_service(), limit=limit, query=query, headers_only=headers_only)
+        )
         
     except Exception as e:
         return [{"error": f"Failed to fetch emails: {str(e)}"}]
 
+@mcp.tool
+async def sync_inbox() -> Dict[str, Any]:
+    """Pull new and deleted inbox messages into the local mail store using Gmail history
+    Returns:
+        Dict with 'mode' ('bootstrap' or 'history'), 'added', 'deleted', 'failed' (detail fetches that failed),
+        'pending' (messages to fetch again next sync), 'abandoned', 'history_id', 'stored' and 'elapsed_seconds'
+    """
+    try:
+        return await run_blocking(inbox_sync.sync)
+    except Exception as e:
+        return {"error": f"Failed to sync inbox: {str(e)}"}
+
 @mcp.tool  
-def send_mail(
+async def send_mail(
     to: str,
     subject: str,
     body: str = "",
@@ -250,90 +705,437 @@ def send_mail(
     """
     try:
         # If auto_respond is requested or body is empty, generate the body
+        path = None
         if auto_respond or not body:
             if not user_query:
                 return "Error: user_query must be provided for auto-responding."
-            context_chunks = cached_semantic_search(user_query, n_results=3)
-            body = cached_llm_response(user_query, context_chunks)
-        service = get_gmail_service()
-        message = {
-            'raw': base64.urlsafe_b64encode(
-                f'To: {to}\r\n'
-                f'Subject: {subject}\r\n'
-                f'Content-Type: text/plain; charset=utf-8\r\n'
-                f'MIME-Version: 1.0\r\n'
-                f'\r\n'
-                f'{body}'.encode('utf-8')
-            ).decode('utf-8').rstrip('=')
-        }
-        sent_message = service.users().messages().send(
-            userId='me',
-            body=message
-        ).execute()
-        return f"Email sent successfully! Message ID: {sent_message['id']}\n\nResponse:\n{body}"
+            body, path = await agenerate_reply(user_query, {'to': to})
+        outcome = await run_blocking(scheduled_send, to, subject, body)
+        return send_result_text(outcome, body, path)
     except Exception as e:
         return f"Failed to send email: {str(e)}"
 
 @mcp.tool  
-def intelligent_send_mail(to: str, subject: str, user_query: str) -> str:
+async def intelligent_send_mail(to: str, subject: str, user_query: str, message_id: str = "") -> str:
     """Generate an intelligent email response using company knowledge and send it via Gmail.
     Args:
         to: Recipient email address
         subject: Email subject
         user_query: The question or context to answer (e.g., the incoming email body)
+        message_id: Id of the incoming email being answered; it is answered at most once
     Returns:
         Success message with message ID or error message
     """
+    if message_id and not await run_blocking(lambda: mail_store().claim_response(message_id)):
+        return (f"Skipped: message {message_id} is not open for a reply "
+                "(already answered, in progress, skipped or backing off)")
     try:
-        # 1. Semantic search for relevant knowledge
-        context_chunks = cached_semantic_search(user_query, n_results=3)
-        # 2. Generate response using LLM
-        llm_response = cached_llm_response(user_query, context_chunks)
+        # 1-2. FAQ/template fast path, or semantic search + LLM
+        response, path = await agenerate_reply(user_query, {'to': to})
         # 3. Send the email
-        service = get_gmail_service()
-        message = {
-            'raw': base64.urlsafe_b64encode(
-                f'To: {to}\r\n'
-                f'Subject: {subject}\r\n'
-                f'Content-Type: text/plain; charset=utf-8\r\n'
-                f'MIME-Version: 1.0\r\n'
-                f'\r\n'
-                f'{llm_response}'.encode('utf-8')
-            ).decode('utf-8').rstrip('=')
-        }
-        sent_message = service.users().messages().send(
-            userId='me',
-            body=message
-        ).execute()
-        return f"Email sent successfully! Message ID: {sent_message['id']}\n\nResponse:\n{llm_response}"
+        outcome = await run_blocking(scheduled_send, to, subject, response, message_id or None)
+        return send_result_text(outcome, response, path)
+    except SendFailed as e:
+        return f"Failed to send intelligent email: {str(e)}"
     except Exception as e:
+        if message_id:
+            await run_blocking(lambda: mail_store().release_claim(message_id))
         return f"Failed to send intelligent email: {str(e)}"
 
 # --- Batch Email Processing ---
-def batch_auto_respond(email_list):
-    results = []
-    for email in email_list:
-        to = email.get('to')
-        subject = email.get('subject')
-        user_query = email.get('user_query')
-        # Use cached semantic search and LLM
-        context_chunks = cached_semantic_search(user_query, n_results=3)
-        body = cached_llm_response(user_query, context_chunks)
-        result = send_mail(to=to, subject=subject, body=body)
-        results.append({'to': to, 'subject': subject, 'result': result})
-    return results
+def prefetch_batch_cache(queries, n_results=3):
+    """Warm the L1 cache for a batch with two MGETs instead of 2N single GETs.
+
+    The first MGET fetches cached retrievals for every query. Retrievals that
+    are not cached are computed together (one embedding call and one vector
+    backend query) and cached. The second MGET fetches cached answers for
+    those retrievals.
+    """
+    kb_version = get_kb_version()
+    normalized = [normalize_query(query or '') for query in queries]
+    semantic_keys = [semantic_cache_key(n, n_results, kb_version) for n in normalized]
+    found = cache.get_many(semantic_keys)
+    retrievals = {}
+    for key, value in found.items():
+        results = payload_codec.decode_retrieval(value)
+        if results is not None:
+            retrievals[key] = results
+    missing = {key: query for query, key in zip(queries, semantic_keys) if query and key not in retrievals}
+    if missing:
+        try:
+            retrieved = hybrid_retriever.search_many(list(missing.values()), n_results)
+        except Exception as e:
+            # Each email's own retrieve stage will retry and report its error
+            logger.warning("Batched retrieval failed: %s", e)
+            retrieved = []
+        fresh = {}
+        for key, results in zip(missing, retrieved):
+            retrievals[key] = results
+            if kb_reloader.is_current(results):
+                cache_set(key, payload_codec.encode_retrieval(results))
+                fresh[key] = results
+        chunk_refs.add_many(fresh)
+    llm_keys = []
+    for query, key in zip(normalized, semantic_keys):
+        if key in retrievals:
+            llm_keys.append(llm_cache_key(query, retrievals[key], get_llm_model(), PROMPT_VERSION, kb_version))
+    if llm_keys:
+        cache.get_many(llm_keys)
+
+def retrieve_stage(item):
+    email, query, match, personalize = item
+    reply = get_fast_path().render(match, reply_values(email)) if match else None
+    if reply is not None:
+        return email, query, None, reply, personalize
+    return email, query, cached_semantic_search(query, n_results=3), None, personalize
+
+def generate_stage(item):
+    email, query, context_chunks, reply, personalize = item
+    if reply is not None:
+        return email, reply['text'], reply['path'], personalize
+    return email, cached_llm_response(query, context_chunks), 'llm', personalize
+
+def send_stage(item):
+    email, body, path, personalize = item
+    record_reply_path(path)
+    if personalize:
+        body = personalize_greeting(body, recipient_name(email))
+    thread = {key: email[key] for key in ('thread_id', 'in_reply_to', 'references') if email.get(key)}
+    # Never raises: failed sends are reported with their attempts and timings
+    return body, path, send_scheduler.send(
+        email.get('to'), email.get('subject'), body, email.get('message_id'), thread or None
+    )
+
+# One long-lived pipeline for every batch: its stage pools, and the Gmail service
+# each send worker thread holds, are reused instead of rebuilt per batch
+pipeline_workers = get_pipeline_workers()
+batch_pipeline = Pipeline([
+    Stage('retrieve', retrieve_stage, pipeline_workers['retrieve']),
+    Stage('generate', generate_stage, pipeline_workers['generate']),
+    Stage('send', send_stage, pipeline_workers['send'])
+])
+
+def batch_auto_respond(email_list, retrieve_workers=None, generate_workers=None, send_workers=None,
+                       cluster=True, cluster_threshold=None, personalize=True):
+    """Run retrieve -> generate -> send as a pipelined, bounded-concurrency batch.
+
+    Each stage has its own worker pool, so retrieval for later emails overlaps
+    with LLM calls and Gmail sends for earlier ones. Results keep the input
+    order and a failure in one email does not affect the others.
+
+    With `cluster`, paraphrased queries are grouped first (one embedding call
+    for the batch) and every email is answered with its cluster
+    representative's query, so retrieval and generation run once per cluster
+    (the rest are cache hits or coalesced) and the answer is fanned out with
+    the greeting addressed to each recipient.
+
+    Emails that carry the incoming 'message_id' are answered at most once;
+    ones already auto-responded (or in progress, skipped by the auto-responder,
+    or backing off after a failed send) are reported as 'skipped'. Queries that
+    confidently match an FAQ or response template are answered without
+    retrieval or the LLM.
+    """
+    threshold = cluster_threshold or get_query_cluster_threshold()
+
+    skipped = [
+        bool(email.get('message_id')) and not mail_store().claim_response(email['message_id'])
+        for email in email_list
+    ]
+    positions = [position for position, skip in enumerate(skipped) if not skip]
+    pending = [email_list[position] for position in positions]
+
+    queries = [email.get('user_query') for email in pending]
+    representatives = list(range(len(queries)))
+    # Query embeddings from clustering are reused for fast path matching
+    embedded = {}
+
+    def embed_once(texts):
+        vectors = embed_texts(texts)
+        embedded.update(zip(texts, vectors))
+        return vectors
+
+    if cluster:
+        try:
+            representatives = assign_representatives(queries, embed_once, threshold)
+        except Exception as e:
+            # Fall back to answering every email on its own
+            logger.warning("Query clustering failed: %s", e)
+    unique_reps = sorted(set(representatives))
+    matches = dict(zip(unique_reps, fast_path_matches([queries[rep] for rep in unique_reps], embedded)))
+
+    items = [(email, queries[rep], matches[rep], personalize) for email, rep in zip(pending, representatives)]
+    workers = {'retrieve': retrieve_workers, 'generate': generate_workers, 'send': send_workers}
+    # Cache writes from the prefetch and all workers go to Redis as pipelined batches
+    with cache.deferred_writes():
+        prefetch_batch_cache([queries[rep] for rep in unique_reps if matches[rep] is None])
+        records, stats = batch_pipeline.run(items, workers)
+
+    answered = [rep for query, rep in zip(queries, representatives) if query]
+    stats['clusters'] = {
+        'count': len(set(answered)),
+        'clustered_emails': sum(1 for position, rep in enumerate(representatives) if rep != position),
+        'llm_calls_saved': len(answered) - len(set(answered)),
+        'threshold': threshold if cluster else None
+    }
+    stats['skipped'] = len(email_list) - len(pending)
+
+    results = [
+        {'to': email.get('to'), 'subject': email.get('subject'), 'status': 'skipped',
+         'result': f"Message {email['message_id']} is not open for a reply "
+                   "(already answered, in progress, skipped or backing off)", 'timings': {}}
+        if skip else None
+        for email, skip in zip(email_list, skipped)
+    ]
+    for position, email, rep, record in zip(positions, pending, representatives, records):
+        send = path = None
+        if record['error'] is not None:
+            status, result = 'failed', f"Failed at {record['failed_stage']} stage: {record['error']}"
+            if email.get('message_id'):
+                mail_store().release_claim(email['message_id'])
+        else:
+            body, path, outcome = record['value']
+            status = outcome['status']
+            if status == 'failed':
+                result = f"Failed at send stage: {outcome['error']}"
+            else:
+                result = send_result_text(outcome, body)
+            send = {
+                'attempts': outcome['attempts'],
+                'queue_wait_seconds': round(outcome['queue_wait_seconds'], 4),
+                'backoff_seconds': round(outcome['backoff_seconds'], 4),
+                'send_seconds': round(outcome['send_seconds'], 4)
+            }
+        results[position] = {
+            'to': email.get('to'),
+            'subject': email.get('subject'),
+            'status': status,
+            'result': result,
+            'cluster': positions[rep],
+            'path': path,
+            'send': send,
+            'seconds': round(record['seconds'], 4),
+            'timings': {name: round(seconds, 4) for name, seconds in record['timings'].items()}
+        }
+    paths = [r['path'] for r in results if r.get('path')]
+    stats['paths'] = {path: paths.count(path) for path in ('faq', 'template', 'llm')}
+    stats['llm_skip_ratio'] = round(1 - stats['paths']['llm'] / len(paths), 4) if paths else 0.0
+    stats['send_status'] = {
+        status: sum(1 for r in results if r['status'] == status) for status in ('sent', 'queued', 'failed', 'skipped')
+    }
+    return {'results': results, 'stats': stats}
 
 @mcp.tool
-def batch_respond_to_emails(email_batch: List[Dict[str, str]]) -> List[Dict[str, str]]:
+async def batch_respond_to_emails(
+    email_batch: List[Dict[str, str]],
+    retrieve_workers: int = 0,
+    generate_workers: int = 0,
+    send_workers: int = 0,
+    cluster: bool = True,
+    cluster_threshold: float = 0,
+    personalize: bool = True
+) -> Dict[str, Any]:
     """Batch auto-respond to a list of emails using company knowledge and LLM with caching.
     Args:
-        email_batch: List of dicts with keys 'to', 'subject', 'user_query'
+        email_batch: List of dicts with keys 'to', 'subject', 'user_query' (optional 'name' for the greeting,
+            'message_id' of the incoming email so it is never answered twice, 'thread_id', 'in_reply_to' and
+            'references' to reply in its conversation, and 'fields' with values for response template
+            placeholders such as 'leave_type' or 'date_range')
+        retrieve_workers: Concurrent semantic searches (0 = RETRIEVE_WORKERS env, default 4)
+        generate_workers: Concurrent LLM calls (0 = GENERATE_WORKERS env, default 4)
+        send_workers: Concurrent Gmail sends (0 = SEND_WORKERS env, default 2)
+        cluster: Answer paraphrased queries once per cluster of similar queries
+        cluster_threshold: Cosine similarity to join a cluster (0 = QUERY_CLUSTER_THRESHOLD env, default 0.9)
+        personalize: Address each shared answer to its recipient by name
+    Returns:
+        Dict with 'results' (per email, in input order: 'to', 'subject', 'status' ('sent', 'queued', 'failed'
+        or 'skipped'), 'result', 'cluster', 'path' (what wrote the reply: 'faq', 'template'
+        or 'llm'), 'send' (attempts, rate-limiter queue wait, backoff and send latency),
+        'seconds' (wall clock in the pipeline) and 'timings' (per stage)) and 'stats' (throughput,
+        per-stage timing, cluster count / LLM calls saved, skipped emails, replies per path with the
+        LLM-skip ratio and final send status counts for the whole batch)
+    """
+    # The batch pipeline has its own bounded per-stage pools; running it off the
+    # event loop keeps other tool calls responsive while a large batch is in flight
+    return await asyncio.to_thread(
+        batch_auto_respond, email_batch, retrieve_workers, generate_workers, send_workers,
+        cluster, cluster_threshold, personalize
+    )
+
+# --- Auto-responder Daemon ---
+# Watches the inbox through the mail store and answers new messages by priority
+# (sender domain, keywords, age) within the response-time SLA. Runs inside the
+# MCP server with AUTO_RESPOND_DAEMON=true, or headless with `--daemon`.
+daemon_config = get_daemon_config()
+responder_daemon = ResponderDaemon(
+    mail_store,
+    inbox_sync.sync,
+    batch_auto_respond,
+    PriorityScorer(
+        daemon_config['domains'], daemon_config['keywords'],
+        daemon_config['age_weight'], daemon_config['sla_seconds']
+    ),
+    sla_seconds=daemon_config['sla_seconds'],
+    poll_interval=daemon_config['poll_interval'],
+    workers=daemon_config['workers'],
+    batch_size=daemon_config['batch_size'],
+    max_queue=daemon_config['max_queue'],
+    lookback_seconds=daemon_config['lookback_seconds'],
+    metrics=metrics,
+    own_addresses=daemon_config['own_addresses']
+)
+
+def run_daemon():
+    """Run only the auto-responder until SIGTERM/SIGINT, then shut down gracefully"""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+    responder_daemon.start()
+    if kb_reload_config['enabled']:
+        kb_reloader.start()
+    logger.info(
+        "Auto-responder running (SLA %gs, %d workers)", daemon_config['sla_seconds'], daemon_config['workers']
+    )
+    while not stop.wait(1):
+        pass
+    logger.info("Stopping auto-responder: finishing in-flight batches...")
+    responder_daemon.stop()
+    kb_reloader.stop()
+    batch_pipeline.close()
+    send_scheduler.stop()
+
+@mcp.tool
+def gmail_client_stats() -> Dict[str, Any]:
+    """Report how often the shared Gmail client loaded credentials, refreshed the token and built services"""
+    return gmail_holder.stats()
+
+@mcp.tool
+def send_queue_stats() -> Dict[str, Any]:
+    """Report sends, retries, rate-limiter wait and the durable retry queue (pending/dead messages)"""
+    return send_scheduler.stats()
+
+@mcp.tool
+def cache_stats() -> Dict[str, Any]:
+    """Report cache hit rates and what the caches saved
+    Returns:
+        Dict with hit rates per tier (L1, Redis), 'semantic_cache', 'retrieval', 'llm_single_flight',
+        'prompt_tokens', 'fast_path', 'vector_index', 'kb_reload' (reloads, cached entries dropped)
+        and 'payloads' (how compactly cached values are stored)
+    """
+    return {
+        **cache.stats(),
+        'semantic_cache': semantic_cache.stats(),
+        'retrieval': hybrid_retriever.stats(),
+        'llm_single_flight': llm_flight.stats(),
+        'prompt_tokens': context_packer.stats(),
+        'fast_path': _fast_path.stats() if _fast_path is not None else {'enabled': fast_path_config['enabled']},
+        'vector_index': dict(_vector_backend_status, loaded=_vector_backend is not None),
+        'kb_reload': dict(kb_reloader.stats(), tracked_cache_keys=len(chunk_refs)),
+        'payloads': payload_codec.stats()
+    }
+
+@mcp.tool
+async def reload_knowledge_base() -> Dict[str, Any]:
+    """Apply edits to knowledge_base.json now instead of waiting for the file watcher
+    Returns:
+        Dict with items 'added', 'updated' and 'deleted', 'affected_chunks', 'keys_invalidated' (cached
+        retrievals/answers dropped) and 'seconds', or 'changed': False if the file matches what is loaded
+    """
+    try:
+        summary = await run_blocking(kb_reloader.reload)
+    except Exception as e:
+        return {'error': f"Knowledge base not reloaded: {e}"}
+    return summary or {'changed': False}
+
+# --- Warm-up and Server Stats ---
+LAZY_BACKENDS = [
+    chroma_collection, get_openai_client, get_async_openai_client, redis_client, async_redis_client,
+    mail_store, send_retry_queue
+]
+
+def warm_gmail():
+    # Never start the interactive OAuth flow from a warm-up
+    if not os.path.exists(gmail_holder.token_path):
+        raise FileNotFoundError(f"{gmail_holder.token_path} not found; authenticate first")
+    get_gmail_service()
+
+def warm_redis():
+    async_redis_client.get()
+    ok, _ = cache.get_direct(KB_VERSION_KEY)
+    if not ok:
+        raise ConnectionError("Redis unavailable; the cache serves from its in-memory fallback")
+
+WARM_UP_STEPS = {
+    'vector_index': get_vector_backend,
+    'fast_path': lambda: get_fast_path() if fast_path_config['enabled'] else None,
+    'embeddings': lambda: embed_query("warm up"),
+    'openai': lambda: (get_openai_client(), get_async_openai_client()),
+    'redis': warm_redis,
+    'gmail': warm_gmail,
+    'stores': lambda: (mail_store(), send_retry_queue())
+}
+
+@mcp.tool
+async def warm_up(components: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Initialize backends now instead of on the first request that needs them
+    Args:
+        components: Any of 'vector_index', 'fast_path', 'embeddings', 'openai', 'redis', 'gmail', 'stores'
+            (the SQLite mail store and send queue) (default: all)
+    Returns:
+        Dict per component with 'seconds' taken and 'error' if it could not be initialized
+    """
+    report = {}
+    for name in components or list(WARM_UP_STEPS):
+        if name not in WARM_UP_STEPS:
+            report[name] = {'error': f"Unknown component; expected one of {', '.join(WARM_UP_STEPS)}"}
+            continue
+        start = time.perf_counter()
+        try:
+            await run_blocking(WARM_UP_STEPS[name])
+            report[name] = {'seconds': round(time.perf_counter() - start, 4)}
+        except Exception as e:
+            report[name] = {'seconds': round(time.perf_counter() - start, 4), 'error': str(e)}
+    return report
+
+@mcp.tool
+def server_stats() -> Dict[str, Any]:
+    """Report latency histograms and backend state for the whole server
     Returns:
-        List of dicts with 'to', 'subject', and 'result' (send_mail result)
+        Dict with latency histograms (retrieval, LLM, Gmail auth/send), 'cache_namespaces' (hits and
+        misses per key namespace), 'backends' (which lazily created backends are loaded) and 'daemon'
+        (auto-responder queue depth, oldest item age, SLA misses)
     """
-    return batch_auto_respond(email_batch)
+    backends = {
+        lazy.name: {'loaded': lazy.loaded, 'init_seconds': round(lazy.seconds, 4) if lazy.loaded else None}
+        for lazy in LAZY_BACKENDS
+    }
+    backends['vector_index'] = {
+        'loaded': _vector_backend is not None, 'init_seconds': _vector_backend_status.get('load_seconds')
+    }
+    return {
+        **metrics.stats(),
+        'cache_namespaces': cache.namespace_stats(),
+        'backends': backends,
+        'daemon': responder_daemon.stats()
+    }
 
 if __name__ == "__main__":
-    mcp.run()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    # Open the snapshot in the background so the server accepts connections immediately
+    threading.Thread(target=get_vector_backend, daemon=True).start()
+    send_scheduler.start_retry_worker(send_config['retry_interval'])
+    if "--daemon" in sys.argv:
+        run_daemon()
+    else:
+        if daemon_config['enabled']:
+            responder_daemon.start()
+        if kb_reload_config['enabled']:
+            kb_reloader.start()
+        try:
+            mcp.run()
+        finally:
+            responder_daemon.stop()
+            kb_reloader.stop()
+            batch_pipeline.close()
+            send_scheduler.stop()
 
 
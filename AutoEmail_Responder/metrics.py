@@ -0,0 +1,133 @@
+import bisect
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+# Upper bounds (ms) of the latency histogram buckets; one more bucket takes everything slower
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram: constant memory however many observations it takes"""
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(self.bounds, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the pct-th observation (capped at the max seen)"""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(pct / 100 * self.count)))
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 3)
+        return round(self.max, 3)
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = {f"le_{bound:g}ms": count for bound, count in zip(self.bounds, self.counts) if count}
+        if self.counts[-1]:
+            buckets['inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 3),
+            'buckets': buckets
+        }
+
+
+class Span:
+    """Times one operation on the monotonic clock; use through Metrics.span()"""
+
+    __slots__ = ('metrics', 'name', 'attrs', 'start')
+
+    def __init__(self, metrics, name, attrs):
+        self.metrics = metrics
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, (time.perf_counter() - self.start) * 1000, exc, self.attrs)
+        return False
+
+
+class Metrics:
+    """Process-wide latency spans, counters and an optional JSONL trace.
+
+    `with metrics.span('llm'):` records the block's duration in the 'llm'
+    histogram (and counts an error if it raises). With `trace_path` every span
+    is also appended to that file as one JSON line, for offline analysis.
+    """
+
+    def __init__(self, trace_path: Optional[str] = None, buckets: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.trace_path = trace_path
+        self.buckets = buckets
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Histogram] = {}
+        self._errors: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._trace = open(trace_path, 'a', encoding='utf-8', buffering=1) if trace_path else None
+
+    def span(self, name: str, **attrs) -> Span:
+        return Span(self, name, attrs)
+
+    def observe(self, name: str, ms: float, error: Optional[BaseException] = None,
+                attrs: Optional[Dict[str, Any]] = None):
+        """Record one duration in milliseconds"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.buckets)
+            histogram.observe(ms)
+            if error is not None:
+                self._errors[name] = self._errors.get(name, 0) + 1
+            if self._trace is not None:
+                record = {'ts': round(time.time(), 6), 'span': name, 'ms': round(ms, 3), **(attrs or {})}
+                if error is not None:
+                    record['error'] = f"{type(error).__name__}: {error}"
+                self._trace.write(json.dumps(record, default=str) + '\n')
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = {
+                name: dict(histogram.snapshot(), errors=self._errors.get(name, 0))
+                for name, histogram in self._histograms.items()
+            }
+            counters = dict(self._counters)
+        return {
+            'uptime_seconds': round(time.monotonic() - self.started, 1),
+            'spans': spans,
+            'counters': counters,
+            'trace_file': self.trace_path
+        }
+
+    def close(self):
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
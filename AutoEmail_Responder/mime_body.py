@@ -0,0 +1,138 @@
+import base64
+import codecs
+import html
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# Base64 characters decoded per step (multiple of 4 -> 3072 bytes)
+DECODE_BLOCK_CHARS = 4096
+
+# HTML carries markup, so more raw text is decoded per character of output
+HTML_EXPANSION = 8
+
+_DROP_BLOCKS_RE = re.compile(r"<(script|style|head)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+_BREAK_RE = re.compile(r"<\s*(br|/p|/div|/li|/tr|/h[1-6])\b[^>]*>", re.IGNORECASE)
+_TAG_RE = re.compile(r"<[^>]*>")
+_PARTIAL_TAG_RE = re.compile(r"<[^>]*$")
+_SPACES_RE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+_CHARSET_RE = re.compile(r"charset=\"?([\w-]+)", re.IGNORECASE)
+
+
+def html_to_text(markup: str) -> str:
+    """Fast tag-stripping HTML to text: drops scripts/styles, keeps line breaks"""
+    markup = _DROP_BLOCKS_RE.sub(' ', markup)
+    markup = _BREAK_RE.sub('\n', markup)
+    markup = _PARTIAL_TAG_RE.sub('', _TAG_RE.sub(' ', markup))
+    text = _SPACES_RE.sub(' ', html.unescape(markup))
+    return _BLANK_LINES_RE.sub('\n\n', '\n'.join(line.strip() for line in text.split('\n'))).strip()
+
+
+def _header(part, name):
+    return next((h['value'] for h in part.get('headers', []) if h['name'].lower() == name), '')
+
+
+def _is_attachment(part) -> bool:
+    body = part.get('body', {})
+    return bool(part.get('filename')) or 'attachmentId' in body or \
+        _header(part, 'content-disposition').lower().startswith('attachment')
+
+
+def _charset(part) -> str:
+    match = _CHARSET_RE.search(_header(part, 'content-type'))
+    charset = match.group(1) if match else 'utf-8'
+    try:
+        codecs.lookup(charset)
+    except LookupError:
+        charset = 'utf-8'
+    return charset
+
+
+def decoded_size(part) -> int:
+    """Size in bytes of a part's decoded body, without decoding it"""
+    body = part.get('body', {})
+    if 'size' in body:
+        return int(body['size'])
+    data = body.get('data', '')
+    return len(data) * 3 // 4
+
+
+def decode_prefix(data: str, charset: str = 'utf-8', max_chars: Optional[int] = None,
+                  max_bytes: Optional[int] = None) -> Tuple[str, bool]:
+    """Incrementally decode base64url text until `max_chars` or `max_bytes` is reached.
+
+    Returns (text, truncated). Only the blocks needed are base64-decoded, and a
+    multi-byte character split at a block edge is carried into the next block.
+    """
+    decoder = codecs.getincrementaldecoder(charset)(errors='replace')
+    pieces, chars, consumed = [], 0, 0
+    for start in range(0, len(data), DECODE_BLOCK_CHARS):
+        block = data[start:start + DECODE_BLOCK_CHARS]
+        raw = base64.urlsafe_b64decode(block + '=' * (-len(block) % 4))
+        clipped = max_bytes is not None and consumed + len(raw) > max_bytes
+        if clipped:
+            raw = raw[:max_bytes - consumed]
+        consumed += len(raw)
+        last = start + DECODE_BLOCK_CHARS >= len(data)
+        text = decoder.decode(raw, final=last and not clipped)
+        pieces.append(text)
+        chars += len(text)
+        if last or clipped:
+            return ''.join(pieces), clipped
+        if max_chars is not None and chars >= max_chars:
+            return ''.join(pieces), True
+    return ''.join(pieces), False
+
+
+def extract_body(payload: Optional[Dict[str, Any]], max_chars: Optional[int] = None,
+                 max_bytes: Optional[int] = None) -> Dict[str, Any]:
+    """Find and decode the readable body of a Gmail message payload.
+
+    Walks the MIME tree iteratively (depth-first, in document order), so
+    nested multipart/alternative inside multipart/mixed is found. The first
+    text/plain part wins; otherwise the first text/html part is converted to
+    text. Attachments are counted but never decoded.
+
+    Returns a dict with 'text' (at most `max_chars` characters), 'mime_type'
+    of the chosen part, 'original_size' (its decoded size in bytes),
+    'truncated' and 'attachments'.
+    """
+    plain = html_part = None
+    attachments = 0
+    stack = [payload] if payload else []
+    while stack:
+        part = stack.pop()
+        if part.get('parts'):
+            stack.extend(reversed(part['parts']))
+            continue
+        if _is_attachment(part):
+            attachments += 1
+            continue
+        mime_type = part.get('mimeType', '').lower()
+        if not part.get('body', {}).get('data'):
+            continue
+        if mime_type in ('text/plain', '') and plain is None:
+            plain = part
+        elif mime_type == 'text/html' and html_part is None:
+            html_part = part
+
+    result = {'text': '', 'mime_type': None, 'original_size': 0, 'truncated': False, 'attachments': attachments}
+    chosen = plain or html_part
+    if chosen is None:
+        return result
+    data = chosen['body']['data']
+    if chosen is plain:
+        text, truncated = decode_prefix(data, _charset(chosen), max_chars, max_bytes)
+    else:
+        raw_chars = max_chars * HTML_EXPANSION if max_chars is not None else None
+        text, truncated = decode_prefix(data, _charset(chosen), raw_chars, max_bytes)
+        text = html_to_text(text)
+    if max_chars is not None and len(text) > max_chars:
+        text, truncated = text[:max_chars], True
+    result.update(
+        text=text,
+        mime_type=chosen.get('mimeType'),
+        original_size=decoded_size(chosen),
+        truncated=truncated
+    )
+    return result
@@ -0,0 +1,144 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+
+class Stage:
+    """A named pipeline step backed by its own bounded worker pool."""
+
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, int(workers))
+
+
+class Pipeline:
+    """Run items through a sequence of stages with per-stage concurrency.
+
+    An item moves on to the next stage as soon as it leaves the previous one,
+    so retrieval for later emails overlaps with generation and sending of
+    earlier ones. Results keep input order, and an exception in any stage only
+    marks that item as failed and skips its remaining stages. Each record has
+    its per-stage `timings` and `seconds`, the wall-clock time from submission
+    to its last stage, which also counts the waits for a free worker.
+
+    Stage pools are created on first use and kept for the life of the
+    pipeline, so worker threads (and the per-thread Gmail services and HTTP
+    connections they hold) are reused across batches. A run that asks for a
+    different worker count gets its own long-lived pool of that size. Stages
+    run in a copy of the caller's contextvars, so per-context state such as
+    the cache's deferred writes covers them.
+    """
+
+    def __init__(self, stages: Sequence[Stage]):
+        if not stages:
+            raise ValueError("Pipeline needs at least one stage")
+        self.stages = list(stages)
+        self._pools: Dict[Tuple[str, int], ThreadPoolExecutor] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def run(self, items: Sequence[Any], workers: Optional[Dict[str, int]] = None
+            ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Run every item through the stages; `workers` overrides stage pool sizes by stage name"""
+        records = [
+            {"value": None, "error": None, "failed_stage": None, "timings": {}, "seconds": 0.0}
+            for _ in items
+        ]
+        sizes = [max(1, int((workers or {}).get(stage.name) or stage.workers)) for stage in self.stages]
+        if not records:
+            return records, self._summarize(records, 0.0, sizes)
+
+        pools = [self._pool(stage.name, size) for stage, size in zip(self.stages, sizes)]
+        remaining = [len(records)]
+        submitted = [0.0] * len(records)
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def finish(index):
+            records[index]["seconds"] = time.perf_counter() - submitted[index]
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    done.set()
+
+        def fail(record, stage_name, error):
+            record["error"] = str(error) or type(error).__name__
+            record["failed_stage"] = stage_name
+
+        def run_stage(index, stage_idx, value):
+            stage = self.stages[stage_idx]
+            record = records[index]
+            start = time.perf_counter()
+            handed_off = False
+            # Whatever a stage raises (even a BaseException), the item is accounted
+            # for exactly once, so run() never waits on it forever
+            try:
+                value = stage.fn(value)
+                record["timings"][stage.name] = time.perf_counter() - start
+                if stage_idx + 1 < len(pools):
+                    pools[stage_idx + 1].submit(contextvars.copy_context().run, run_stage, index, stage_idx + 1, value)
+                    handed_off = True
+                else:
+                    record["value"] = value
+            except BaseException as e:
+                record["timings"].setdefault(stage.name, time.perf_counter() - start)
+                fail(record, stage.name, e)
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                if not handed_off:
+                    finish(index)
+
+        start = time.perf_counter()
+        for index, item in enumerate(items):
+            submitted[index] = time.perf_counter()
+            try:
+                pools[0].submit(contextvars.copy_context().run, run_stage, index, 0, item)
+            except Exception as e:
+                fail(records[index], self.stages[0].name, e)
+                finish(index)
+        done.wait()
+        return records, self._summarize(records, time.perf_counter() - start, sizes)
+
+    def close(self, wait: bool = True):
+        """Shut down the stage pools; later runs raise RuntimeError"""
+        with self._lock:
+            self._closed = True
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.shutdown(wait=wait)
+
+    def _pool(self, name, size):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Pipeline is closed")
+            pool = self._pools.get((name, size))
+            if pool is None:
+                pool = self._pools[(name, size)] = ThreadPoolExecutor(
+                    max_workers=size, thread_name_prefix=f"pipeline-{name}"
+                )
+            return pool
+
+    def _summarize(self, records, elapsed, sizes):
+        stages = {}
+        for stage, size in zip(self.stages, sizes):
+            durations = [r["timings"][stage.name] for r in records if stage.name in r["timings"]]
+            stages[stage.name] = {
+                "workers": size,
+                "count": len(durations),
+                "total_seconds": round(sum(durations), 4),
+                "avg_seconds": round(sum(durations) / len(durations), 4) if durations else 0.0,
+                "max_seconds": round(max(durations), 4) if durations else 0.0
+            }
+        failed = sum(1 for r in records if r["error"] is not None)
+        return {
+            "items": len(records),
+            "succeeded": len(records) - failed,
+            "failed": failed,
+            "elapsed_seconds": round(elapsed, 4),
+            "throughput_per_second": round(len(records) / elapsed, 2) if elapsed > 0 else 0.0,
+            "stages": stages
+        }
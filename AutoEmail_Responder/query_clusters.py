@@ -0,0 +1,59 @@
+import re
+from email.utils import parseaddr
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+GREETING_RE = re.compile(r"^\s*(dear|hi|hello|hey|greetings)\b[^\n,]*,?[ \t]*\n+", re.IGNORECASE)
+
+
+def cluster_queries(embeddings, threshold: float = 0.9) -> List[List[int]]:
+    """Greedy leader clustering of L2-normalized query embeddings.
+
+    Each query joins the first cluster whose representative (its first
+    member) has cosine similarity >= threshold, otherwise it starts a new
+    cluster. Clusters and members keep input order.
+    """
+    embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+    clusters: List[List[int]] = []
+    leaders = np.zeros((len(embeddings), embeddings.shape[1]), dtype=np.float32)
+    for position, embedding in enumerate(embeddings):
+        if clusters:
+            similarities = leaders[:len(clusters)] @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                clusters[best].append(position)
+                continue
+        leaders[len(clusters)] = embedding
+        clusters.append([position])
+    return clusters
+
+
+def assign_representatives(queries: Sequence[Optional[str]], embed_fn: Callable[[List[str]], np.ndarray],
+                           threshold: float = 0.9) -> List[int]:
+    """Map each query to the position of its cluster representative.
+
+    All non-empty queries are embedded in a single call; empty queries are
+    their own representative.
+    """
+    representatives = list(range(len(queries)))
+    positions = [position for position, query in enumerate(queries) if query]
+    if len(positions) < 2:
+        return representatives
+    for members in cluster_queries(embed_fn([queries[p] for p in positions]), threshold):
+        for member in members:
+            representatives[positions[member]] = positions[members[0]]
+    return representatives
+
+
+def recipient_name(email: dict) -> str:
+    """Recipient's first name from an explicit 'name' or the display name in 'to'"""
+    name = email.get('name') or parseaddr(email.get('to') or '')[0]
+    return name.split()[0] if name.strip() else ''
+
+
+def personalize_greeting(body: str, name: str) -> str:
+    """Address a shared answer to one recipient, replacing any greeting line"""
+    if not name:
+        return body
+    return f"Hi {name},\n\n" + GREETING_RE.sub('', body, count=1)
@@ -1,73 +1,125 @@
-import json
+import time
 import chromadb
+import redis
 from chromadb.config import Settings
-
-# Load knowledge base
-with open('knowledge_base.json', 'r', encoding='utf-8') as f:
-    data = json.load(f)
-
-# Flatten policies
-policy_chunks = []
-for section in data['company_policies']:
-    section_name = section['section']
-    for item in section['items']:
-        text = f"Section: {section_name}\nTitle: {item['title']}\nDescription: {item['description']}"
-        policy_chunks.append({
-            "type": "policy",
-            "section": section_name,
-            "title": item["title"],
-            "content": text
-        })
-
-# Flatten FAQs
-faq_chunks = []
-for faq in data['faqs']:
-    text = f"Q: {faq['question']}\nA: {faq['answer']}"
-    faq_chunks.append({
-        "type": "faq",
-        "question": faq["question"],
-        "content": text
-    })
-
-# Flatten Templates
-template_chunks = []
-for template in data['response_templates']:
-    text = f"Template Name: {template['template_name']}\nTemplate: {template['template']}"
-    template_chunks.append({
-        "type": "template",
-        "template_name": template["template_name"],
-        "content": text
-    })
+from cache_keys import KB_VERSION_KEY, kb_digest
+from config import get_embedding_batch_size, get_redis_config, get_vector_backend_config
+from embeddings import embed_query, get_embedding_function
+from fast_path import load_fast_path
+from knowledge_base import content_hash, load_chunks, load_knowledge
+from snapshot import IndexSnapshot, load_vector_backend
 
 # Combine all chunks
 def get_all_chunks():
-    return policy_chunks + faq_chunks + template_chunks
+    return load_chunks()
 
 # Store in ChromaDB
 chroma_client = chromadb.Client(Settings(persist_directory="./chroma_db"))
-collection = chroma_client.get_or_create_collection("company_knowledge")
+collection = chroma_client.get_or_create_collection(
+    "company_knowledge",
+    embedding_function=get_embedding_function()
+)
+
+def index_knowledge(backend=None):
+    """Incrementally sync the knowledge base into the on-disk snapshot and vector backend.
 
-def index_knowledge():
+    Only new or changed chunks are embedded (in batches sized to the embedding
+    backend) and chunks removed from knowledge_base.json are deleted. The
+    snapshot is what servers warm-start from; the in-memory Chroma collection
+    is filled from the snapshot's vectors without embedding again.
+    """
+    config = get_vector_backend_config()
+    backend = backend or config["backend"]
+    start = time.perf_counter()
     all_chunks = get_all_chunks()
-    # Remove existing docs (optional, for fresh indexing)
-    try:
-        collection.delete(where={})
-    except Exception:
-        pass
-    for idx, chunk in enumerate(all_chunks):
-        collection.add(
-            documents=[chunk["content"]],
-            ids=[f"doc_{idx}"],
-            metadatas=[chunk]
+    snapshot = IndexSnapshot(config["index_path"])
+    counts = snapshot.ensure(all_chunks, batch_size=get_embedding_batch_size())
+    if backend == "chroma":
+        ids, matrix, _, _ = snapshot.index.rows()
+        index_chroma(all_chunks, dict(zip(ids, matrix)))
+
+    # A server's hot reload or startup can re-sync the snapshot without publishing a version,
+    # so compare with the published stamp rather than with what this run changed
+    if published_kb_version() != kb_digest(all_chunks):
+        bump_kb_version(all_chunks)
+
+    # FAQ questions, policy titles and template names for the LLM-free fast path
+    fast_path, fast_counts = load_fast_path(load_knowledge(), config["index_path"],
+                                            batch_size=get_embedding_batch_size())
+
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(all_chunks)} chunks into {backend} in {elapsed:.2f}s: "
+          f"{counts['added']} added, {counts['updated']} updated, {counts['unchanged']} unchanged, "
+          f"{counts['deleted']} deleted.")
+    print(f"Fast path: {len(fast_path.entries)} FAQ/policy/template entries, "
+          f"{fast_counts['added'] + fast_counts['updated']} embedded.")
+    return dict(counts, elapsed_seconds=round(elapsed, 3))
+
+def index_chroma(all_chunks, embeddings_by_id):
+    """Upsert new/changed chunks into ChromaDB (with precomputed embeddings) and delete removed ones"""
+    existing = collection.get(include=["metadatas"])
+    existing_hashes = {
+        doc_id: (meta or {}).get("content_hash")
+        for doc_id, meta in zip(existing["ids"], existing["metadatas"])
+    }
+
+    added, updated, unchanged = [], [], 0
+    for chunk in all_chunks:
+        digest = content_hash(chunk["content"])
+        if chunk["id"] not in existing_hashes:
+            added.append((chunk, digest))
+        elif existing_hashes[chunk["id"]] != digest:
+            updated.append((chunk, digest))
+        else:
+            unchanged += 1
+    current_ids = {chunk["id"] for chunk in all_chunks}
+    deleted = [doc_id for doc_id in existing_hashes if doc_id not in current_ids]
+
+    batch_size = get_embedding_batch_size()
+    max_batch_size = getattr(chroma_client, "get_max_batch_size", None)
+    if max_batch_size:
+        batch_size = min(batch_size, max_batch_size())
+    changed = added + updated
+    for start_idx in range(0, len(changed), batch_size):
+        batch = changed[start_idx:start_idx + batch_size]
+        collection.upsert(
+            ids=[chunk["id"] for chunk, _ in batch],
+            embeddings=[[float(x) for x in embeddings_by_id[chunk["id"]]] for chunk, _ in batch],
+            documents=[chunk["content"] for chunk, _ in batch],
+            metadatas=[dict(chunk, content_hash=digest) for chunk, digest in batch]
         )
-    print(f"Stored {len(all_chunks)} documents in ChromaDB.")
+    for start_idx in range(0, len(deleted), batch_size):
+        collection.delete(ids=deleted[start_idx:start_idx + batch_size])
+
+    return {
+        "added": len(added),
+        "updated": len(updated),
+        "unchanged": unchanged,
+        "deleted": len(deleted)
+    }
+
+def published_kb_version():
+    """The knowledge base version stamp servers currently use, or None if Redis is unavailable"""
+    try:
+        return redis.Redis(**get_redis_config(), decode_responses=True).get(KB_VERSION_KEY)
+    except redis.RedisError:
+        return None
+
+def bump_kb_version(chunks):
+    """Publish a new knowledge base version stamp so servers drop stale cached answers"""
+    version = kb_digest(chunks)
+    try:
+        redis.Redis(**get_redis_config(), decode_responses=True).set(KB_VERSION_KEY, version)
+        print(f"Knowledge base version is now {version}.")
+    except redis.RedisError as e:
+        print(f"Could not update knowledge base version in Redis: {e}")
+    return version
 
 def search_knowledge(query, n_results=3):
-    results = collection.query(
-        query_texts=[query],
-        n_results=n_results
-    )
-    for doc, meta in zip(results['documents'][0], results['metadatas'][0]):
+    config = get_vector_backend_config()
+    backend, _ = load_vector_backend(get_all_chunks(), collection=collection,
+                                     batch_size=get_embedding_batch_size(), **config)
+    for doc, meta in backend.query(embed_query(query), n_results)[0]:
         print("----")
         print(doc)
         print("Metadata:", meta)
@@ -0,0 +1,361 @@
+import heapq
+import json
+import logging
+import re
+import threading
+import time
+from email.utils import parseaddr
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from inbox_sync import EMAIL_ADDRESS_KEY
+from mail_store import MailStore
+
+# How much of a message is searched for priority keywords
+KEYWORD_SCAN_CHARS = 2000
+
+logger = logging.getLogger(__name__)
+
+# Sender local parts that never read replies
+NO_REPLY_RE = re.compile(r"^(no-?reply|do-?not-?reply|mailer-daemon|postmaster)([+._-]|$)", re.IGNORECASE)
+
+
+def sender_domain(sender: str) -> str:
+    return parseaddr(sender or '')[1].rpartition('@')[2].lower()
+
+
+def reply_subject(subject: Optional[str]) -> str:
+    subject = subject or ''
+    return subject if subject.lower().startswith('re:') else f"Re: {subject}".strip()
+
+
+def automated_reason(row: Dict[str, Any], own_addresses: Iterable[str] = ()) -> Optional[str]:
+    """Why a stored message must not get an auto-reply, or None if it may.
+
+    Skips auto-replies and other machine-generated mail (Auto-Submitted,
+    X-Autoreply/X-Autorespond), bulk and mailing-list mail (Precedence,
+    List-Id/List-Unsubscribe), no-reply senders and the mailbox's own
+    addresses, so two auto-responders never answer each other in a loop.
+    """
+    headers = {name.lower(): value for name, value in json.loads(row.get('headers') or '{}').items()}
+    if headers.get('auto-submitted', 'no').strip().lower() != 'no':
+        return 'auto-submitted'
+    if 'x-autoreply' in headers or 'x-autorespond' in headers:
+        return 'auto-reply'
+    if headers.get('precedence', '').strip().lower() in ('bulk', 'list', 'junk', 'auto_reply'):
+        return 'bulk'
+    if 'list-id' in headers or 'list-unsubscribe' in headers:
+        return 'mailing list'
+    address = parseaddr(row.get('sender') or '')[1].lower()
+    if not address:
+        return 'no sender'
+    if NO_REPLY_RE.match(address.partition('@')[0]):
+        return 'no-reply sender'
+    if address in {own.lower() for own in own_addresses if own}:
+        return 'own address'
+    return None
+
+
+def reply_thread(row: Dict[str, Any]) -> Dict[str, str]:
+    """'thread_id', 'in_reply_to' and 'references' that file a reply in the stored message's thread"""
+    headers = {name.lower(): value for name, value in json.loads(row.get('headers') or '{}').items()}
+    thread = {'thread_id': row.get('thread_id')}
+    message_id = headers.get('message-id')
+    if message_id:
+        thread['in_reply_to'] = message_id
+        thread['references'] = f"{headers.get('references', '')} {message_id}".strip()
+    return {key: value for key, value in thread.items() if value}
+
+
+def received_at(row: Dict[str, Any]) -> float:
+    """When a stored message arrived (epoch seconds), falling back to when it was synced"""
+    if row.get('internal_date'):
+        return row['internal_date'] / 1000
+    return row.get('synced_at') or time.time()
+
+
+class PriorityScorer:
+    """Scores messages by sender domain, keywords and age.
+
+    A message's priority at time t is
+
+        domain weight + sum of matched keyword weights + age_weight * (t - received) / sla
+
+    so waiting one SLA period is worth `age_weight` points. Age grows at the
+    same rate for every message, so the order between two messages never
+    changes and key() can be computed once when a message is queued.
+    Domains match subdomains too ("example.com" covers "hr.example.com").
+    """
+
+    def __init__(self, domains: Optional[Dict[str, float]] = None, keywords: Optional[Dict[str, float]] = None,
+                 age_weight: float = 2.0, sla_seconds: float = 300.0):
+        self.domains = {domain.lower(): weight for domain, weight in (domains or {}).items()}
+        self.keywords = {keyword.lower(): weight for keyword, weight in (keywords or {}).items()}
+        self.age_weight = age_weight
+        self.sla_seconds = sla_seconds
+
+    def base(self, row: Dict[str, Any]) -> float:
+        """Priority without the age term"""
+        domain = sender_domain(row.get('sender'))
+        score = max((weight for name, weight in self.domains.items()
+                     if domain == name or domain.endswith('.' + name)), default=0.0)
+        text = f"{row.get('subject') or ''}\n{(row.get('body') or '')[:KEYWORD_SCAN_CHARS]}".lower()
+        return score + sum(weight for keyword, weight in self.keywords.items() if keyword in text)
+
+    def priority(self, row: Dict[str, Any], now: Optional[float] = None) -> float:
+        age = (now or time.time()) - received_at(row)
+        return self.base(row) + self.age_weight * age / self.sla_seconds
+
+    def key(self, row: Dict[str, Any]) -> float:
+        """Static queue key: higher means served first"""
+        return self.base(row) - self.age_weight * received_at(row) / self.sla_seconds
+
+
+class ResponseQueue:
+    """Bounded, thread-safe max-priority queue of messages, deduplicated by message id"""
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._heap = []
+        self._ids = set()
+        self._sequence = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, key: float, message_id: str, item: Any) -> bool:
+        """Queue an item; False if it is already queued, the queue is full or closed"""
+        with self._cond:
+            if self._closed or message_id in self._ids or len(self._heap) >= self.max_size:
+                return False
+            # The sequence number keeps equal keys FIFO and never compares items
+            heapq.heappush(self._heap, (-key, self._sequence, message_id, item))
+            self._sequence += 1
+            self._ids.add(message_id)
+            self._cond.notify()
+            return True
+
+    def take(self, max_items: int, timeout: Optional[float] = None) -> List[Any]:
+        """Up to `max_items` highest-priority items, waiting up to `timeout` for the first one"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._heap or self._closed, timeout):
+                return []
+            items = []
+            while self._heap and len(items) < max_items:
+                _, _, message_id, item = heapq.heappop(self._heap)
+                self._ids.discard(message_id)
+                items.append(item)
+            return items
+
+    def __contains__(self, message_id: str) -> bool:
+        with self._cond:
+            return message_id in self._ids
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def free(self) -> int:
+        with self._cond:
+            return self.max_size - len(self._heap)
+
+    def oldest(self) -> Optional[float]:
+        """Earliest received_at among queued items"""
+        with self._cond:
+            return min((item['received_at'] for _, _, _, item in self._heap), default=None)
+
+    def close(self):
+        """Refuse new items and wake waiting workers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class ResponderDaemon:
+    """Watches the inbox and auto-responds to new messages by priority within an SLA.
+
+    A watcher thread syncs the mail store every `poll_interval` seconds and
+    queues unanswered messages received since the daemon started (minus
+    `lookback_seconds`), scored by `scorer`. `workers` threads take the
+    highest-priority `batch_size` messages at a time and answer them with
+    `respond_fn` (batch_auto_respond), which claims each message so none is
+    answered twice.
+
+    Messages that must not get an auto-reply (see automated_reason; the
+    mailbox's own address comes from the store's sync state, aliases from
+    `own_addresses`) are marked skipped in the store and never queued. Replies
+    are sent in the thread of the message they answer. A message whose send
+    keeps failing is retried after a backoff and dead-lettered by the store
+    after its `max_failures`th failure.
+
+    Backpressure: the queue holds at most `max_queue` messages. Each poll
+    scores the oldest unanswered messages and queues the best that fit; the
+    rest stay in the mail store ('deferred') and are queued by a later poll
+    as room frees up.
+
+    stop() is graceful: polling stops, workers finish their current batch, and
+    anything still queued was never claimed, so the next start picks it up.
+    Response time (receipt to send) goes into the 'daemon.response_time'
+    histogram of `metrics`, and replies later than the SLA count as misses.
+    `store` may be a zero-argument factory (e.g. a `lazy.Lazy`), called on
+    the first poll.
+    """
+
+    def __init__(self, store: MailStore, sync_fn: Callable[[], Any], respond_fn: Callable[[List[Dict]], Dict],
+                 scorer: PriorityScorer, sla_seconds: float = 300.0, poll_interval: float = 15.0,
+                 workers: int = 2, batch_size: int = 10, max_queue: int = 1000, lookback_seconds: float = 0.0,
+                 metrics=None, own_addresses: Iterable[str] = ()):
+        self._store = store
+        self.sync_fn = sync_fn
+        self.respond_fn = respond_fn
+        self.scorer = scorer
+        self.sla_seconds = sla_seconds
+        self.poll_interval = poll_interval
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.lookback_seconds = lookback_seconds
+        self.metrics = metrics
+        self.own_addresses = list(own_addresses)
+        self.queue = ResponseQueue(max_queue)
+        self.started_at = None
+        self._in_flight = set()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'polls': 0, 'poll_errors': 0, 'queued': 0, 'deferred': 0, 'filtered': 0, 'responded': 0,
+            'queued_for_retry': 0, 'failed': 0, 'skipped': 0, 'sla_misses': 0
+        }
+
+    @property
+    def store(self) -> MailStore:
+        if callable(self._store):
+            self._store = self._store()
+        return self._store
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads) and not self._stop.is_set()
+
+    def start(self):
+        if self._threads:
+            return
+        self.started_at = time.time()
+        self._threads.append(threading.Thread(target=self._watch, name='daemon-watch', daemon=True))
+        for index in range(self.workers):
+            self._threads.append(threading.Thread(target=self._work, name=f'daemon-worker-{index}', daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = 30.0):
+        """Stop polling, let workers finish their current batch, and wait up to `timeout` seconds"""
+        self._stop.set()
+        self.queue.close()
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def poll(self) -> int:
+        """Sync the store and queue new unanswered messages; returns how many were queued"""
+        self.sync_fn()
+        cutoff = int((self.started_at - self.lookback_seconds) * 1000)
+        with self._lock:
+            in_flight = set(self._in_flight)
+        # Candidates are the oldest unanswered messages (closest to missing the SLA),
+        # twice as many as the queue holds, and the best-scored ones are queued
+        rows = self.store.query(
+            limit=2 * self.queue.max_size + len(in_flight), respondable_only=True,
+            received_after=cutoff, oldest_first=True
+        )
+        own_addresses = self.own_addresses + [self.store.get_state(EMAIL_ADDRESS_KEY) or '']
+        candidates, filtered = [], 0
+        for row in rows:
+            if row['id'] in in_flight or row['id'] in self.queue:
+                continue
+            reason = automated_reason(row, own_addresses)
+            if reason is None:
+                candidates.append(row)
+            else:
+                # Marked once so later polls do not look at it again
+                self.store.skip_response(row['id'], reason)
+                filtered += 1
+        queued = deferred = 0
+        for key, row in sorted(((self.scorer.key(row), row) for row in candidates), key=lambda pair: -pair[0]):
+            # Queued items only keep what the reply needs, not the whole stored body
+            item = dict(row, body=(row['body'] or '')[:KEYWORD_SCAN_CHARS], received_at=received_at(row))
+            if self.queue.put(key, row['id'], item):
+                queued += 1
+            else:
+                deferred += 1
+        self._count(polls=1, queued=queued, deferred=deferred, filtered=filtered)
+        return queued
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                self._count(poll_errors=1)
+                logger.warning("Auto-responder poll failed: %s", e)
+            self._stop.wait(self.poll_interval)
+
+    def _work(self):
+        while not self._stop.is_set():
+            items = self.queue.take(self.batch_size, timeout=1.0)
+            if not items:
+                continue
+            with self._lock:
+                self._in_flight.update(item['id'] for item in items)
+            try:
+                self._respond(items)
+            except Exception as e:
+                logger.warning("Auto-responder batch failed: %s", e)
+                self._count(failed=len(items))
+            finally:
+                with self._lock:
+                    self._in_flight.difference_update(item['id'] for item in items)
+
+    def _respond(self, items):
+        batch = [
+            {
+                'to': item['sender'],
+                'subject': reply_subject(item['subject']),
+                'user_query': (item['body'] or item['subject'] or '')[:1000],
+                'message_id': item['id'],
+                **reply_thread(item)
+            }
+            for item in items
+        ]
+        results = self.respond_fn(batch)['results']
+        now = time.time()
+        for item, result in zip(items, results):
+            status = result['status']
+            if status == 'sent':
+                elapsed = now - item['received_at']
+                self._count(responded=1, sla_misses=int(elapsed > self.sla_seconds))
+                if self.metrics is not None:
+                    self.metrics.observe('daemon.response_time', elapsed * 1000)
+            elif status == 'queued':
+                self._count(queued_for_retry=1)
+            else:
+                self._count(**{status if status == 'skipped' else 'failed': 1})
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = len(self._in_flight)
+        oldest = self.queue.oldest()
+        answered = stats['responded']
+        stats.update(
+            running=self.running,
+            queue_depth=len(self.queue),
+            queue_capacity=self.queue.max_size,
+            in_flight=in_flight,
+            oldest_item_age_seconds=round(time.time() - oldest, 1) if oldest is not None else 0.0,
+            sla_seconds=self.sla_seconds,
+            sla_miss_rate=round(stats['sla_misses'] / answered, 4) if answered else 0.0
+        )
+        return stats
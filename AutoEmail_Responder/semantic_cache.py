@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """In-process cache of retrieval results keyed by query embedding.
+
+    A lookup returns the stored result of the most similar cached query when
+    its cosine similarity is at least `threshold`, so paraphrases and
+    punctuation/case variants of a question share one Chroma round trip.
+    Embeddings live in one preallocated matrix and are scored with a single
+    matrix-vector product. Entries expire after `ttl` seconds and the least
+    recently used entry is evicted once `max_size` is reached.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_size: int = 1000, ttl: float = 3600):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._n_results = np.full(max_size, -1, dtype=np.int64)
+        self._expires = np.zeros(max_size, dtype=np.float64)
+        self._entries = OrderedDict()  # slot -> (query_key, value), in LRU order
+        self._slots_by_key = {}
+        self._free = list(range(max_size - 1, -1, -1))
+        self._stats = {'hits': 0, 'near_hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, embedding, n_results: int, query_key: Optional[str] = None) -> Optional[Any]:
+        """Return the cached value for the closest query above the threshold, or None"""
+        with self._lock:
+            if self._matrix is None or not self._entries:
+                self._stats['misses'] += 1
+                return None
+            now = time.time()
+            scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            valid = (self._n_results == n_results) & (self._expires > now)
+            scores = np.where(valid, scores, -np.inf)
+            slot = int(np.argmax(scores))
+            if scores[slot] < self.threshold:
+                self._stats['misses'] += 1
+                return None
+            key, value = self._entries[slot]
+            self._entries.move_to_end(slot)
+            self._stats['hits' if key == query_key else 'near_hits'] += 1
+            return value
+
+    def put(self, embedding, n_results: int, value: Any, query_key: Optional[str] = None):
+        """Store a result under its query embedding, evicting expired or LRU entries if full"""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_size, embedding.shape[0]), dtype=np.float32)
+            slot = self._slots_by_key.get((query_key, n_results)) if query_key is not None else None
+            if slot is None:
+                slot = self._allocate_slot()
+            self._matrix[slot] = embedding
+            self._n_results[slot] = n_results
+            self._expires[slot] = time.time() + self.ttl
+            self._entries[slot] = (query_key, value)
+            self._entries.move_to_end(slot)
+            if query_key is not None:
+                self._slots_by_key[(query_key, n_results)] = slot
+
+    def clear(self):
+        with self._lock:
+            for slot in list(self._entries):
+                self._release(slot)
+
+    def discard(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop the entries whose value matches `predicate`; returns how many were dropped"""
+        with self._lock:
+            stale = [slot for slot, (_, value) in self._entries.items() if predicate(value)]
+            for slot in stale:
+                self._release(slot)
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['near_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _allocate_slot(self):
+        if not self._free:
+            now = time.time()
+            expired = [slot for slot in self._entries if self._expires[slot] <= now]
+            for slot in expired:
+                self._release(slot)
+            self._stats['expirations'] += len(expired)
+        if not self._free:
+            slot = next(iter(self._entries))
+            self._release(slot)
+            self._stats['evictions'] += 1
+        return self._free.pop()
+
+    def _release(self, slot):
+        key, _ = self._entries.pop(slot)
+        self._slots_by_key.pop((key, int(self._n_results[slot])), None)
+        self._n_results[slot] = -1
+        self._expires[slot] = 0.0
+        self._free.append(slot)
@@ -0,0 +1,321 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+# Gmail API quota cost of users.messages.send
+GMAIL_SEND_QUOTA_UNITS = 100
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS send_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_addr TEXT,
+    subject TEXT,
+    body TEXT,
+    message_id TEXT,
+    thread TEXT,
+    attempts INTEGER,
+    next_attempt_at REAL,
+    last_error TEXT,
+    status TEXT,
+    created_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_send_queue_due ON send_queue (status, next_attempt_at);
+"""
+
+# Columns added since the first schema, added to older queues on open
+ADDED_COLUMNS = [('thread', 'TEXT'), ('claimed_until', 'REAL')]
+
+
+class TokenBucket:
+    """Thread-safe token bucket measured in Gmail quota units.
+
+    Refills at `rate` units per second up to `capacity`. The bucket is per
+    process; Gmail's per-user quota is shared by every process sending as that
+    user, so set the rate for the whole deployment.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float = 1) -> float:
+        """Block until `units` are available and take them; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= units:
+                    self._tokens -= units
+                    return waited
+                delay = (units - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header, if the error carries one"""
+    resp = getattr(error, 'resp', None)
+    value = resp.get('retry-after') if resp is not None and hasattr(resp, 'get') else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429, 5xx, Gmail's 403 rate-limit errors and network errors are worth retrying"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429 or status >= 500:
+            return True
+        content = error.content or b''
+        return status == 403 and (b'rateLimitExceeded' in content or b'userRateLimitExceeded' in content)
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # Only imported once there is an error to classify; the Gmail client has loaded it by then
+    import httplib2
+    return isinstance(error, httplib2.HttpLib2Error)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class SendRetryQueue:
+    """Durable SQLite queue of sends that failed with a retryable error.
+
+    Several processes (the MCP server and the daemon) can drain one queue:
+    due() claims each row it returns for `claim_timeout` seconds, so no other
+    process retries it meanwhile. A claim outlives a crashed retrier only
+    until it expires.
+    """
+
+    def __init__(self, path: str = 'send_queue.db', claim_timeout: float = 300.0):
+        self.claim_timeout = claim_timeout
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+        existing = {row['name'] for row in self._conn.execute("PRAGMA table_info(send_queue)")}
+        for column, declaration in ADDED_COLUMNS:
+            if column not in existing:
+                self._conn.execute(f"ALTER TABLE send_queue ADD COLUMN {column} {declaration}")
+        self._conn.commit()
+
+    def push(self, to, subject, body, message_id, attempts, next_attempt_at, error, thread=None) -> int:
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO send_queue (to_addr, subject, body, message_id, thread, attempts, next_attempt_at, "
+                "last_error, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending', ?)",
+                (to, subject, body, message_id, json.dumps(thread) if thread else None, attempts, next_attempt_at,
+                 error, time.time())
+            )
+        return cursor.lastrowid
+
+    def due(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Claim and return up to `limit` pending items whose retry time has come"""
+        now = time.time()
+        claimable = "status = 'pending' AND next_attempt_at <= ? AND (claimed_until IS NULL OR claimed_until <= ?)"
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT * FROM send_queue WHERE {claimable} ORDER BY next_attempt_at LIMIT ?", (now, now, limit)
+            ).fetchall()
+            # Another process may have claimed a row since the SELECT; keep only the rows this UPDATE won
+            rows = [row for row in rows if self._conn.execute(
+                f"UPDATE send_queue SET claimed_until = ? WHERE id = ? AND {claimable}",
+                (now + self.claim_timeout, row['id'], now, now)
+            ).rowcount == 1]
+        items = [dict(row) for row in rows]
+        for item in items:
+            item['thread'] = json.loads(item['thread']) if item['thread'] else None
+        return items
+
+    def reschedule(self, item_id: int, attempts: int, next_attempt_at: float, error: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE send_queue SET attempts = ?, next_attempt_at = ?, last_error = ?, claimed_until = NULL "
+                "WHERE id = ?",
+                (attempts, next_attempt_at, error, item_id)
+            )
+
+    def finish(self, item_id: int, status: str = 'sent', error: Optional[str] = None):
+        """Sent items are removed; anything else (e.g. 'dead') is kept for inspection"""
+        with self._lock, self._conn:
+            if status == 'sent':
+                self._conn.execute("DELETE FROM send_queue WHERE id = ?", (item_id,))
+            else:
+                self._conn.execute(
+                    "UPDATE send_queue SET status = ?, last_error = COALESCE(?, last_error), claimed_until = NULL "
+                    "WHERE id = ?",
+                    (status, error, item_id)
+                )
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM send_queue GROUP BY status").fetchall()
+        return {row[0]: row[1] for row in rows}
+
+
+class SendScheduler:
+    """Rate-limited Gmail sends with retries.
+
+    Every send first takes `cost` quota units from the token bucket. Retryable
+    errors (429, 5xx, rate-limit 403s, network errors) are retried in line up
+    to `max_attempts` times with jittered exponential backoff (honouring
+    Retry-After); if they still fail the message goes to the durable retry
+    queue, which `retry_pending` (or the background worker) drains later, up
+    to `queue_max_attempts` attempts in total. Other errors fail at once.
+
+    `send_fn(to, subject, body, thread)` sends one message; `thread` is None
+    or a dict with the 'thread_id', 'in_reply_to' and 'references' that make
+    a reply land in the conversation it answers, and is kept with queued sends.
+
+    `on_sent(message_id, sent_id)` and `on_failed(message_id)` are called
+    with the incoming message id (if any) when a send finally succeeds or is
+    given up on, including sends that completed from the queue.
+
+    `retry_queue` may be given as a zero-argument factory (e.g. a
+    `lazy.Lazy`); it is called the first time the queue is used.
+    """
+
+    def __init__(self, send_fn: Callable[..., Dict[str, Any]], bucket: TokenBucket,
+                 retry_queue: SendRetryQueue, cost: float = GMAIL_SEND_QUOTA_UNITS, max_attempts: int = 3,
+                 base_delay: float = 0.5, max_delay: float = 8.0, queue_max_attempts: int = 8,
+                 on_sent: Optional[Callable] = None, on_failed: Optional[Callable] = None):
+        self.send_fn = send_fn
+        self.bucket = bucket
+        self._retry_queue = retry_queue
+        self.cost = cost
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_max_attempts = queue_max_attempts
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self._stop = threading.Event()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'sent': 0, 'retries': 0, 'queued': 0, 'failed': 0,
+            'queue_sent': 0, 'queue_dead': 0, 'throttled_seconds': 0.0
+        }
+
+    @property
+    def retry_queue(self) -> SendRetryQueue:
+        if callable(self._retry_queue):
+            self._retry_queue = self._retry_queue()
+        return self._retry_queue
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _attempt(self, to, subject, body, thread=None, attempts_so_far=0):
+        """Try a send up to max_attempts times; returns an outcome dict"""
+        outcome = {'attempts': 0, 'queue_wait_seconds': 0.0, 'backoff_seconds': 0.0, 'send_seconds': 0.0}
+        error = None
+        for attempt in range(self.max_attempts):
+            waited = self.bucket.acquire(self.cost)
+            outcome['queue_wait_seconds'] += waited
+            self._count('throttled_seconds', waited)
+            outcome['attempts'] += 1
+            start = time.perf_counter()
+            try:
+                sent = self.send_fn(to, subject, body, thread)
+                outcome['send_seconds'] += time.perf_counter() - start
+                return dict(outcome, status='sent', id=sent['id'])
+            except Exception as e:
+                outcome['send_seconds'] += time.perf_counter() - start
+                error = e
+                if not is_retryable(e):
+                    return dict(outcome, status='failed', error=str(e))
+            if attempt < self.max_attempts - 1:
+                self._count('retries')
+                delay = retry_after(error) or backoff_delay(attempts_so_far + attempt, self.base_delay, self.max_delay)
+                outcome['backoff_seconds'] += delay
+                time.sleep(delay)
+        return dict(outcome, status='retryable', error=str(error))
+
+    def send(self, to, subject, body, message_id=None, thread=None) -> Dict[str, Any]:
+        """Send one message. Returns 'status' ('sent', 'queued' or 'failed'), 'id' or 'error',
+        'attempts', 'queue_wait_seconds' (rate limiter), 'backoff_seconds' and 'send_seconds'"""
+        outcome = self._attempt(to, subject, body, thread)
+        if outcome['status'] == 'retryable':
+            next_attempt = time.time() + backoff_delay(outcome['attempts'], self.base_delay * 4, self.max_delay * 8)
+            outcome['queue_id'] = self.retry_queue.push(
+                to, subject, body, message_id, outcome['attempts'], next_attempt, outcome['error'], thread
+            )
+            outcome['status'] = 'queued'
+        self._count(outcome['status'])
+        self._notify(outcome, message_id)
+        return outcome
+
+    def retry_pending(self, limit: int = 50) -> Dict[str, int]:
+        """Retry queued sends that are due; returns counts of sent/rescheduled/dead"""
+        counts = {'sent': 0, 'rescheduled': 0, 'dead': 0}
+        for item in self.retry_queue.due(limit):
+            outcome = self._attempt(item['to_addr'], item['subject'], item['body'], item['thread'], item['attempts'])
+            attempts = item['attempts'] + outcome['attempts']
+            if outcome['status'] == 'retryable' and attempts < self.queue_max_attempts:
+                next_attempt = time.time() + backoff_delay(attempts, self.base_delay * 4, self.max_delay * 8)
+                self.retry_queue.reschedule(item['id'], attempts, next_attempt, outcome['error'])
+                counts['rescheduled'] += 1
+                continue
+            if outcome['status'] == 'sent':
+                self.retry_queue.finish(item['id'])
+                counts['sent'] += 1
+                self._count('queue_sent')
+            else:
+                self.retry_queue.finish(item['id'], 'dead', outcome.get('error'))
+                outcome['status'] = 'failed'
+                counts['dead'] += 1
+                self._count('queue_dead')
+            self._notify(outcome, item['message_id'])
+        return counts
+
+    def _notify(self, outcome, message_id):
+        if not message_id:
+            return
+        if outcome['status'] == 'sent' and self.on_sent:
+            self.on_sent(message_id, outcome['id'])
+        elif outcome['status'] == 'failed' and self.on_failed:
+            self.on_failed(message_id)
+
+    def start_retry_worker(self, interval: float = 30.0):
+        """Drain the retry queue every `interval` seconds on a daemon thread"""
+        if self._worker is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.retry_pending()
+                except Exception as e:
+                    logger.warning("Error retrying queued sends: %s", e)
+
+        self._worker = threading.Thread(target=run, name='send-retry', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats['throttled_seconds'] = round(stats['throttled_seconds'], 3)
+        stats['retry_queue'] = self.retry_queue.counts()
+        return stats
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent work for the same key into a single execution.
+
+    Within a process, the first caller for a key runs `fn` and every
+    concurrent caller waits for its result. Across processes, the leader also
+    takes a short-lived Redis lock (`lock:<key>`) through the TieredCache; a
+    process that finds the lock held polls the cache for the leader's result
+    instead of generating its own. `fn` must store its result under `key` in
+    the cache before returning, which is what the waiters poll for. If Redis
+    is unavailable, or the leader disappears without storing a result, the
+    waiter runs `fn` itself.
+    """
+
+    def __init__(self, cache=None, lock_ttl: float = 60, poll_interval: float = 0.1, wait_timeout: float = 60):
+        self.cache = cache
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+        self._stats = {
+            'leaders': 0,
+            'coalesced_waiters': 0,
+            'remote_waits': 0,
+            'remote_hits': 0,
+            'remote_fallthroughs': 0
+        }
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+            else:
+                self._stats['coalesced_waiters'] += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._run_locked(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of do() for coroutine callers on one event loop"""
+        future = self._async_calls.get(key)
+        if future is not None:
+            self._count(coalesced_waiters=1)
+            return await asyncio.shield(future)
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        self._count(leaders=1)
+        try:
+            result = await self._arun_locked(key, fn)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            # Waiters see the leader's cancellation instead of hanging on the future
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls) + len(self._async_calls)
+        return stats
+
+    def _run_locked(self, key, fn):
+        if self.cache is None:
+            return fn()
+        lock_key, token = f"lock:{key}", uuid.uuid4().hex
+        acquired = self.cache.try_lock(lock_key, token, self.lock_ttl)
+        if acquired is False:
+            value = self._wait_for_remote(key, lock_key)
+            if value is not None:
+                return value
+        try:
+            return fn()
+        finally:
+            if acquired:
+                self.cache.unlock(lock_key, token)
+
+    async def _arun_locked(self, key, fn):
+        if self.cache is None:
+            return await fn()
+        lock_key, token = f"lock:{key}", uuid.uuid4().hex
+        acquired = await self.cache.atry_lock(lock_key, token, self.lock_ttl)
+        if acquired is False:
+            value = await self._await_remote(key, lock_key)
+            if value is not None:
+                return value
+        try:
+            return await fn()
+        finally:
+            if acquired:
+                await self.cache.aunlock(lock_key, token)
+
+    def _wait_for_remote(self, key, lock_key):
+        self._count(remote_waits=1)
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            done, value = self._poll(*self.cache.get_direct(key), *self.cache.get_direct(lock_key))
+            if done:
+                return value
+        self._count(remote_fallthroughs=1)
+        return None
+
+    async def _await_remote(self, key, lock_key):
+        self._count(remote_waits=1)
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.poll_interval)
+            done, value = self._poll(*(await self.cache.aget_direct(key)), *(await self.cache.aget_direct(lock_key)))
+            if done:
+                return value
+        self._count(remote_fallthroughs=1)
+        return None
+
+    def _poll(self, value_ok, value, lock_ok, holder):
+        """Returns (stop_waiting, value) for one poll of the remote leader"""
+        if value_ok and value is not None:
+            self._count(remote_hits=1)
+            return True, value
+        if not (value_ok and lock_ok) or holder is None:
+            # Redis went away, or the leader released the lock without a result
+            self._count(remote_fallthroughs=1)
+            return True, None
+        return False, None
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
@@ -0,0 +1,118 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from cache_keys import kb_digest
+from embeddings import EMBEDDING_MODEL_NAME, embed_texts
+from vector_index import ChromaBackend, NumpyVectorIndex
+
+
+class IndexSnapshot:
+    """Durable on-disk snapshot of the embedded knowledge base.
+
+    The numpy index files (`<path>.npy` + `<path>.json`) hold every chunk's
+    embedding, and `<path>.manifest.json` records the knowledge base digest,
+    embedding model and dimension they were built from. When the manifest
+    matches the current knowledge_base.json the snapshot is memory-mapped as
+    is; otherwise it is re-synced, re-embedding only changed chunks.
+    """
+
+    def __init__(self, path: str = 'vector_index'):
+        self.index = NumpyVectorIndex(path)
+        self.manifest_path = f"{path}.manifest.json"
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def matches(self, chunks, manifest=None) -> bool:
+        manifest = manifest if manifest is not None else self.read_manifest()
+        return bool(manifest) and (
+            manifest.get('kb_digest') == kb_digest(chunks)
+            and manifest.get('embedding_model') == EMBEDDING_MODEL_NAME
+            and manifest.get('count') == len(chunks)
+        )
+
+    def ensure(self, chunks, embed_fn=embed_texts, batch_size: int = 64):
+        """Load the snapshot, rebuilding it first if it does not match `chunks`.
+
+        Returns counts: all zeros except 'unchanged' when it was loaded as is.
+        """
+        manifest = self.read_manifest()
+        if self.matches(chunks, manifest):
+            self.index.load()
+            if self.index.count() == len(chunks) and self.index.dimension == manifest.get('dimension'):
+                return {'added': 0, 'updated': 0, 'unchanged': len(chunks), 'deleted': 0, 'rebuilt': False}
+        if manifest and manifest.get('embedding_model') != EMBEDDING_MODEL_NAME:
+            # Vectors from another model can't be reused, so drop them all
+            for stale in (self.index.matrix_path, self.index.meta_path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        counts = self.index.sync(chunks, embed_fn, batch_size)
+        manifest = {
+            'kb_digest': kb_digest(chunks),
+            'embedding_model': EMBEDDING_MODEL_NAME,
+            'dimension': self.index.dimension,
+            'count': self.index.count(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+        with open(self.manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+        return dict(counts, rebuilt=True)
+
+    def restore_into(self, collection, batch_size: int = 256):
+        """Copy snapshot embeddings into a Chroma collection, without re-embedding.
+
+        Only rows whose content hash differs from the collection's copy are
+        written and ids the snapshot no longer has are deleted, so restoring
+        again after a knowledge base edit touches just the edited chunks.
+        Returns how many rows were written.
+        """
+        ids, matrix, documents, metadatas = self.index.rows()
+        stored = collection.get(include=['metadatas'])
+        stored_hashes = {
+            doc_id: (meta or {}).get('content_hash') for doc_id, meta in zip(stored['ids'], stored['metadatas'])
+        }
+        changed = [
+            row for row, (doc_id, meta) in enumerate(zip(ids, metadatas))
+            if doc_id not in stored_hashes or stored_hashes[doc_id] != meta.get('content_hash')
+        ]
+        stale = sorted(set(stored_hashes) - set(ids))
+        if stale:
+            collection.delete(ids=stale)
+        for start in range(0, len(changed), batch_size):
+            rows = changed[start:start + batch_size]
+            collection.upsert(
+                ids=[ids[row] for row in rows],
+                embeddings=np.asarray(matrix[rows], dtype=np.float32).tolist(),
+                documents=[documents[row] for row in rows],
+                metadatas=[metadatas[row] for row in rows]
+            )
+        return len(changed)
+
+
+def load_vector_backend(chunks, backend: str = 'chroma', index_path: str = 'vector_index',
+                        collection=None, batch_size: int = 64):
+    """Open the configured vector backend from the snapshot.
+
+    "numpy" serves straight from the memory-mapped snapshot; "chroma" copies
+    the snapshot's embeddings into the (in-memory) collection. Returns
+    (backend, status) where status says whether the snapshot was rebuilt.
+    """
+    start = time.perf_counter()
+    snapshot = IndexSnapshot(index_path)
+    counts = snapshot.ensure(chunks, batch_size=batch_size)
+    if backend == 'numpy':
+        vector_backend = snapshot.index
+    elif backend == 'chroma':
+        snapshot.restore_into(collection)
+        vector_backend = ChromaBackend(collection)
+    else:
+        raise ValueError(f"Unknown vector backend: {backend}")
+    status = dict(counts, backend=backend, load_seconds=round(time.perf_counter() - start, 4))
+    return vector_backend, status
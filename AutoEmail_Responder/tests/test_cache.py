@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from cache import CircuitBreaker, TieredCache
+from fakes import FakeRedis
+from pipeline import Pipeline, Stage
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+def make_cache(redis, **kwargs):
+    return TieredCache(redis, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05), **kwargs)
+
+
+def test_l1_serves_repeat_reads_without_redis(redis):
+    cache = make_cache(redis)
+    cache.set("llm:a", "answer")
+    trips = redis.round_trips
+    assert cache.get("llm:a") == "answer"
+    assert redis.round_trips == trips
+    cache.l1.clear()
+    assert cache.get("llm:a") == "answer"
+    assert redis.round_trips == trips + 1
+    assert cache.namespace_stats()["llm"]["l1_hits"] == 1
+
+
+def test_get_many_is_one_mget_and_remembers_misses(redis):
+    cache = make_cache(redis)
+    redis.set("semantic:a", "1")
+    redis.set("semantic:b", "2")
+    trips = redis.round_trips
+    assert cache.get_many(["semantic:a", "semantic:b", "semantic:c"]) == {"semantic:a": "1", "semantic:b": "2"}
+    assert redis.round_trips == trips + 1
+    # The miss is cached negatively, so the follow-up single read stays local
+    assert cache.get("semantic:c") is None
+    assert redis.round_trips == trips + 1
+
+
+def test_breaker_opens_and_fallback_serves_while_redis_is_down(redis):
+    cache = make_cache(redis)
+    redis.down = True
+    cache.set("llm:a", "answer")
+    cache.set("llm:b", "other")
+    assert cache.breaker.state == CircuitBreaker.OPEN
+    trips = redis.round_trips
+    cache.l1.clear()
+    # Served from the local fallback without touching Redis
+    assert cache.get("llm:a") == "answer"
+    assert redis.round_trips == trips
+    assert cache.stats()["fallback"]["hits"] == 1
+
+
+def test_breaker_half_open_probe_closes_after_recovery(redis):
+    cache = make_cache(redis)
+    redis.down = True
+    cache.get("llm:x")
+    cache.get("llm:y")
+    assert cache.breaker.state == CircuitBreaker.OPEN
+    redis.down = False
+    time.sleep(0.06)
+    cache.set("llm:a", "answer")
+    assert cache.breaker.state == CircuitBreaker.CLOSED
+    assert redis.get("llm:a") == "answer"
+
+
+def test_slow_redis_times_out_into_the_fallback():
+    slow = FakeRedis(latency=0.05, socket_timeout=0.01)
+    cache = make_cache(slow)
+    cache.set("llm:a", "answer")
+    cache.l1.clear()
+    assert cache.get("llm:a") == "answer"
+    assert cache.stats()["l2"]["errors"] >= 1
+
+
+def test_deferred_writes_are_one_pipelined_round_trip(redis):
+    cache = make_cache(redis)
+    trips = redis.round_trips
+    with cache.deferred_writes():
+        for i in range(10):
+            cache.set(f"llm:{i}", str(i))
+        # Readable from L1 straight away, not yet written to Redis
+        assert cache.get("llm:3") == "3"
+        assert redis.round_trips == trips
+    assert redis.round_trips == trips + 1
+    assert redis.get("llm:9") == "9"
+
+
+def test_deferred_writes_flush_at_flush_size_and_bypass_with_defer_false(redis):
+    cache = make_cache(redis, flush_size=3)
+    with cache.deferred_writes():
+        for i in range(3):
+            cache.set(f"llm:{i}", str(i))
+        assert redis.get("llm:2") == "2"
+        cache.set("llm:now", "x", defer=False)
+        assert redis.get("llm:now") == "x"
+
+
+def test_deferred_writes_cover_only_their_own_context(redis):
+    cache = make_cache(redis)
+    pipeline = Pipeline([Stage('write', lambda i: cache.set(f"llm:stage{i}", str(i)), workers=2)])
+    with cache.deferred_writes():
+        # Another thread's write goes straight to Redis
+        thread = threading.Thread(target=lambda: cache.set("llm:other", "x"))
+        thread.start()
+        thread.join()
+        assert redis.get("llm:other") == "x"
+        # Pipeline stages run in the caller's context and are deferred with it
+        pipeline.run(range(4))
+        assert redis.get("llm:stage0") is None
+    pipeline.close()
+    assert redis.get("llm:stage3") == "3"
+
+
+def test_deferred_writes_go_to_the_fallback_when_redis_fails(redis):
+    cache = make_cache(redis)
+    with cache.deferred_writes():
+        cache.set("llm:a", "answer")
+        redis.down = True
+    cache.l1.clear()
+    assert cache.get("llm:a") == "answer"
+
+
+def test_lazy_client_factory_is_called_on_first_round_trip(redis):
+    calls = []
+    cache = make_cache(lambda: calls.append(1) or redis)
+    assert calls == []
+    cache.set("llm:a", "answer")
+    cache.l1.clear()
+    cache.get("llm:a")
+    assert calls == [1]
+
+
+def test_expiring_members_are_trimmed_instead_of_kept_alive(redis, monkeypatch):
+    cache = make_cache(redis)
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache.add_expiring_members({"chunkrefs:a": ["llm:old"]}, ex=60)
+    now[0] += 61
+    assert cache.live_members(["chunkrefs:a"]) == (True, set())
+    cache.add_expiring_members({"chunkrefs:a": ["llm:new"], "chunkrefs:b": ["llm:new"]}, ex=60)
+    assert cache.live_members(["chunkrefs:a", "chunkrefs:b"]) == (True, {"llm:new"})
+    assert redis.zrangebyscore("chunkrefs:a", "-inf", "+inf") == ["llm:new"]
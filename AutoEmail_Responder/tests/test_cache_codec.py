@@ -0,0 +1,57 @@
+from cache_codec import COMPRESSED_PREFIX, PayloadCodec
+
+CHUNKS = {
+    "policy-1": {"id": "policy-1", "type": "policy", "section": "Leave", "content": "Leave policy text"},
+    "faq-1": {"id": "faq-1", "type": "faq", "content": "Q: When is payday?\nA: The last working day."}
+}
+
+
+def make_codec(table=None, **kwargs):
+    table = dict(CHUNKS) if table is None else table
+    return PayloadCodec(lambda: table, **kwargs), table
+
+
+def pairs(*ids):
+    return [[CHUNKS[doc_id]['content'], dict(CHUNKS[doc_id])] for doc_id in ids]
+
+
+def test_known_chunks_round_trip_by_id():
+    codec, _ = make_codec()
+    encoded = codec.encode_retrieval(pairs("faq-1", "policy-1"))
+    assert encoded == '["faq-1","policy-1"]'
+    assert codec.decode_retrieval(encoded) == pairs("faq-1", "policy-1")
+    assert codec.stats()['chunks_by_id'] == 2
+
+
+def test_unknown_or_edited_chunks_are_stored_inline():
+    codec, _ = make_codec()
+    unknown = ["Other text", {"id": "gone", "type": "faq"}]
+    edited = ["Leave policy text, edited", dict(CHUNKS["policy-1"])]
+    encoded = codec.encode_retrieval([unknown, edited, *pairs("faq-1")])
+    assert codec.decode_retrieval(encoded) == [unknown, edited, *pairs("faq-1")]
+    stats = codec.stats()
+    assert stats['chunks_inline'] == 2 and stats['chunks_by_id'] == 1
+
+
+def test_decode_is_none_once_a_chunk_leaves_the_knowledge_base():
+    codec, table = make_codec()
+    encoded = codec.encode_retrieval(pairs("policy-1"))
+    del table["policy-1"]
+    assert codec.decode_retrieval(encoded) is None
+    assert codec.stats()['unresolved'] == 1
+
+
+def test_long_text_is_compressed_and_short_text_is_not():
+    codec, _ = make_codec(compress_threshold=64)
+    short, long = "Thanks, approved.", "Dear Priya, your leave request has been approved. " * 20
+    assert codec.encode_text(short) == short
+    packed = codec.encode_text(long)
+    assert packed.startswith(COMPRESSED_PREFIX) and len(packed) < len(long)
+    assert codec.decode_text(packed) == long
+    assert codec.stats()['texts_compressed'] == 1
+
+
+def test_text_that_looks_compressed_still_round_trips():
+    codec, _ = make_codec()
+    text = COMPRESSED_PREFIX + "x"
+    assert codec.decode_text(codec.encode_text(text)) == text
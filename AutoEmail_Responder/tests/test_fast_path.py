@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from fast_path import FastPath, fast_path_entries
+from knowledge_base import KNOWLEDGE_BASE_PATH
+
+ALLOWED = ["Leave Approval", "Policy Explanation", "Reimbursement Status"]
+SENSITIVE = ["harassment", "POSH", "grievance"]
+
+
+class FixedIndex:
+    """Every query's best hit is the entry with `hit_id`"""
+
+    def __init__(self, score=0.95):
+        self.hit_id = None
+        self.score = score
+
+    def query_with_scores(self, query_embeddings, n_results=1):
+        return [[(self.score, '', {'id': self.hit_id})] for _ in query_embeddings]
+
+
+@pytest.fixture
+def fast_path():
+    with open(KNOWLEDGE_BASE_PATH, encoding='utf-8') as f:
+        entries = fast_path_entries(json.load(f))
+    return FastPath(FixedIndex(), entries, 0.88, ALLOWED, ["Grievance & POSH Policy"], SENSITIVE)
+
+
+def reply(fast_path, entry_id, values):
+    fast_path.index.hit_id = entry_id
+    match = fast_path.match_many([[0.0]])[0]
+    assert match is not None
+    return fast_path.render(match, values)
+
+
+def entry_id(fast_path, kind, text):
+    return next(e['id'] for e in fast_path.entries.values() if e['kind'] == kind and text in e['content'])
+
+
+def test_sensitive_template_is_never_auto_sent(fast_path):
+    posh = entry_id(fast_path, 'template', 'POSH')
+    assert reply(fast_path, posh, {'name': 'Asha'}) is None
+
+
+def test_excluded_policy_section_goes_to_llm(fast_path):
+    posh_policy = next(e['id'] for e in fast_path.entries.values() if e.get('section') == "Grievance & POSH Policy")
+    assert reply(fast_path, posh_policy, {'name': 'Asha'}) is None
+
+
+def test_sensitive_faq_goes_to_llm(fast_path):
+    harassment = entry_id(fast_path, 'faq', 'harassment')
+    assert reply(fast_path, harassment, {}) is None
+    assert fast_path.is_sensitive(fast_path.entries[harassment])
+
+
+def test_allowed_template_needs_every_field(fast_path):
+    leave = entry_id(fast_path, 'template', 'Leave Approval')
+    assert reply(fast_path, leave, {'leave_type': 'sick leave', 'date_range': '3-4 May'}) is None
+    filled = reply(fast_path, leave, {'name': 'Asha', 'leave_type': 'sick leave', 'date_range': '3-4 May'})
+    assert filled['path'] == 'template' and filled['text'].startswith("Hi Asha,")
+
+
+def test_faq_and_allowed_policy_are_answered(fast_path):
+    faq = next(e for e in fast_path.entries.values() if e['kind'] == 'faq')
+    assert reply(fast_path, faq['id'], {})['text'] == faq['answer']
+    leave_policy = next(e['id'] for e in fast_path.entries.values() if e.get('section') == "Leave Policy")
+    assert reply(fast_path, leave_policy, {'name': 'Asha'})['path'] == 'template'
+    assert reply(fast_path, leave_policy, {}) is None
+
+
+def test_below_threshold_is_no_match(fast_path):
+    fast_path.index.score = 0.5
+    assert fast_path.match_many([[0.0]]) == [None]
@@ -0,0 +1,37 @@
+from fakes import FakeGmailService, make_message
+from gmail_client import fetch_emails, fetch_message_details
+
+
+def inbox(count):
+    return FakeGmailService([
+        make_message(f"m{i}", f"Subject {i}", f"user{i}@example.com", f"Body of message {i}") for i in range(count)
+    ])
+
+
+def test_fetch_emails_is_one_list_plus_one_batch_per_50():
+    gmail = inbox(120)
+    emails = fetch_emails(gmail, limit=120)
+    assert [email['id'] for email in emails] == [f"m{i}" for i in range(120)]
+    assert emails[5]['body'] == "Body of message 5"
+    assert gmail.round_trips == 1 + 3
+    assert gmail.batch_calls == 3
+
+
+def test_headers_only_skips_bodies():
+    emails = fetch_emails(inbox(3), limit=3, headers_only=True)
+    assert emails[0] == {'id': 'm0', 'subject': 'Subject 0', 'from': 'user0@example.com',
+                         'date': 'Mon, 1 Jan 2024 09:00:00 +0000'}
+
+
+def test_one_failed_message_does_not_fail_the_batch():
+    gmail = inbox(3)
+    gmail.get_errors.append(429)
+    emails = fetch_emails(gmail, limit=3)
+    assert 'error' in emails[0]
+    assert [email['subject'] for email in emails[1:]] == ["Subject 1", "Subject 2"]
+
+
+def test_fetch_message_details_maps_every_id():
+    details = fetch_message_details(inbox(2), ["m1", "missing"])
+    assert details["m1"]['id'] == "m1"
+    assert isinstance(details["missing"], Exception)
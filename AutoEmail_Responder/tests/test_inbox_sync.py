@@ -0,0 +1,60 @@
+from fakes import FakeGmailService, make_message
+from inbox_sync import HISTORY_ID_KEY, InboxSync
+from mail_store import MailStore
+
+
+def make_sync(messages=(), **kwargs):
+    gmail = FakeGmailService(list(messages))
+    store = MailStore(":memory:")
+    return gmail, store, InboxSync(store, lambda: gmail, **kwargs)
+
+
+def deliver(gmail, message_id):
+    gmail.add_message(make_message(message_id, f"Subject {message_id}", "a@example.com", "Body"))
+
+
+def test_bootstrap_then_history_delta():
+    gmail, store, sync = make_sync([make_message("m1", "Hi", "a@example.com", "Body")])
+    assert sync.sync()['mode'] == 'bootstrap'
+    deliver(gmail, "m2")
+    gmail.delete_message("m1")
+    stats = sync.sync()
+    assert (stats['mode'], stats['added'], stats['deleted'], stats['failed']) == ('history', 1, 1, 0)
+    assert [row['id'] for row in store.query(10)] == ["m2"]
+
+
+def test_failed_fetch_is_retried_on_next_sync():
+    gmail, store, sync = make_sync()
+    sync.sync()
+    deliver(gmail, "m1")
+    deliver(gmail, "m2")
+    gmail.get_errors.append(429)
+    stats = sync.sync()
+    assert (stats['added'], stats['failed'], stats['pending']) == (1, 1, 1)
+    # The cursor moved on, but the failed message is not lost
+    assert store.get_state(HISTORY_ID_KEY) == str(gmail.history_id)
+    stats = sync.sync()
+    assert (stats['added'], stats['failed'], stats['pending']) == (1, 0, 0)
+    assert {row['id'] for row in store.query(10)} == {"m1", "m2"}
+
+
+def test_failed_fetch_gives_up_after_max_attempts():
+    gmail, store, sync = make_sync(max_fetch_attempts=2)
+    sync.sync()
+    deliver(gmail, "m1")
+    gmail.get_errors.extend([503, 503])
+    assert sync.sync()['pending'] == 1
+    stats = sync.sync()
+    assert (stats['failed'], stats['pending'], stats['abandoned']) == (1, 0, 1)
+
+
+def test_message_deleted_before_retry_is_dropped():
+    gmail, store, sync = make_sync()
+    sync.sync()
+    deliver(gmail, "m1")
+    gmail.get_errors.append(429)
+    sync.sync()
+    gmail.delete_message("m1")
+    stats = sync.sync()
+    assert (stats['failed'], stats['pending']) == (0, 0)
+    assert store.count() == 0
@@ -0,0 +1,142 @@
+import copy
+import json
+import threading
+
+from kb_reload import KnowledgeBaseReloader, affected_chunk_ids, chunk_scope, diff_chunks
+from knowledge_base import flatten_knowledge
+
+KNOWLEDGE = {
+    "company_policies": [
+        {"section": "Leave", "items": [
+            {"title": "Annual leave", "description": "20 days a year."},
+            {"title": "Sick leave", "description": "10 days a year."}
+        ]},
+        {"section": "Travel", "items": [
+            {"title": "Per diem", "description": "Paid per night away."}
+        ]}
+    ],
+    "faqs": [{"question": "When is payday?", "answer": "The last working day."}],
+    "response_templates": [{"template_name": "Leave Approval", "template": "Your leave is approved."}]
+}
+
+
+def ids_by_title(chunks):
+    return {chunk.get('title') or chunk.get('question') or chunk.get('template_name'): chunk['id'] for chunk in chunks}
+
+
+def reload(edit):
+    data = copy.deepcopy(KNOWLEDGE)
+    edit(data)
+    old, new = flatten_knowledge(KNOWLEDGE), flatten_knowledge(data)
+    diff = diff_chunks(old, new)
+    return old, new, diff, affected_chunk_ids(old, new, diff)
+
+
+def test_chunk_scope():
+    chunks = flatten_knowledge(KNOWLEDGE)
+    assert [chunk_scope(chunk) for chunk in chunks] == ["policy:Leave", "policy:Leave", "policy:Travel", "faq", "template"]
+
+
+def test_unchanged_knowledge_base_affects_nothing():
+    _, _, diff, affected = reload(lambda data: None)
+    assert diff == {'added': [], 'updated': [], 'deleted': []}
+    assert affected == set()
+
+
+def test_edited_item_affects_only_itself():
+    def edit(data):
+        data["company_policies"][0]["items"][1]["description"] = "12 days a year."
+
+    old, _, diff, affected = reload(edit)
+    ids = ids_by_title(old)
+    assert diff == {'added': [], 'updated': [ids["Sick leave"]], 'deleted': []}
+    assert affected == {ids["Sick leave"]}
+
+
+def test_deleted_item_affects_itself():
+    old, _, diff, affected = reload(lambda data: data["faqs"].clear())
+    assert diff['deleted'] == [ids_by_title(old)["When is payday?"]]
+    assert affected == {ids_by_title(old)["When is payday?"]}
+
+
+def test_item_added_to_a_section_affects_its_neighbours():
+    def edit(data):
+        data["company_policies"][0]["items"].append({"title": "Parental leave", "description": "26 weeks."})
+
+    old, new, diff, affected = reload(edit)
+    ids = ids_by_title(old)
+    assert diff['added'] == [ids_by_title(new)["Parental leave"]]
+    assert affected == {ids["Annual leave"], ids["Sick leave"]}
+
+
+def test_added_faq_affects_every_faq_but_no_policy():
+    def edit(data):
+        data["faqs"].append({"question": "Is there parking?", "answer": "Yes."})
+
+    old, _, _, affected = reload(edit)
+    assert affected == {ids_by_title(old)["When is payday?"]}
+
+
+def test_reload_also_invalidates_an_added_items_neighbours(tmp_path):
+    path = tmp_path / "knowledge_base.json"
+    path.write_text(json.dumps(KNOWLEDGE))
+    old = flatten_knowledge(KNOWLEDGE)
+    ids = ids_by_title(old)
+    invalidated = []
+    reloader = KnowledgeBaseReloader(
+        old, lambda data, chunks: {}, lambda chunk_ids: invalidated.append(set(chunk_ids)) or 0, path=str(path),
+        neighbours_fn=lambda added: {ids["When is payday?"], added[0]['id']}
+    )
+    data = copy.deepcopy(KNOWLEDGE)
+    data["company_policies"][1]["items"].append({"title": "Salary advance on trips", "description": "Ask payroll."})
+    path.write_text(json.dumps(data))
+    summary = reloader.reload()
+    assert summary['added'] == 1
+    # Its section plus the FAQ the neighbour lookup found; the new chunk itself has nothing cached
+    assert invalidated == [{ids["Per diem"], ids["When is payday?"]}]
+
+
+def test_failed_apply_is_retried_on_the_next_check(tmp_path):
+    path = tmp_path / "knowledge_base.json"
+    path.write_text(json.dumps(KNOWLEDGE))
+    failures = [RuntimeError("embedding service down")]
+
+    def apply(data, chunks):
+        if failures:
+            raise failures.pop()
+        return {}
+
+    reloader = KnowledgeBaseReloader(flatten_knowledge(KNOWLEDGE), apply, lambda chunk_ids: 0, path=str(path))
+    data = copy.deepcopy(KNOWLEDGE)
+    data["faqs"][0]["answer"] = "The 25th."
+    path.write_text(json.dumps(data))
+    try:
+        reloader.check()
+    except RuntimeError:
+        pass
+    summary = reloader.check()
+    assert summary is not None and summary['updated'] == 1
+    assert reloader.check() is None
+
+
+def test_manual_reload_runs_the_settle_pass(tmp_path):
+    path = tmp_path / "knowledge_base.json"
+    path.write_text(json.dumps(KNOWLEDGE))
+    invalidated = threading.Event()
+    calls = []
+
+    def invalidate(chunk_ids):
+        calls.append(set(chunk_ids))
+        if len(calls) == 2:
+            invalidated.set()
+        return 0
+
+    reloader = KnowledgeBaseReloader(
+        flatten_knowledge(KNOWLEDGE), lambda data, chunks: {}, invalidate, path=str(path), settle_seconds=0.05
+    )
+    data = copy.deepcopy(KNOWLEDGE)
+    data["faqs"][0]["answer"] = "The 25th."
+    path.write_text(json.dumps(data))
+    assert reloader.reload()['updated'] == 1
+    assert invalidated.wait(1)
+    assert calls[0] == calls[1]
@@ -0,0 +1,94 @@
+import sqlite3
+import time
+
+from mail_store import MailStore
+
+
+def make_store(**kwargs):
+    store = MailStore(":memory:", **kwargs)
+    store.upsert_messages([{'id': "m1", 'sender': "a@example.com", 'subject': "Hi", 'internal_date': 1}])
+    return store
+
+
+def respondable(store):
+    return [row['id'] for row in store.query(10, respondable_only=True)]
+
+
+def test_claim_is_exclusive_until_released():
+    store = make_store(retry_delay=0)
+    assert store.claim_response("m1")
+    assert not store.claim_response("m1")
+    assert store.query(10, unresponded_only=True) == []
+    assert store.release_claim("m1") is False
+    assert store.claim_response("m1")
+    store.mark_responded("m1", "sent-1")
+    assert store.is_responded("m1")
+    assert not store.claim_response("m1")
+
+
+def test_failed_send_backs_off_before_the_next_claim():
+    store = make_store(retry_delay=60)
+    store.claim_response("m1")
+    store.release_claim("m1")
+    assert not store.claim_response("m1")
+    assert respondable(store) == []
+    # Still unanswered, so listings keep showing it
+    assert [row['id'] for row in store.query(10, unresponded_only=True)] == ["m1"]
+    with store._conn:
+        store._conn.execute("UPDATE responses SET retry_at = ?", (time.time() - 1,))
+    assert respondable(store) == ["m1"]
+    assert store.claim_response("m1")
+
+
+def test_stale_claim_lapses_after_the_claim_timeout():
+    store = make_store(claim_timeout=600)
+    assert store.claim_response("m1")
+    assert not store.claim_response("m1")
+    assert respondable(store) == []
+    # The worker holding the claim died long ago
+    with store._conn:
+        store._conn.execute("UPDATE responses SET claimed_at = ?", (time.time() - 601,))
+    assert respondable(store) == ["m1"]
+    assert store.claim_response("m1")
+    assert not store.claim_response("m1")
+
+
+def test_repeated_failures_dead_letter_the_message():
+    store = make_store(max_failures=3, retry_delay=0)
+    for _ in range(2):
+        assert store.claim_response("m1")
+        assert store.release_claim("m1") is False
+    assert store.claim_response("m1")
+    assert store.release_claim("m1") is True
+    assert not store.claim_response("m1")
+    assert respondable(store) == []
+    row = store.query(10)[0]
+    assert (row['failures'], row['skip_reason']) == (3, "send failed 3 times")
+    assert store.response_counts() == {'responded': 0, 'retrying': 0, 'dead_letters': 1, 'skipped': 1}
+
+
+def test_skipped_message_is_never_claimed():
+    store = make_store()
+    store.skip_response("m1", "mailing list")
+    assert not store.claim_response("m1")
+    assert respondable(store) == []
+    assert store.query(10)[0]['skip_reason'] == "mailing list"
+
+
+def test_older_database_gains_the_new_columns(tmp_path):
+    path = str(tmp_path / "mail_store.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        "CREATE TABLE messages (id TEXT PRIMARY KEY, thread_id TEXT, sender TEXT, subject TEXT, date TEXT, "
+        "internal_date INTEGER, body TEXT, body_size INTEGER, synced_at REAL);"
+        "CREATE TABLE responses (message_id TEXT PRIMARY KEY, claimed_at REAL, responded_at REAL, response_id TEXT);"
+        "INSERT INTO responses (message_id, claimed_at) VALUES ('m0', 1);"
+    )
+    conn.commit()
+    conn.close()
+    store = MailStore(path, retry_delay=0)
+    store.upsert_messages([{'id': "m1", 'sender': "a@example.com", 'headers': '{"List-Id": "x"}'}])
+    assert store.query(10)[0]['headers'] == '{"List-Id": "x"}'
+    assert store.release_claim("m0") is False
+    assert store.claim_response("m0")
+    store.close()
@@ -0,0 +1,70 @@
+import base64
+
+from fakes import make_part
+from mime_body import decode_prefix, extract_body, html_to_text
+
+
+def test_plain_part_inside_nested_multipart_wins():
+    payload = make_part('multipart/mixed', parts=[
+        make_part('multipart/alternative', parts=[
+            make_part('text/html', "<p>HTML body</p>"),
+            make_part('text/plain', "Plain body")
+        ]),
+        make_part('application/pdf', "%PDF", filename="payslip.pdf")
+    ])
+    body = extract_body(payload)
+    assert body['text'] == "Plain body"
+    assert body['mime_type'] == 'text/plain'
+    assert body['attachments'] == 1
+    assert body['truncated'] is False
+
+
+def test_html_is_converted_when_there_is_no_plain_part():
+    payload = make_part('multipart/alternative', parts=[
+        make_part('text/html', "<html><head><style>p {}</style></head>"
+                               "<body><p>Hello&nbsp;there</p><p>Second<br>line</p></body></html>")
+    ])
+    body = extract_body(payload)
+    assert body['mime_type'] == 'text/html'
+    assert body['text'] == "Hello\xa0there\nSecond\nline"
+
+
+def test_attachments_are_counted_but_never_read():
+    payload = make_part('multipart/mixed', parts=[
+        make_part('text/plain', "attached notes", filename="notes.txt"),
+        make_part('image/png', "png", filename="photo.png")
+    ])
+    body = extract_body(payload)
+    assert body['text'] == '' and body['mime_type'] is None
+    assert body['attachments'] == 2
+
+
+def test_max_chars_truncates_and_keeps_the_original_size():
+    text = "x" * 10000
+    body = extract_body(make_part('text/plain', text), max_chars=100)
+    assert body['text'] == "x" * 100
+    assert body['truncated'] is True
+    assert body['original_size'] == 10000
+
+
+def test_max_bytes_stops_decoding_without_splitting_characters():
+    text = "é" * 5000
+    body = extract_body(make_part('text/plain', text), max_bytes=3001)
+    assert body['truncated'] is True
+    assert body['text'] == "é" * 1500
+
+
+def test_decode_prefix_carries_multibyte_characters_across_blocks():
+    text = "ab" + "€" * 3000
+    data = base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii').rstrip('=')
+    assert decode_prefix(data) == (text, False)
+
+
+def test_declared_charset_is_used():
+    body = extract_body(make_part('text/plain', "café", charset='latin-1'))
+    assert body['text'] == "café"
+
+
+def test_empty_payload():
+    assert extract_body(None)['text'] == ''
+    assert html_to_text("<b>bold</b> text") == "bold text"
@@ -0,0 +1,86 @@
+import json
+import time
+
+from fakes import FakeGmailService, make_message
+from inbox_sync import InboxSync
+from mail_store import MailStore
+from responder_daemon import PriorityScorer, ResponderDaemon, automated_reason, reply_thread
+
+
+def row(sender="Ann <ann@example.com>", **headers):
+    return {'sender': sender, 'headers': json.dumps(headers)}
+
+
+def test_automated_reason():
+    assert automated_reason(row()) is None
+    assert automated_reason(row(**{'Auto-Submitted': "no"})) is None
+    assert automated_reason(row(**{'Auto-Submitted': "auto-replied"})) == 'auto-submitted'
+    assert automated_reason(row(**{'X-Autoreply': "yes"})) == 'auto-reply'
+    assert automated_reason(row(Precedence="bulk")) == 'bulk'
+    assert automated_reason(row(**{'List-Id': "<hr.example.com>"})) == 'mailing list'
+    assert automated_reason(row("No Reply <no-reply@example.com>")) == 'no-reply sender'
+    assert automated_reason(row("MAILER-DAEMON@example.com")) == 'no-reply sender'
+    assert automated_reason(row("Noreplyson <noreplyson@example.com>")) is None
+    assert automated_reason(row("Me <Me@Example.com>"), ["me@example.com"]) == 'own address'
+    # Rows synced before headers were stored are judged by sender alone
+    assert automated_reason({'sender': "ann@example.com", 'headers': None}) is None
+
+
+def test_reply_thread_extends_references():
+    thread = reply_thread({
+        'thread_id': "t1",
+        'headers': json.dumps({'Message-ID': "<m2@example.com>", 'References': "<m1@example.com>"})
+    })
+    assert thread == {
+        'thread_id': "t1", 'in_reply_to': "<m2@example.com>", 'references': "<m1@example.com> <m2@example.com>"
+    }
+    assert reply_thread({'thread_id': "t1", 'headers': None}) == {'thread_id': "t1"}
+
+
+def make_daemon(messages, **kwargs):
+    gmail = FakeGmailService()
+    store = MailStore(":memory:", retry_delay=0)
+    sync = InboxSync(store, lambda: gmail)
+    batches = []
+
+    def respond(batch):
+        batches.append(batch)
+        return {'results': [{'status': 'sent'} for _ in batch]}
+
+    daemon = ResponderDaemon(store, sync.sync, respond, PriorityScorer(), **kwargs)
+    daemon.started_at = time.time()
+    sync.sync()
+    for message in messages:
+        gmail.add_message(message)
+    return daemon, store, batches
+
+
+def test_poll_skips_automated_mail_once_and_queues_the_rest():
+    now = "Mon, 1 Jan 2024 09:00:00 +0000"
+    daemon, store, _ = make_daemon([
+        make_message("m1", "Leave?", "ann@example.com", "How many days?", now),
+        make_message("m2", "Out of office", "bob@example.com", "Away", now, headers={'Auto-Submitted': "auto-replied"}),
+        make_message("m3", "Newsletter", "news@example.com", "News", now, headers={'List-Id': "<news>"}),
+        make_message("m4", "Receipt", "noreply@example.com", "Paid", now),
+        make_message("m5", "Re: Leave?", "me@example.com", "Sent by us", now),
+    ], lookback_seconds=time.time())
+    assert daemon.poll() == 1
+    assert daemon.stats()['filtered'] == 4
+    assert {r['id']: r['skip_reason'] for r in store.query(10) if r['skip_reason']} == {
+        "m2": "auto-submitted", "m3": "mailing list", "m4": "no-reply sender", "m5": "own address"
+    }
+    assert daemon.poll() == 0
+    assert daemon.stats()['filtered'] == 4
+
+
+def test_replies_carry_the_thread_of_the_message_they_answer():
+    daemon, _, batches = make_daemon([
+        make_message("m1", "Leave?", "ann@example.com", "How many days?", thread_id="t1",
+                     headers={'Message-ID': "<m1@example.com>"})
+    ], lookback_seconds=time.time())
+    daemon.poll()
+    daemon._respond(daemon.queue.take(10))
+    assert batches[0][0] == {
+        'to': "ann@example.com", 'subject': "Re: Leave?", 'user_query': "How many days?", 'message_id': "m1",
+        'thread_id': "t1", 'in_reply_to': "<m1@example.com>", 'references': "<m1@example.com>"
+    }
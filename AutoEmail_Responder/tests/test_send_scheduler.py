@@ -0,0 +1,152 @@
+import time
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from fakes import FakeGmailService
+from send_scheduler import SendRetryQueue, SendScheduler, TokenBucket, is_retryable
+
+
+def http_error(status, content=b'{}'):
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+@pytest.fixture
+def service():
+    return FakeGmailService()
+
+
+def make_scheduler(service, **kwargs):
+    outcomes = {'sent': [], 'failed': []}
+
+    def send_fn(to, subject, body, thread):
+        message = {'raw': f"{to}|{subject}|{body}", 'threadId': (thread or {}).get('thread_id')}
+        return service.users().messages().send(userId='me', body=message).execute()
+
+    scheduler = SendScheduler(
+        send_fn, TokenBucket(1e6, 1e6), SendRetryQueue(':memory:'), max_attempts=2, base_delay=0.001,
+        max_delay=0.002, queue_max_attempts=4,
+        on_sent=lambda message_id, sent_id: outcomes['sent'].append((message_id, sent_id)),
+        on_failed=lambda message_id: outcomes['failed'].append(message_id),
+        **kwargs
+    )
+    return scheduler, outcomes
+
+
+def make_due(scheduler):
+    # Queued items wait out a backoff; pull them forward instead of sleeping
+    with scheduler.retry_queue._conn:
+        scheduler.retry_queue._conn.execute("UPDATE send_queue SET next_attempt_at = 0")
+
+
+def test_retryable_error_is_retried_in_line(service):
+    scheduler, outcomes = make_scheduler(service)
+    service.send_errors = [429]
+    outcome = scheduler.send("a@example.com", "Re: hi", "body", message_id="m1")
+    assert outcome['status'] == 'sent' and outcome['attempts'] == 2
+    assert outcomes['sent'] == [("m1", outcome['id'])]
+    assert scheduler.stats()['retries'] == 1
+
+
+def test_non_retryable_error_fails_at_once(service):
+    scheduler, outcomes = make_scheduler(service)
+    service.send_errors = [400]
+    outcome = scheduler.send("a@example.com", "Re: hi", "body", message_id="m1")
+    assert outcome['status'] == 'failed' and outcome['attempts'] == 1
+    assert outcomes['failed'] == ["m1"]
+    assert scheduler.stats()['retry_queue'] == {}
+
+
+def test_exhausted_retries_go_to_the_queue_and_drain_later(service):
+    scheduler, outcomes = make_scheduler(service)
+    service.send_errors = [503, 503]
+    outcome = scheduler.send("a@example.com", "Re: hi", "body", message_id="m1")
+    assert outcome['status'] == 'queued'
+    assert scheduler.stats()['retry_queue'] == {'pending': 1}
+    assert outcomes == {'sent': [], 'failed': []}
+
+    make_due(scheduler)
+    assert scheduler.retry_pending() == {'sent': 1, 'rescheduled': 0, 'dead': 0}
+    assert scheduler.stats()['retry_queue'] == {}
+    assert outcomes['sent'] == [("m1", "sent-1")]
+    assert service.sent[0]['raw'] == "a@example.com|Re: hi|body"
+
+
+def test_queued_send_keeps_its_thread(service):
+    scheduler, _ = make_scheduler(service)
+    service.send_errors = [503, 503]
+    thread = {'thread_id': "t1", 'in_reply_to': "<m1@example.com>", 'references': "<m1@example.com>"}
+    assert scheduler.send("a@example.com", "Re: hi", "body", "m1", thread)['status'] == 'queued'
+    make_due(scheduler)
+    scheduler.retry_pending()
+    assert service.sent[0]['threadId'] == "t1"
+
+
+def test_queued_send_is_rescheduled_then_dead_lettered(service):
+    scheduler, outcomes = make_scheduler(service)
+    service.send_errors = [503] * 6
+    assert scheduler.send("a@example.com", "Re: hi", "body", message_id="m1")['status'] == 'queued'
+
+    make_due(scheduler)
+    assert scheduler.retry_pending() == {'sent': 0, 'rescheduled': 0, 'dead': 1}
+    assert scheduler.stats()['retry_queue'] == {'dead': 1}
+    assert outcomes['failed'] == ["m1"]
+    assert service.sent == []
+
+
+def test_retry_pending_skips_items_not_yet_due(service):
+    scheduler, _ = make_scheduler(service)
+    service.send_errors = [503, 503]
+    scheduler.send("a@example.com", "Re: hi", "body")
+    scheduler.retry_queue.reschedule(1, 2, float('inf'), "later")
+    assert scheduler.retry_pending() == {'sent': 0, 'rescheduled': 0, 'dead': 0}
+
+
+def test_queue_rows_are_claimed_by_one_process(tmp_path):
+    path = str(tmp_path / "send_queue.db")
+    server, daemon = SendRetryQueue(path), SendRetryQueue(path)
+    server.push("a@example.com", "Re: hi", "body", "m1", 2, 0, "503")
+    assert [item['message_id'] for item in server.due()] == ["m1"]
+    assert daemon.due() == []
+    server.reschedule(1, 3, 0, "503")
+    assert [item['attempts'] for item in daemon.due()] == [3]
+    # The daemon died mid-send; once its claim lapses the server takes over
+    with server._conn:
+        server._conn.execute("UPDATE send_queue SET claimed_until = ?", (time.time() - 1,))
+    assert [item['message_id'] for item in server.due()] == ["m1"]
+
+
+def test_retry_after_header_sets_the_delay():
+    calls = []
+
+    def send_fn(to, subject, body, thread):
+        calls.append(1)
+        if len(calls) == 1:
+            raise HttpError(httplib2.Response({'status': 429, 'retry-after': '0.02'}), b'{}')
+        return {'id': 'sent-1'}
+
+    scheduler = SendScheduler(send_fn, TokenBucket(1e6, 1e6), SendRetryQueue(':memory:'), base_delay=5)
+    outcome = scheduler.send("a@example.com", "Re: hi", "body")
+    assert outcome['status'] == 'sent'
+    assert outcome['backoff_seconds'] == pytest.approx(0.02)
+
+
+def test_rate_limit_403_is_retryable_but_other_403s_are_not():
+    assert is_retryable(http_error(403, b'{"reason": "userRateLimitExceeded"}'))
+    assert not is_retryable(http_error(403, b'{"reason": "forbidden"}'))
+    assert is_retryable(ConnectionError())
+
+
+def test_retry_queue_is_created_lazily(service):
+    created = []
+
+    def factory():
+        created.append(1)
+        return SendRetryQueue(':memory:')
+
+    scheduler = SendScheduler(lambda *args: {'id': 'x'}, TokenBucket(1e6, 1e6), factory)
+    scheduler.send("a@example.com", "Re: hi", "body")
+    assert created == []
+    assert scheduler.stats()['retry_queue'] == {}
+    assert created == [1]
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+
+from cache import CircuitBreaker, TieredCache
+from fakes import FakeRedis
+from singleflight import SingleFlight
+
+
+def make_flight(redis=None, **kwargs):
+    cache = TieredCache(redis, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05)) if redis else None
+    kwargs.setdefault('poll_interval', 0.01)
+    return SingleFlight(cache, **kwargs), cache
+
+
+def test_concurrent_callers_share_one_execution():
+    flight, _ = make_flight()
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(5)]
+    threads[0].start()
+    started.wait(1)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.stats()['coalesced_waiters'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == ["answer"] * 5
+    stats = flight.stats()
+    assert stats['leaders'] == 1 and stats['coalesced_waiters'] == 4 and stats['in_flight'] == 0
+
+
+def test_leader_error_reaches_waiters_and_next_call_retries():
+    flight, _ = make_flight()
+
+    def boom():
+        raise ValueError("boom")
+
+    try:
+        flight.do("k", boom)
+    except ValueError:
+        pass
+    assert flight.do("k", lambda: "ok") == "ok"
+    assert flight.stats()['leaders'] == 2
+
+
+def test_leader_base_exception_reaches_waiters():
+    flight, _ = make_flight()
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def work():
+        started.set()
+        release.wait(1)
+        raise KeyboardInterrupt
+
+    def call():
+        try:
+            flight.do("k", work)
+        except BaseException as e:
+            errors.append(type(e))
+
+    leader, waiter = threading.Thread(target=call), threading.Thread(target=call)
+    leader.start()
+    started.wait(1)
+    waiter.start()
+    while flight.stats()['coalesced_waiters'] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(1)
+    waiter.join(1)
+    assert errors == [KeyboardInterrupt, KeyboardInterrupt]
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_cancelled_async_leader_wakes_its_waiters():
+    flight, _ = make_flight()
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def work():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.ensure_future(flight.ado("k", work))
+        await started.wait()
+        waiter = asyncio.ensure_future(flight.ado("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        done, _ = await asyncio.wait([leader, waiter], timeout=1)
+        assert len(done) == 2 and leader.cancelled() and waiter.cancelled()
+        assert await flight.ado("k", lambda: asyncio.sleep(0, "ok")) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_leader_takes_and_releases_the_redis_lock():
+    redis = FakeRedis()
+    flight, cache = make_flight(redis)
+    seen = []
+
+    def work():
+        seen.append(redis.get("lock:llm:a"))
+        cache.set("llm:a", "answer")
+        return "answer"
+
+    assert flight.do("llm:a", work) == "answer"
+    assert seen[0] is not None
+    assert redis.get("lock:llm:a") is None
+
+
+def test_waiter_uses_the_remote_leaders_result():
+    redis = FakeRedis()
+    flight, cache = make_flight(redis)
+    redis.set("lock:llm:a", "other-process", ex=60)
+
+    def leader_finishes():
+        time.sleep(0.05)
+        redis.set("llm:a", "remote answer")
+        redis.delete("lock:llm:a")
+
+    threading.Thread(target=leader_finishes).start()
+    assert flight.do("llm:a", lambda: "local answer") == "remote answer"
+    stats = flight.stats()
+    assert stats['remote_waits'] == 1 and stats['remote_hits'] == 1
+
+
+def test_waiter_runs_itself_when_the_lock_expires_without_a_result():
+    redis = FakeRedis()
+    flight, _ = make_flight(redis)
+    # The leader died: its lock expires and no result was ever stored
+    redis.set("lock:llm:a", "other-process", ex=1)
+    start = time.monotonic()
+    assert flight.do("llm:a", lambda: "local answer") == "local answer"
+    assert time.monotonic() - start < 5
+    stats = flight.stats()
+    assert stats['remote_waits'] == 1 and stats['remote_fallthroughs'] == 1 and stats['remote_hits'] == 0
+
+
+def test_waiter_gives_up_after_wait_timeout():
+    redis = FakeRedis()
+    flight, _ = make_flight(redis, wait_timeout=0.05)
+    redis.set("lock:llm:a", "other-process", ex=60)
+    assert flight.do("llm:a", lambda: "local answer") == "local answer"
+    assert flight.stats()['remote_fallthroughs'] == 1
+
+
+def test_redis_down_runs_locally():
+    redis = FakeRedis(down=True)
+    flight, _ = make_flight(redis)
+    assert flight.do("llm:a", lambda: "local answer") == "local answer"
+    assert flight.stats()['remote_waits'] == 0
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from vector_index import ChromaBackend, NumpyVectorIndex
+
+DIMENSION = 32
+
+
+def fixed_embeddings(count, seed):
+    vectors = np.random.default_rng(seed).normal(size=(count, DIMENSION)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def ids(results):
+    return [[meta['id'] for _, meta in hits] for hits in results]
+
+
+@pytest.fixture
+def corpus():
+    vectors = fixed_embeddings(60, seed=1)
+    chunks = [{'id': f"faq:{i}", 'type': 'faq', 'content': f"answer {i}"} for i in range(len(vectors))]
+    return chunks, dict(zip((chunk['content'] for chunk in chunks), vectors))
+
+
+def test_numpy_index_matches_chroma_top_k(corpus, tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+    chunks, vectors = corpus
+    embed = lambda texts: np.stack([vectors[text] for text in texts])
+
+    numpy_index = NumpyVectorIndex(str(tmp_path / "index"))
+    numpy_index.sync(chunks, embed)
+    collection = chromadb.EphemeralClient().create_collection(
+        f"parity-{tmp_path.name}"[:60], embedding_function=None
+    )
+    collection.add(
+        ids=[chunk['id'] for chunk in chunks],
+        documents=[chunk['content'] for chunk in chunks],
+        metadatas=chunks,
+        embeddings=embed([chunk['content'] for chunk in chunks]).tolist()
+    )
+
+    queries = fixed_embeddings(25, seed=2)
+    for n_results in (1, 3, 5):
+        expected = ids(ChromaBackend(collection).query(queries, n_results))
+        assert ids(numpy_index.query(queries, n_results)) == expected
+        # Single queries go through the same path as batches
+        assert ids(numpy_index.query(queries[0], n_results)) == expected[:1]
+
+
+def test_numpy_index_sync_reembeds_only_changed_chunks(corpus, tmp_path):
+    chunks, vectors = corpus
+    embedded = []
+
+    def embed(texts):
+        embedded.extend(texts)
+        return np.stack([vectors.get(text, vectors["answer 0"]) for text in texts])
+
+    index = NumpyVectorIndex(str(tmp_path / "index"))
+    assert index.sync(chunks, embed)['added'] == len(chunks)
+    embedded.clear()
+    edited = [dict(chunk, content="answer 0 edited") if chunk['id'] == 'faq:5' else chunk for chunk in chunks[:-1]]
+    counts = NumpyVectorIndex(str(tmp_path / "index")).sync(edited, embed)
+    assert counts == {'added': 0, 'updated': 1, 'unchanged': len(chunks) - 2, 'deleted': 1}
+    assert embedded == ["answer 0 edited"]
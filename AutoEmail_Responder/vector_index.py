@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from knowledge_base import content_hash
+
+
+class ChromaBackend:
+    """Vector backend over a ChromaDB collection"""
+
+    name = 'chroma'
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, query_embeddings, n_results: int = 3) -> List[List]:
+        """Top-k [doc, meta] pairs for each query embedding, in one call"""
+        query_embeddings = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        results = self.collection.query(query_embeddings=query_embeddings.tolist(), n_results=n_results)
+        return [
+            [list(pair) for pair in zip(docs, metas)]
+            for docs, metas in zip(results['documents'], results['metadatas'])
+        ]
+
+    def count(self) -> int:
+        return self.collection.count()
+
+
+class NumpyVectorIndex:
+    """Local vector backend: one contiguous float32 matrix of normalized embeddings.
+
+    The matrix is persisted as `<path>.npy` and memory-mapped on load, with ids,
+    documents and metadata in a `<path>.json` sidecar. Top-k for a batch of
+    queries is a single matrix product plus argpartition, with no client stack
+    in between.
+    """
+
+    name = 'numpy'
+
+    def __init__(self, path: str = 'vector_index'):
+        self.matrix_path = f"{path}.npy"
+        self.meta_path = f"{path}.json"
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict] = []
+
+    def load(self):
+        """Memory-map the persisted index if it exists; returns self"""
+        if os.path.exists(self.matrix_path) and os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                sidecar = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+            with self._lock:
+                self._matrix = matrix
+                self._ids = sidecar['ids']
+                self._documents = sidecar['documents']
+                self._metadatas = sidecar['metadatas']
+        return self
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def rows(self):
+        """(ids, matrix, documents, metadatas) of the loaded index"""
+        with self._lock:
+            return self._ids, self._matrix, self._documents, self._metadatas
+
+    @property
+    def dimension(self) -> int:
+        return self._matrix.shape[1] if self._matrix.ndim == 2 else 0
+
+    def query(self, query_embeddings, n_results: int = 3) -> List[List]:
+        """Top-k [doc, meta] pairs for each query embedding (rows are L2-normalized)"""
+        return [
+            [[doc, meta] for _, doc, meta in hits]
+            for hits in self.query_with_scores(query_embeddings, n_results)
+        ]
+
+    def query_with_scores(self, query_embeddings, n_results: int = 3) -> List[List]:
+        """Top-k (cosine similarity, doc, meta) for each query embedding"""
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            matrix, documents, metadatas = self._matrix, self._documents, self._metadatas
+        total = len(documents)
+        if total == 0:
+            return [[] for _ in range(len(queries))]
+        k = min(n_results, total)
+        scores = queries @ matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            order = candidates[np.argsort(-scores[row, candidates])]
+            results.append([(float(scores[row, i]), documents[i], metadatas[i]) for i in order])
+        return results
+
+    def sync(self, chunks: Sequence[Dict], embed_fn: Callable[[List[str]], np.ndarray], batch_size: int = 64):
+        """Rebuild the index from chunks, embedding only new or changed ones.
+
+        Unchanged chunks (same id and content hash) keep their stored vectors.
+        The new matrix and sidecar are written to temp files and swapped in
+        atomically. Returns added/updated/unchanged/deleted counts.
+        """
+        self.load()
+        existing = {
+            doc_id: (meta.get('content_hash'), row)
+            for row, (doc_id, meta) in enumerate(zip(self._ids, self._metadatas))
+        }
+        vectors, to_embed = [None] * len(chunks), []
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        for position, chunk in enumerate(chunks):
+            digest = content_hash(chunk['content'])
+            previous = existing.get(chunk['id'])
+            if previous is not None and previous[0] == digest:
+                vectors[position] = np.asarray(self._matrix[previous[1]], dtype=np.float32)
+                counts['unchanged'] += 1
+            else:
+                to_embed.append(position)
+                counts['updated' if previous is not None else 'added'] += 1
+        for start in range(0, len(to_embed), batch_size):
+            positions = to_embed[start:start + batch_size]
+            embedded = embed_fn([chunks[p]['content'] for p in positions])
+            for position, vector in zip(positions, embedded):
+                vectors[position] = vector
+        current_ids = {chunk['id'] for chunk in chunks}
+        counts['deleted'] = sum(1 for doc_id in existing if doc_id not in current_ids)
+
+        matrix = np.ascontiguousarray(np.vstack(vectors), dtype=np.float32) if vectors else np.zeros((0, 0), np.float32)
+        sidecar = {
+            'ids': [chunk['id'] for chunk in chunks],
+            'documents': [chunk['content'] for chunk in chunks],
+            'metadatas': [dict(chunk, content_hash=content_hash(chunk['content'])) for chunk in chunks]
+        }
+        with open(self.matrix_path + '.tmp', 'wb') as f:
+            np.save(f, matrix)
+        with open(self.meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(sidecar, f)
+        os.replace(self.matrix_path + '.tmp', self.matrix_path)
+        os.replace(self.meta_path + '.tmp', self.meta_path)
+        self.load()
+        return counts
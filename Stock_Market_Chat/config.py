@@ -24,6 +24,14 @@ def get_alpha_vantage_api_key():
     """Get Alpha Vantage API key from environment variables."""
     return os.getenv("ALPHA_VANTAGE_API_KEY")
 
+def get_quote_cache_config():
+    """Get stock quote cache settings from environment variables."""
+    return {
+        "ttl": float(os.getenv("QUOTE_CACHE_TTL", "30")),
+        "stale_ttl": float(os.getenv("QUOTE_CACHE_STALE_TTL", "300")),
+        "refresh_workers": int(os.getenv("QUOTE_REFRESH_WORKERS", "4"))
+    }
+
 def validate_config():
     """Validate that all required API keys are present."""
     required_keys = {
@@ -1,11 +1,118 @@
+import threading
+import time
 import yfinance as yf
 import requests
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
-from config import get_news_api_key, get_alpha_vantage_api_key
+from typing import Callable, Dict, List, Optional
+from config import get_news_api_key, get_alpha_vantage_api_key, get_quote_cache_config
+
+class QuoteCache:
+    """Process-wide cache of stock quotes with a TTL.
+
+    Streamlit reruns the script on every interaction, and all sessions share
+    this module, so every quote goes through one cache. A quote younger than
+    `ttl` seconds is returned as is. An older one, up to `stale_ttl` seconds,
+    is still returned immediately while a background worker refreshes it
+    (stale-while-revalidate). Past that, the caller fetches it. Fetches hold a
+    per-symbol lock, so concurrent misses for one symbol make a single call.
+    Failed fetches are not cached; a failed refresh keeps the stale quote.
+    """
+
+    def __init__(self, fetch_fn: Callable[[str], Dict], ttl: float = 30, stale_ttl: float = 300,
+                 refresh_workers: int = 4):
+        self.fetch_fn = fetch_fn
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self._quotes = {}  # symbol -> (fetched at, quote)
+        self._locks = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="quote-refresh")
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "errors": 0}
+
+    def get(self, symbol: str) -> Dict:
+        symbol = symbol.upper()
+        entry = self._lookup(symbol)
+        if entry is not None:
+            return entry
+        with self._symbol_lock(symbol):
+            # Another caller may have fetched it while we waited for the lock
+            entry = self._lookup(symbol, count=False)
+            if entry is not None:
+                self._count("hits")
+                return entry
+            self._count("misses")
+            return self._fetch(symbol)
+
+    def _lookup(self, symbol: str, count: bool = True) -> Optional[Dict]:
+        with self._lock:
+            cached = self._quotes.get(symbol)
+        if cached is None:
+            return None
+        age = time.monotonic() - cached[0]
+        if age < self.ttl:
+            if count:
+                self._count("hits")
+            return dict(cached[1])
+        if age < self.stale_ttl:
+            if count:
+                self._count("stale_hits")
+            self._schedule_refresh(symbol)
+            return dict(cached[1])
+        return None
+
+    def _schedule_refresh(self, symbol: str):
+        with self._lock:
+            if symbol in self._refreshing:
+                return
+            self._refreshing.add(symbol)
+        self._executor.submit(self._refresh, symbol)
+
+    def _refresh(self, symbol: str):
+        try:
+            with self._symbol_lock(symbol):
+                self._count("refreshes")
+                self._fetch(symbol)
+        finally:
+            with self._lock:
+                self._refreshing.discard(symbol)
+
+    def _fetch(self, symbol: str) -> Dict:
+        quote = self.fetch_fn(symbol)
+        if "error" in quote:
+            self._count("errors")
+            return quote
+        with self._lock:
+            self._quotes[symbol] = (time.monotonic(), quote)
+        return dict(quote)
+
+    def _symbol_lock(self, symbol: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def clear(self):
+        with self._lock:
+            self._quotes.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._quotes)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        return stats
 
 def fetch_stock_price(symbol: str) -> Dict:
+    """Fetch current stock price and basic info, served from the shared quote cache."""
+    return quote_cache.get(symbol)
+
+def _fetch_quote(symbol: str) -> Dict:
     """Fetch current stock price and basic info using yfinance."""
     try:
         ticker = yf.Ticker(symbol)
@@ -24,6 +131,8 @@ def fetch_stock_price(symbol: str) -> Dict:
     except Exception as e:
         return {"error": f"Failed to fetch data for {symbol}: {str(e)}"}
 
+quote_cache = QuoteCache(_fetch_quote, **get_quote_cache_config())
+
 def fetch_stock_history(symbol: str, period: str = "1mo") -> Dict:
     """Fetch historical stock data."""
     try:
@@ -9,7 +9,7 @@ import pandas as pd
 
 # Import our modules
 from config import validate_config
-from data_fetchers import fetch_stock_price, fetch_market_trends, fetch_financial_news
+from data_fetchers import fetch_stock_price, fetch_market_trends, fetch_financial_news, quote_cache
 from chat_engine import process_user_message, update_knowledge_base
 from vector_store import init_pinecone
 
@@ -295,6 +295,13 @@ def main():
             if st.session_state.knowledge_base_updated:
                 st.success("Knowledge base recently updated")
             
+            quote_stats = quote_cache.stats()
+            st.info(
+                f"Quote cache: {quote_stats['hits'] + quote_stats['stale_hits']} hits, "
+                f"{quote_stats['misses']} misses ({quote_stats['hit_rate']:.0%} hit rate), "
+                f"{quote_stats['size']} symbols cached"
+            )
+            
             # Initialize Pinecone if needed
             try:
                 init_pinecone()
@@ -6,6 +6,7 @@ Run this script to test individual components before running the full applicatio
 
 import sys
 import os
+import time
 from datetime import datetime
 
 def test_config():
@@ -71,6 +72,42 @@ def test_data_fetchers():
         print(f"❌ Data fetchers test failed: {e}")
         return False
 
+def test_quote_cache():
+    """Test quote caching and refresh with a stubbed fetcher (no live prices)."""
+    print("\n⏱️ Testing quote cache...")
+    from data_fetchers import QuoteCache
+
+    calls = []
+
+    def fake_fetch(symbol):
+        calls.append(symbol)
+        return {"symbol": symbol, "price": float(len(calls))}
+
+    cache = QuoteCache(fake_fetch, ttl=0.2, stale_ttl=0.5)
+
+    first = cache.get("AAPL")
+    second = cache.get("aapl")
+    assert len(calls) == 1, f"expected 1 fetch within the TTL, got {len(calls)}"
+    assert second["price"] == first["price"] == 1.0
+    assert cache.stats()["hits"] == 1
+    print("✅ Second lookup within the TTL was a cache hit")
+
+    # Past the TTL the stale quote is served while a background refresh runs
+    time.sleep(0.25)
+    assert cache.get("AAPL")["price"] == 1.0
+    deadline = time.monotonic() + 2
+    while cache.get("AAPL")["price"] != 2.0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get("AAPL")["price"] == 2.0, "stale quote was not refreshed in the background"
+    assert len(calls) == 2
+    print("✅ Stale quote served, then refreshed in the background")
+
+    # Past the stale TTL the caller waits for a fresh quote
+    time.sleep(0.55)
+    assert cache.get("AAPL")["price"] == 3.0
+    assert len(calls) == 3
+    print("✅ Expired quote fetched again")
+
 def test_vector_store():
     """Test vector store operations."""
     print("\n🗄️ Testing vector store...")
@@ -161,6 +198,7 @@ def main():
     tests = [
         ("Configuration", test_config),
         ("Data Fetchers", test_data_fetchers),
+        ("Quote Cache", test_quote_cache),
         ("Vector Store", test_vector_store),
         ("Chat Engine", test_chat_engine)
     ]
@@ -170,7 +208,8 @@ def main():
     for test_name, test_func in tests:
         try:
             result = test_func()
-            results.append((test_name, result))
+            # Assert-style tests return None when they pass
+            results.append((test_name, result is not False))
         except Exception as e:
             print(f"❌ {test_name} test crashed: {e}")
             results.append((test_name, False))